@@ -1,7 +1,33 @@
 import json
 import os
+import sys
 from urllib.parse import parse_qs
 
+# Shared modules live at the project root, one level up from this function
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from response_cache import ResponseCache
+from resilience import Resilience, UpstreamUnavailable
+from tools import MODEL_TIERS, TOOLS_BY_PATH, ToolInputError, prepare, run_sync
+
+# Tools pick their own model tier (see tools.py); this is the default
+MODEL = MODEL_TIERS["fast"]
+# These survive across invocations on a warm instance
+response_cache = ResponseCache()
+resilience = Resilience()
+_client = None
+
+def get_client():
+    # Imported on first use so routes that never call the model skip the SDK
+    # import on cold start. The client keeps one pooled keep-alive HTTP
+    # connection to the API for every later invocation on this instance.
+    global _client
+    if _client is None:
+        from google import genai
+        base_url = os.getenv("GEMINI_BASE_URL")  # e.g. benchmarks/fake_gemini.py
+        _client = genai.Client(api_key=os.getenv("GEMINI_API_KEY") or os.getenv("GOOGLE_API_KEY"),
+                               http_options={"base_url": base_url} if base_url else None)
+    return _client
+
 def handler(request):
     # Set CORS headers
     headers = {
@@ -44,20 +70,10 @@ def handler(request):
             result = handle_signup(data)
         elif path == '/api/login':
             result = handle_login(data)
-        elif path == '/api/chat':
-            result = handle_chat(data)
+        elif path in TOOLS_BY_PATH:
+            result = handle_tool(TOOLS_BY_PATH[path], data)
         elif path == '/api/contact':
             result = handle_contact(data)
-        elif path == '/api/assess':
-            result = handle_assess(data)
-        elif path == '/api/skills':
-            result = handle_skills(data)
-        elif path == '/api/resume':
-            result = handle_resume(data)
-        elif path == '/api/market':
-            result = handle_market(data)
-        elif path == '/api/learning':
-            result = handle_learning(data)
         elif path == '/api/forgot-password':
             result = handle_forgot_password(data)
         else:
@@ -76,6 +92,44 @@ def handler(request):
             'body': json.dumps({"error": str(e)})
         }
 
+def model_call(model, prompt, config, attempts=None):
+    def call():
+        response = get_client().models.generate_content(model=model, contents=prompt, config=config)
+        return response.text if hasattr(response, 'text') else str(response)
+    return resilience.call_sync(model, call, attempts)
+
+def generate_text(call):
+    if not call.fallback_model:
+        return model_call(call.model, call.prompt, call.config)
+    # One try within the latency SLO, then answer on the fast tier
+    config = dict(call.config or {}, http_options={"timeout": int(call.latency_slo * 1000)})
+    try:
+        return model_call(call.model, call.prompt, config, attempts=1)
+    except Exception:
+        fallback_config = {k: v for k, v in (call.config or {}).items() if k != "thinking_config"} or None
+        return model_call(call.fallback_model, call.prompt, fallback_config)
+
+def handle_tool(tool, data):
+    try:
+        call = prepare(tool, data, MODEL)
+    except ToolInputError as e:
+        return {"error": str(e)}
+    
+    try:
+        api_key = os.getenv("GEMINI_API_KEY") or os.getenv("GOOGLE_API_KEY")
+        if api_key:
+            response_text = run_sync(call, generate_text, response_cache)
+        else:
+            response_text = "Please configure your Gemini API key for AI responses."
+    except UpstreamUnavailable as e:
+        # Not an answer: keep it out of the chat history
+        return {"error": "The advisor is busy right now, please try again shortly",
+                "retry_after": max(1, round(e.retry_after))}
+    except Exception as e:
+        response_text = f"Error: {str(e)}"
+    
+    return {"response": response_text, "history": [[call.user_input, response_text]], "updated_history": True}
+
 def handle_signup(data):
     username = data.get('username', '')
     email = data.get('email', '')
@@ -100,28 +154,6 @@ def handle_login(data):
     
     return {"message": f"Welcome back, {username}!", "session_id": f"{username}_123", "chat_history": []}
 
-def handle_chat(data):
-    message = data.get('message', '').strip()
-    
-    if not message:
-        return {"error": "Message cannot be empty"}
-    
-    try:
-        import google.generativeai as genai
-        api_key = os.getenv("GEMINI_API_KEY") or os.getenv("GOOGLE_API_KEY")
-        if api_key:
-            genai.configure(api_key=api_key)
-            model = genai.GenerativeModel("gemini-2.5-flash-lite")
-            prompt = f"As a career advisor, answer: {message}"
-            response = model.generate_content(prompt)
-            response_text = response.text if hasattr(response, 'text') else str(response)
-        else:
-            response_text = f"Thank you for your message: '{message}'. Please configure your Gemini API key for AI responses."
-    except Exception as e:
-        response_text = f"Error: {str(e)}"
-    
-    return {"response": response_text, "history": [[message, response_text]], "updated_history": True}
-
 def handle_contact(data):
     name = data.get('name', '')
     email = data.get('email', '')
@@ -133,131 +165,6 @@ def handle_contact(data):
     
     return {"message": "Thank you for contacting us! We'll get back to you soon."}
 
-def handle_assess(data):
-    q1 = data.get('q1', '')
-    q2 = data.get('q2', '')
-    q3 = data.get('q3', '')
-    q4 = data.get('q4', '')
-    q5 = data.get('q5', '')
-    
-    if not all([q1, q2, q3, q4, q5]):
-        return {"error": "Please answer all questions"}
-    
-    try:
-        import google.generativeai as genai
-        api_key = os.getenv("GEMINI_API_KEY") or os.getenv("GOOGLE_API_KEY")
-        if api_key:
-            genai.configure(api_key=api_key)
-            model = genai.GenerativeModel("gemini-2.5-flash-lite")
-            prompt = f"""Career assessment:
-            1. Work environment: {q1}
-            2. Work style: {q2}
-            3. Task preference: {q3}
-            4. Work-life balance: {q4}
-            5. Routine preference: {q5}
-            
-            Suggest 3 career paths with explanations."""
-            response = model.generate_content(prompt)
-            response_text = response.text if hasattr(response, 'text') else str(response)
-        else:
-            response_text = "Please configure your Gemini API key for AI responses."
-    except Exception as e:
-        response_text = f"Error: {str(e)}"
-    
-    return {"response": response_text, "history": [[f"Career Assessment: {q1}, {q2}, {q3}, {q4}, {q5}", response_text]], "updated_history": True}
-
-def handle_skills(data):
-    current_skills = data.get('current_skills', '')
-    target_role = data.get('target_role', '')
-    
-    if not current_skills or not target_role:
-        return {"error": "Please fill both fields"}
-    
-    try:
-        import google.generativeai as genai
-        api_key = os.getenv("GEMINI_API_KEY") or os.getenv("GOOGLE_API_KEY")
-        if api_key:
-            genai.configure(api_key=api_key)
-            model = genai.GenerativeModel("gemini-2.5-flash-lite")
-            prompt = f"Skills: {current_skills}, Target: {target_role}. Identify gaps and learning path."
-            response = model.generate_content(prompt)
-            response_text = response.text if hasattr(response, 'text') else str(response)
-        else:
-            response_text = "Please configure your Gemini API key for AI responses."
-    except Exception as e:
-        response_text = f"Error: {str(e)}"
-    
-    return {"response": response_text, "history": [[f"Skills Analysis: {current_skills} -> {target_role}", response_text]], "updated_history": True}
-
-def handle_resume(data):
-    job_role = data.get('job_role', '')
-    experience_level = data.get('experience_level', '')
-    
-    if not job_role or not experience_level:
-        return {"error": "Please fill both fields"}
-    
-    try:
-        import google.generativeai as genai
-        api_key = os.getenv("GEMINI_API_KEY") or os.getenv("GOOGLE_API_KEY")
-        if api_key:
-            genai.configure(api_key=api_key)
-            model = genai.GenerativeModel("gemini-2.5-flash-lite")
-            prompt = f"Resume tips for {job_role} at {experience_level} level. Give 5 specific tips."
-            response = model.generate_content(prompt)
-            response_text = response.text if hasattr(response, 'text') else str(response)
-        else:
-            response_text = "Please configure your Gemini API key for AI responses."
-    except Exception as e:
-        response_text = f"Error: {str(e)}"
-    
-    return {"response": response_text, "history": [[f"Resume Tips: {job_role} ({experience_level})", response_text]], "updated_history": True}
-
-def handle_market(data):
-    field = data.get('field', '')
-    location = data.get('location', '')
-    
-    if not field or not location:
-        return {"error": "Please fill both fields"}
-    
-    try:
-        import google.generativeai as genai
-        api_key = os.getenv("GEMINI_API_KEY") or os.getenv("GOOGLE_API_KEY")
-        if api_key:
-            genai.configure(api_key=api_key)
-            model = genai.GenerativeModel("gemini-2.5-flash-lite")
-            prompt = f"Job market insights for {field} in {location}. Include salary and trends."
-            response = model.generate_content(prompt)
-            response_text = response.text if hasattr(response, 'text') else str(response)
-        else:
-            response_text = "Please configure your Gemini API key for AI responses."
-    except Exception as e:
-        response_text = f"Error: {str(e)}"
-    
-    return {"response": response_text, "history": [[f"Market Insights: {field} in {location}", response_text]], "updated_history": True}
-
-def handle_learning(data):
-    skill = data.get('skill', '')
-    learning_style = data.get('learning_style', '')
-    
-    if not skill or not learning_style:
-        return {"error": "Please fill both fields"}
-    
-    try:
-        import google.generativeai as genai
-        api_key = os.getenv("GEMINI_API_KEY") or os.getenv("GOOGLE_API_KEY")
-        if api_key:
-            genai.configure(api_key=api_key)
-            model = genai.GenerativeModel("gemini-2.5-flash-lite")
-            prompt = f"Learning resources for {skill} with {learning_style} learning style."
-            response = model.generate_content(prompt)
-            response_text = response.text if hasattr(response, 'text') else str(response)
-        else:
-            response_text = "Please configure your Gemini API key for AI responses."
-    except Exception as e:
-        response_text = f"Error: {str(e)}"
-    
-    return {"response": response_text, "history": [[f"Learning Resources: {skill} ({learning_style})", response_text]], "updated_history": True}
-
 def handle_forgot_password(data):
     email = data.get('email', '')
     
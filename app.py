@@ -3,38 +3,59 @@ from google import genai
 import os
 from datetime import datetime
 from dotenv import load_dotenv
+from storage import open_storage, AlreadyExists
+from response_cache import ResponseCache
+from resilience import Resilience, UpstreamUnavailable
+from model_gateway import client_options
+from tools import TOOLS, ToolInputError, prepare, run_sync
+import credentials
 
 # Load API key from .env
 load_dotenv()
 api_key = os.getenv("GEMINI_API_KEY") or os.getenv("GOOGLE_API_KEY")
-client = genai.Client(api_key=api_key)
+client = genai.Client(api_key=api_key, **client_options())
 MODEL = "gemini-2.5-flash"
+response_cache = ResponseCache()
+resilience = Resilience()
+BUSY_MESSAGE = "The advisor is busy right now, please try again shortly"
 
 # Simple storage
-users_db = {}
+storage = open_storage()
 current_user = {"username": None, "logged_in": False}
 guest_chat = []
-current_session = {"saved": True}  # Track current session
+# The saved chat the conversation on screen is appended to, and how many of its turns it has
+current_session = {"chat_id": None, "saved_turns": 0}
 
 # Simple chat function with loading state
+def generate_text(call):
+    # Gradio runs handlers in worker threads; the latency SLO fallback only
+    # applies to the async gateway, so just honour the tier and settings here
+    return resilience.call_sync(call.model, lambda: client.models.generate_content(
+        model=call.model, contents=call.prompt, config=call.config).text)
+
 def chat_with_ai(user_input, history):
-    if not user_input.strip():
+    try:
+        call = prepare(TOOLS["chat"], {"message": user_input}, MODEL)
+    except ToolInputError:
         return "", history, gr.update(visible=False)
     
     try:
-        prompt = f"As a career advisor, answer: {user_input}"
-        response = client.models.generate_content(model=MODEL, contents=prompt)
-        response_text = response.text
-        history = add_to_history(user_input, response_text, history)
+        response_text = run_sync(call, generate_text, response_cache)
+        history = add_to_history(call.user_input, response_text, history)
         return "", history, gr.update(visible=False)
+    except UpstreamUnavailable:
+        # Keep the message in the box so the user can resend it
+        gr.Warning(BUSY_MESSAGE)
+        return user_input, history, gr.update(visible=False)
     except Exception as e:
-        history = add_to_history(user_input, f"Error: {str(e)}", history)
+        history = add_to_history(call.user_input, f"Error: {str(e)}", history)
         return "", history, gr.update(visible=False)
 
 def show_loading():
     return gr.update(visible=True)
 
 def clear_chat():
+    start_new_session()
     return [], "🗑️ Chat cleared!"
 
 # Authentication functions
@@ -45,22 +66,25 @@ def signup(username, email, password, confirm_password):
         return "Passwords don't match"
     if len(password) < 6:
         return "Password must be at least 6 characters"
-    if username in users_db:
+    if storage.get_user(username) is not None:
         return "Username already exists"
     
-    users_db[username] = {
-        "email": email,
-        "password": password,
-        "chats": []
-    }
+    try:
+        storage.create_user(username, email, credentials.hash_password_sync(password), username)
+    except AlreadyExists as e:
+        return "Email already registered" if e.field == "email" else "Username already exists"
+    
     return "Account created successfully! Please login."
 
 def login(username, password):
     if not username or not password:
         return "Please enter username and password", "Guest Mode", gr.update(choices=[], value=None), gr.update(visible=False)
     
-    if username not in users_db or users_db[username]["password"] != password:
+    user = storage.get_user(username)
+    if user is None or not credentials.verify_password_sync(password, user["password"]):
         return "Invalid username or password", "Guest Mode", gr.update(choices=[], value=None), gr.update(visible=False)
+    if credentials.needs_rehash(user["password"]):
+        storage.update_user(username, password=credentials.hash_password_sync(password))
     
     current_user["username"] = username
     current_user["logged_in"] = True
@@ -72,6 +96,7 @@ def login(username, password):
 def logout():
     current_user["username"] = None
     current_user["logged_in"] = False
+    start_new_session()
     return "Logged out successfully", "Guest Mode", gr.update(choices=[], value=None), gr.update(visible=False)
 
 # Chat history functions
@@ -80,10 +105,17 @@ def save_current_chat(history):
         return "Please login to save chats"
     if not history:
         return "No chat to save"
-    if current_session["saved"]:
-        return "Chat already saved"
     
     username = current_user["username"]
+    if current_session["chat_id"] is not None:
+        # A live record: only turns it does not have yet are appended
+        new_turns = history[current_session["saved_turns"]:]
+        if not new_turns:
+            return "Chat already saved"
+        storage.append_turns(username, current_session["chat_id"], tuple(map(tuple, new_turns)))
+        current_session["saved_turns"] = len(history)
+        return "✅ Chat saved successfully!"
+    
     timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
     
     # Create chat session with first user message as title
@@ -94,14 +126,11 @@ def save_current_chat(history):
     chat_data = {
         "title": title,
         "timestamp": timestamp,
-        "messages": history.copy()
+        "messages": history  # storage snapshots it; the turns themselves are shared
     }
     
-    if "chat_history" not in users_db[username]:
-        users_db[username]["chat_history"] = []
-    
-    users_db[username]["chat_history"].append(chat_data)
-    current_session["saved"] = True
+    current_session["chat_id"] = storage.add_chat(username, chat_data)
+    current_session["saved_turns"] = len(history)
     return "✅ Chat saved successfully!"
 
 def get_chat_history_list():
@@ -109,10 +138,9 @@ def get_chat_history_list():
         return []
     
     username = current_user["username"]
-    if "chat_history" not in users_db[username]:
-        return []
-    
-    return [f"{chat['timestamp']} - {chat['title']}" for chat in users_db[username]["chat_history"]]
+    # (label, id) pairs: the dropdown hands the id straight back to load_chat_history
+    chats, _ = storage.list_chats(username, limit=100)
+    return [(f"{chat['timestamp']} - {chat['title']}", chat["id"]) for chat in chats]
 
 def load_chat_history(selected_chat):
     if not current_user["logged_in"]:
@@ -120,112 +148,50 @@ def load_chat_history(selected_chat):
     if not selected_chat:
         return [], "Please select a chat to load"
     
-    username = current_user["username"]
-    if "chat_history" not in users_db[username]:
-        return [], "No chat history found"
-    
-    # Find the selected chat
-    for chat in users_db[username]["chat_history"]:
-        chat_label = f"{chat['timestamp']} - {chat['title']}"
-        if chat_label == selected_chat:
-            return chat["messages"], "✅ Chat loaded successfully!"
-    
-    return [], "Chat not found"
+    chat = storage.get_chat(current_user["username"], selected_chat)
+    if chat is None:
+        return [], "Chat not found"
+    # Carrying on with a loaded chat appends to it
+    current_session["chat_id"] = selected_chat
+    current_session["saved_turns"] = len(chat["messages"])
+    return list(chat["messages"]), "✅ Chat loaded successfully!"
+
+def start_new_session():
+    current_session["chat_id"] = None
+    current_session["saved_turns"] = 0
 
 def new_chat():
-    current_session["saved"] = True
+    start_new_session()
     return [], gr.update(value=None), "✅ New chat started!"
 
 def add_to_history(user_input, response, history):
-    history.append([user_input, response])
-    current_session["saved"] = False
+    turn = (user_input, response)
+    history.append(turn)
+    if current_session["chat_id"] is not None and current_user["logged_in"]:
+        # Saved chats are live records: new turns are appended as they happen
+        storage.append_turns(current_user["username"], current_session["chat_id"], (turn,))
+        current_session["saved_turns"] = len(history)
     return history
 
-# Assessment function
-def assess_career(q1, q2, q3, q4, q5, history):
-    if not all([q1, q2, q3, q4, q5]):
-        return "Please answer all questions", history
-    
-    try:
-        user_input = f"Career Assessment: {q1}, {q2}, {q3}, {q4}, {q5}"
-        prompt = f"""Career assessment:
-        1. Work environment: {q1}
-        2. Work style: {q2}
-        3. Task preference: {q3}
-        4. Work-life balance: {q4}
-        5. Routine preference: {q5}
-        
-        Suggest 3 career paths with explanations."""
-        
-        response = client.models.generate_content(model=MODEL, contents=prompt)
-        response_text = response.text
-        history = add_to_history(user_input, response_text, history)
-        return response_text, history
-    except Exception as e:
-        error_msg = f"Error: {str(e)}"
-        history = add_to_history(f"Career Assessment: {q1}, {q2}, {q3}, {q4}, {q5}", error_msg, history)
-        return error_msg, history
-
-# Other functions
-def analyze_skills(skills, role, history):
-    if not skills or not role:
-        return "Please fill both fields", history
-    try:
-        user_input = f"Skills Analysis: {skills} -> {role}"
-        prompt = f"Skills: {skills}, Target: {role}. Identify gaps and learning path."
-        response = client.models.generate_content(model=MODEL, contents=prompt)
-        response_text = response.text
-        history = add_to_history(user_input, response_text, history)
+# Advisor tools: one handler per registered tool, taking the tool's fields
+# in order followed by the chat history
+def tool_handler(tool):
+    def handle(*args):
+        *values, history = args
+        try:
+            call = prepare(tool, dict(zip(tool.fields, values)), MODEL)
+        except ToolInputError as e:
+            return str(e), history
+        try:
+            response_text = run_sync(call, generate_text, response_cache)
+        except UpstreamUnavailable:
+            return BUSY_MESSAGE, history
+        except Exception as e:
+            response_text = f"Error: {str(e)}"
+        history = add_to_history(call.user_input, response_text, history)
         return response_text, history
-    except Exception as e:
-        error_msg = f"Error: {str(e)}"
-        history = add_to_history(f"Skills Analysis: {skills} -> {role}", error_msg, history)
-        return error_msg, history
-
-def resume_tips(job, level, history):
-    if not job or not level:
-        return "Please fill both fields", history
-    try:
-        user_input = f"Resume Tips: {job} ({level})"
-        prompt = f"Resume tips for {job} at {level} level. Give 5 specific tips."
-        response = client.models.generate_content(model=MODEL, contents=prompt)
-        response_text = response.text
-        history = add_to_history(user_input, response_text, history)
-        return response_text, history
-    except Exception as e:
-        error_msg = f"Error: {str(e)}"
-        history = add_to_history(f"Resume Tips: {job} ({level})", error_msg, history)
-        return error_msg, history
-
-def market_insights(field, location, history):
-    if not field or not location:
-        return "Please fill both fields", history
-    try:
-        user_input = f"Market Insights: {field} in {location}"
-        prompt = f"Job market insights for {field} in {location}. Include salary and trends."
-        response = client.models.generate_content(model=MODEL, contents=prompt)
-        response_text = response.text
-        history = add_to_history(user_input, response_text, history)
-        return response_text, history
-    except Exception as e:
-        error_msg = f"Error: {str(e)}"
-        history = add_to_history(f"Market Insights: {field} in {location}", error_msg, history)
-        return error_msg, history
-
-def learning_resources(skill, style, history):
-    if not skill or not style:
-        return "Please fill both fields", history
-    try:
-        user_input = f"Learning Resources: {skill} ({style})"
-        prompt = f"Learning resources for {skill} with {style} learning style."
-        response = client.models.generate_content(model=MODEL, contents=prompt)
-        response_text = response.text
-        history = add_to_history(user_input, response_text, history)
-        return response_text, history
-    except Exception as e:
-        error_msg = f"Error: {str(e)}"
-        history = add_to_history(f"Learning Resources: {skill} ({style})", error_msg, history)
-        return error_msg, history
+    handle.__name__ = f"{tool.name}_tool"
+    return handle
 
 # Create interface
 with gr.Blocks(title="🎯 AI Career Advisor") as demo:
@@ -336,11 +302,11 @@ with gr.Blocks(title="🎯 AI Career Advisor") as demo:
     new_chat_btn.click(new_chat, [], [chatbot, chat_history_dropdown, save_msg])
     
     # Tool events
-    assess_btn.click(assess_career, [q1, q2, q3, q4, q5, chatbot], [assessment_result, chatbot])
-    skills_btn.click(analyze_skills, [current_skills, target_role, chatbot], [skills_result, chatbot])
-    resume_btn.click(resume_tips, [job_role, experience_level, chatbot], [resume_result, chatbot])
-    market_btn.click(market_insights, [field, location, chatbot], [market_result, chatbot])
-    learning_btn.click(learning_resources, [skill_to_learn, learning_style, chatbot], [learning_result, chatbot])
+    assess_btn.click(tool_handler(TOOLS["assess"]), [q1, q2, q3, q4, q5, chatbot], [assessment_result, chatbot])
+    skills_btn.click(tool_handler(TOOLS["skills"]), [current_skills, target_role, chatbot], [skills_result, chatbot])
+    resume_btn.click(tool_handler(TOOLS["resume"]), [job_role, experience_level, chatbot], [resume_result, chatbot])
+    market_btn.click(tool_handler(TOOLS["market"]), [field, location, chatbot], [market_result, chatbot])
+    learning_btn.click(tool_handler(TOOLS["learning"]), [skill_to_learn, learning_style, chatbot], [learning_result, chatbot])
 
 if __name__ == "__main__":
     demo.launch(share=True)
\ No newline at end of file
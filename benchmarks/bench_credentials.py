@@ -0,0 +1,66 @@
+"""Password verification throughput.
+
+Reports logins/sec for the scrypt work factor in use (or --n), serially and
+through the credential pool at several worker counts, normalized per core.
+
+    python benchmarks/bench_credentials.py --seconds 3 --n 16384
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import credentials
+
+
+async def run_pool(stored: str, workers: int, seconds: float, kind: str) -> int:
+    credentials.POOL_KIND = kind
+    credentials.POOL_WORKERS = workers
+    credentials.shutdown()
+    done = 0
+    deadline = time.perf_counter() + seconds
+
+    async def worker():
+        nonlocal done
+        while time.perf_counter() < deadline:
+            ok, _ = await credentials.verify_password("correct horse", stored)
+            assert ok
+            done += 1
+
+    # Keep every pool worker busy with twice as many in-flight logins
+    await asyncio.gather(*(worker() for _ in range(workers * 2)))
+    credentials.shutdown()
+    return done
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--n", type=int, default=credentials.SCRYPT_N, help="scrypt work factor (power of two)")
+    parser.add_argument("--seconds", type=float, default=3.0, help="duration of each run")
+    parser.add_argument("--pool", choices=["thread", "process"], default="thread")
+    args = parser.parse_args()
+
+    cores = os.cpu_count() or 1
+    credentials.SCRYPT_N = args.n
+    stored = credentials.hash_password_sync("correct horse")
+    print(f"scrypt n={args.n} r={credentials.SCRYPT_R} p={credentials.SCRYPT_P}, {cores} core(s), {args.pool} pool")
+
+    start = time.perf_counter()
+    serial = 0
+    while time.perf_counter() - start < args.seconds:
+        credentials.verify_password_sync("correct horse", stored)
+        serial += 1
+    rate = serial / (time.perf_counter() - start)
+    print(f"{'serial':>12}: {rate:8.1f} logins/s  ({1000 / rate:.1f} ms each)")
+
+    print(f"{'workers':>12}  {'logins/s':>10}  {'per core':>10}")
+    for workers in sorted({1, max(1, cores // 2), cores, cores * 2}):
+        count = asyncio.run(run_pool(stored, workers, args.seconds, args.pool))
+        rate = count / args.seconds
+        print(f"{workers:>12}  {rate:>10.1f}  {rate / min(workers, cores):>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""Encode time and size of history payloads: FastAPI's default path vs fast_json.
+
+Builds `/api/history`-shaped payloads for sessions of 10, 100 and 1000 turns
+and encodes each one three ways:
+
+  * default: `jsonable_encoder` + stdlib json, which is what FastAPI does for a
+    dict returned from a handler
+  * stdlib: stdlib json alone (fast_json without orjson)
+  * fast_json: FastJSONResponse's encoder (orjson when installed)
+
+    python benchmarks/bench_json.py --turns 10,100,1000 --seconds 1
+"""
+import argparse
+import gzip
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from fastapi.encoders import jsonable_encoder
+
+import fast_json
+
+ANSWER = ("To move into data science, start with Python and statistics, then build projects on real "
+          "datasets. Learn SQL, pandas and scikit-learn, publish your work, and apply for analyst roles "
+          "to get industry experience first. ") * 4
+
+
+def history_payload(turns: int) -> dict:
+    history = [[f"Question {i}: how do I become a data scientist in 2025?", ANSWER] for i in range(turns)]
+    return {"turns": [{"index": i, "user": turn[0], "bot": turn[1]} for i, turn in enumerate(history)],
+            "turn_index": turns - 1, "next_since": None}
+
+
+def default_encode(payload) -> bytes:
+    # Mirrors fastapi.routing.serialize_response + starlette JSONResponse.render
+    return json.dumps(jsonable_encoder(payload), ensure_ascii=False, allow_nan=False, indent=None,
+                      separators=(",", ":")).encode("utf-8")
+
+
+def stdlib_encode(payload) -> bytes:
+    return json.dumps(payload, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+
+def timed(fn, payload, seconds: float) -> float:
+    """Mean microseconds per call."""
+    calls = 0
+    deadline = time.perf_counter() + seconds
+    start = time.perf_counter()
+    while time.perf_counter() < deadline:
+        fn(payload)
+        calls += 1
+    return (time.perf_counter() - start) / calls * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--turns", default="10,100,1000", help="comma separated session lengths")
+    parser.add_argument("--seconds", type=float, default=1.0, help="time per measurement")
+    args = parser.parse_args()
+
+    encoders = {"default": default_encode, "stdlib": stdlib_encode, "fast_json": fast_json.dumps}
+    print(f"fast_json backend: {'orjson' if fast_json.orjson is not None else 'stdlib json'}")
+    print(f"{'turns':>6} {'encoder':>10} {'us/encode':>12} {'speedup':>8} {'bytes':>10} {'gzip bytes':>11}")
+    for turns in (int(n) for n in args.turns.split(",")):
+        payload = history_payload(turns)
+        baseline = None
+        for name, fn in encoders.items():
+            micros = timed(fn, payload, args.seconds)
+            body = fn(payload)
+            baseline = baseline or micros
+            print(f"{turns:>6} {name:>10} {micros:>12.1f} {baseline / micros:>7.1f}x {len(body):>10} "
+                  f"{len(gzip.compress(body, 6)):>11}")
+
+
+if __name__ == "__main__":
+    main()
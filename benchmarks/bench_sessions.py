@@ -0,0 +1,90 @@
+"""Memory held per live session: the old dict/list layout vs Session/turn tuples.
+
+Each layout is measured in a fresh interpreter. The probe creates --sessions
+sessions with --turns turns each, saves each chat to the in-memory storage
+backend (--save), and reports the RSS growth divided by the session count.
+The "legacy" layout rebuilds what session_store used to keep: a dict per
+session, a two-element list per turn, and a full `history.copy()` per saved
+chat.
+
+    python benchmarks/bench_sessions.py --sessions 10000 --turns 4
+    python benchmarks/bench_sessions.py --turns 0   # structure overhead only
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PROBE = r"""
+import gc, json, secrets, sys, time
+from collections import OrderedDict
+from loop_monitor import rss_bytes
+from session_store import SessionStore
+from storage import InMemoryStorage
+
+layout, count, turns, save = sys.argv[1], int(sys.argv[2]), int(sys.argv[3]), sys.argv[4] == "1"
+storage = InMemoryStorage()
+storage.create_user("bench", "bench@example.com", "x", "Bench")
+answer = "Start with Python and statistics, then build projects on real datasets. " * 8
+
+def turn_text(i, j):
+    # Distinct strings per turn, as in real traffic
+    return f"session {i} question {j}: how do I become a data scientist?", f"{answer}[{i}.{j}]"
+
+gc.collect()
+before = rss_bytes()
+if layout == "legacy":
+    live = OrderedDict()  # keyed like SessionStore, so only the layout differs
+    for i in range(count):
+        session = {"username": None, "chat_history": [], "turn_base": 0, "saved": True,
+                   "last_seen": time.monotonic(), "history_bytes": 0, "summary": "", "summarized_upto": 0}
+        for j in range(turns):
+            session["chat_history"].append(list(turn_text(i, j)))
+        if save and turns:
+            chat = {"title": "t", "timestamp": "2025-01-01 00:00:00", "messages": session["chat_history"].copy()}
+            storage._chats["bench"][str(i)] = dict(chat, id=str(i))
+        live[secrets.token_urlsafe(18)] = session
+else:
+    sessions = SessionStore(max_sessions=count)
+    for i in range(count):
+        _, session = sessions.create()
+        for j in range(turns):
+            sessions.append_turn(session, turn_text(i, j))
+        if save and turns:
+            storage.add_chat("bench", {"title": "t", "timestamp": "2025-01-01 00:00:00",
+                                       "messages": session.chat_history})
+gc.collect()
+print(json.dumps({"rss_delta": rss_bytes() - before}))
+"""
+
+
+def measure(layout: str, sessions: int, turns: int, save: bool) -> int:
+    out = subprocess.run([sys.executable, "-c", PROBE, layout, str(sessions), str(turns), "1" if save else "0"],
+                         cwd=ROOT, capture_output=True, text=True, check=True).stdout
+    return json.loads(out.strip().splitlines()[-1])["rss_delta"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=10000)
+    parser.add_argument("--turns", type=int, default=4, help="turns per session")
+    parser.add_argument("--no-save", dest="save", action="store_false", help="do not save the chats")
+    parser.add_argument("--runs", type=int, default=3, help="fresh interpreters per layout (median is kept)")
+    args = parser.parse_args()
+
+    print(f"{args.sessions} sessions x {args.turns} turns, saved: {args.save}")
+    results = {}
+    for layout in ("legacy", "compact"):
+        samples = sorted(measure(layout, args.sessions, args.turns, args.save) for _ in range(args.runs))
+        results[layout] = samples[len(samples) // 2]
+        print(f"{layout:>8}: {results[layout] / 2**20:8.1f} MiB RSS, "
+              f"{results[layout] / args.sessions:8.0f} bytes/session")
+    saved = results["legacy"] - results["compact"]
+    print(f"   saved: {saved / 2**20:8.1f} MiB, {saved / args.sessions:8.0f} bytes/session")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""Cold-start benchmark for main.py and api/index.py.
+
+Every sample runs in a fresh interpreter and reports:
+
+  * import time of the app module (and whether the Gemini SDK got imported)
+  * latency of the first request to a static route
+  * latency of the first request to an LLM route. The SDK import and client
+    construction are real, but the upstream call is stubbed so no API quota
+    is used.
+
+    python benchmarks/bench_startup.py --runs 5
+
+Needs httpx (already required by FastAPI's test client) to drive main.py in
+process.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+MAIN_PROBE = r"""
+import asyncio, json, sys, time
+t0 = time.perf_counter()
+import main
+t1 = time.perf_counter()
+sdk_at_import = "google.genai" in sys.modules
+import httpx
+
+class _Reply:
+    text = "stub"
+
+async def _stub(*args, **kwargs):
+    return _Reply()
+
+factory = main.gateway._client_factory
+def stubbed_factory():
+    client = factory()  # real SDK import and client construction
+    client.aio.models.generate_content = _stub
+    return client
+main.gateway._client_factory = stubbed_factory
+
+async def first(client, method, path, **kwargs):
+    start = time.perf_counter()
+    response = await client.request(method, path, **kwargs)
+    assert response.status_code == 200, response.text
+    return time.perf_counter() - start
+
+async def run():
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        static = {path: await first(client, "GET", path) for path in ("/", "/terms", "/privacy")}
+        llm = await first(client, "POST", "/api/resume", json={"job_role": "Engineer", "experience_level": "Entry Level"})
+    return static, llm
+
+static, llm = asyncio.run(run())
+print(json.dumps({"import": t1 - t0, "sdk_at_import": sdk_at_import, "static": static, "llm": llm}))
+"""
+
+INDEX_PROBE = r"""
+import json, sys, time
+sys.path.insert(0, "api")
+t0 = time.perf_counter()
+import index
+t1 = time.perf_counter()
+sdk_at_import = "google.genai" in sys.modules
+
+def first(path, body):
+    start = time.perf_counter()
+    result = index.handler({"method": "POST", "path": path, "body": json.dumps(body)})
+    assert result["statusCode"] == 200, result
+    return time.perf_counter() - start
+
+static = {"/api/contact": first("/api/contact", {"name": "a", "email": "a@b.c", "subject": "s", "message": "m"})}
+
+class _Reply:
+    text = "stub"
+
+start = time.perf_counter()
+client = index.get_client()  # real SDK import and client construction
+client.models.generate_content = lambda *args, **kwargs: _Reply()
+first("/api/resume", {"job_role": "Engineer", "experience_level": "Entry Level"})
+llm = time.perf_counter() - start
+print(json.dumps({"import": t1 - t0, "sdk_at_import": sdk_at_import, "static": static, "llm": llm}))
+"""
+
+
+def sample(probe: str) -> dict:
+    env = dict(os.environ, GEMINI_API_KEY=os.getenv("GEMINI_API_KEY", "bench-key"))
+    output = subprocess.run([sys.executable, "-c", probe], cwd=ROOT, env=env, check=True,
+                            capture_output=True, text=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def ms(values) -> str:
+    return f"{statistics.median(values) * 1000:8.1f} ms (min {min(values) * 1000:.1f})"
+
+
+def report(name: str, samples: list):
+    print(f"\n{name}")
+    print(f"  {'import':<28}{ms([s['import'] for s in samples])}")
+    print(f"  {'SDK imported at startup':<28}{'yes' if any(s['sdk_at_import'] for s in samples) else 'no':>8}")
+    for path in samples[0]["static"]:
+        print(f"  {'first ' + path:<28}{ms([s['static'][path] for s in samples])}")
+    print(f"  {'first LLM route (stubbed)':<28}{ms([s['llm'] for s in samples])}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5, help="fresh interpreters per target")
+    parser.add_argument("--json", action="store_true", help="print raw samples as JSON")
+    args = parser.parse_args()
+
+    results = {
+        "main.py": [sample(MAIN_PROBE) for _ in range(args.runs)],
+        "api/index.py": [sample(INDEX_PROBE) for _ in range(args.runs)],
+    }
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"Median of {args.runs} cold starts, {sys.version.split()[0]}")
+    for name, samples in results.items():
+        report(name, samples)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""Which questions the semantic cache treats as the same question.
+
+Each pair stores an answer for the first question and asks the second, at
+the configured threshold (SEMANTIC_CACHE_THRESHOLD, or --threshold). The
+paraphrases must hit; questions that add a negation or a qualifier ask
+something else and must miss. Prints every similarity and exits non-zero if
+any pair lands on the wrong side, so a change to the vectorizer or the
+threshold can be checked before it ships.
+
+    python benchmarks/check_semantic_cache.py
+    python benchmarks/check_semantic_cache.py --threshold 0.85
+"""
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from semantic_cache import DEFAULT_THRESHOLD, SemanticCache
+
+BASE = "how do I become a data scientist"
+# (cached question, asked question, should hit)
+PAIRS = [
+    (BASE, "steps to become data scientist", True),
+    (BASE, "how to become a data scientist", True),
+    (BASE, "How do I become a data-scientist?", True),
+    (BASE, "what are the steps to become a data scientist", True),
+    (BASE, "how can i become data scientists", True),
+    (BASE, "how do I not become a data scientist", False),
+    (BASE, "how don't I become a data scientist", False),
+    (BASE, "how do I become a data scientist in India", False),
+    (BASE, "how do I become a data scientist without a degree", False),
+    (BASE, "how do I become a data engineer", False),
+    (BASE, "data scientist salary", False),
+    ("how to switch from marketing to product management",
+     "how to switch from product management to marketing", False),
+    ("best way to switch from marketing to product management",
+     "best way to not switch from marketing to product management", False),
+    ("what skills do i need for a machine learning engineer job",
+     "what skills do i need for a machine learning engineer job in google", False),
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD)
+    args = parser.parse_args()
+
+    wrong = 0
+    print(f"threshold {args.threshold}")
+    for cached, asked, should_hit in PAIRS:
+        cache = SemanticCache(threshold=args.threshold)
+        cache.set("chat", cached, "answer")
+        score = float(cache.vectorize(cached) @ cache.vectorize(asked))
+        hit = cache.get("chat", asked) is not None
+        ok = hit == should_hit
+        wrong += not ok
+        print(f"{'ok ' if ok else 'BAD'} {score:.3f} {'hit ' if hit else 'miss'} {asked!r} (cached {cached!r})")
+    print(f"{len(PAIRS) - wrong}/{len(PAIRS)} as expected")
+    sys.exit(1 if wrong else 0)
+
+
+if __name__ == "__main__":
+    main()
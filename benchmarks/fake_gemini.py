@@ -0,0 +1,149 @@
+"""Local stand-in for the Gemini API, for resilience and load testing.
+
+Serves `generateContent` and `streamGenerateContent` in the shape the
+google-genai SDK expects, with configurable latency and failures:
+
+    python benchmarks/fake_gemini.py --port 8090 --latency-ms 400 --p99-ms 3000 \\
+        --error-rate 0.05 --error-codes 429,503
+
+    GEMINI_BASE_URL=http://127.0.0.1:8090 GEMINI_API_KEY=fake python main.py
+
+Latency is log-normal with the given median and p99. Failures are returned
+as Gemini-style JSON errors (429 ones carry Retry-After). Settings can be
+changed while running, which is how outages are simulated:
+
+    curl -X POST localhost:8090/_control -d '{"error_rate": 1.0}'
+    curl localhost:8090/_stats
+"""
+import argparse
+import asyncio
+import json
+import math
+import random
+from typing import Optional
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+STATUS_NAMES = {429: "RESOURCE_EXHAUSTED", 500: "INTERNAL", 503: "UNAVAILABLE", 504: "DEADLINE_EXCEEDED"}
+Z_99 = 2.326  # standard normal quantile for p99
+
+settings = {
+    "latency_ms": 300.0,
+    "p99_ms": 1500.0,
+    "error_rate": 0.0,
+    "error_codes": [429, 503],
+    "words": 120,
+    "chunks": 12,
+}
+stats = {"requests": 0, "streams": 0, "errors": 0, "in_flight": 0, "max_in_flight": 0}
+
+app = FastAPI()
+
+
+def sample_latency() -> float:
+    median = settings["latency_ms"] / 1000
+    p99 = max(settings["p99_ms"] / 1000, median)
+    sigma = math.log(p99 / median) / Z_99 if median > 0 else 0.0
+    return median * math.exp(random.gauss(0, sigma)) if median > 0 else 0.0
+
+
+def maybe_error() -> Optional[JSONResponse]:
+    if random.random() >= settings["error_rate"]:
+        return None
+    stats["errors"] += 1
+    code = random.choice(settings["error_codes"])
+    body = {"error": {"code": code, "message": "Simulated upstream failure",
+                      "status": STATUS_NAMES.get(code, "UNKNOWN")}}
+    headers = {"Retry-After": "1"} if code == 429 else None
+    return JSONResponse(body, status_code=code, headers=headers)
+
+
+def reply_text(model: str, prompt: str) -> str:
+    words = [f"{model}:"] + [f"w{i}" for i in range(settings["words"])]
+    return " ".join(words) + f" (prompt {len(prompt)} chars)"
+
+
+def response_body(text: str, prompt: str, finished: bool = True) -> dict:
+    candidate = {"content": {"parts": [{"text": text}], "role": "model"}, "index": 0}
+    if finished:
+        candidate["finishReason"] = "STOP"
+    return {
+        "candidates": [candidate],
+        "usageMetadata": {"promptTokenCount": len(prompt) // 4 + 1,
+                          "candidatesTokenCount": len(text) // 4 + 1},
+    }
+
+
+def prompt_text(body: dict) -> str:
+    parts = [part.get("text", "") for content in body.get("contents", []) for part in content.get("parts", [])]
+    return "".join(parts)
+
+
+@app.post("/{version}/models/{target}")
+async def models(version: str, target: str, request: Request):
+    model, _, method = target.partition(":")
+    body = await request.json()
+    prompt = prompt_text(body)
+    stats["requests"] += 1
+    stats["in_flight"] += 1
+    stats["max_in_flight"] = max(stats["max_in_flight"], stats["in_flight"])
+    try:
+        error = maybe_error()
+        if error is not None:
+            await asyncio.sleep(sample_latency() / 10)
+            return error
+        text = reply_text(model, prompt)
+        if method == "streamGenerateContent":
+            stats["streams"] += 1
+            return StreamingResponse(stream(text, prompt), media_type="text/event-stream")
+        await asyncio.sleep(sample_latency())
+        return response_body(text, prompt)
+    finally:
+        stats["in_flight"] -= 1
+
+
+async def stream(text: str, prompt: str):
+    # Time to first chunk follows the latency distribution; the rest trickles in
+    words = text.split(" ")
+    size = max(1, math.ceil(len(words) / settings["chunks"]))
+    await asyncio.sleep(sample_latency())
+    for start in range(0, len(words), size):
+        last = start + size >= len(words)
+        chunk = " ".join(words[start:start + size]) + ("" if last else " ")
+        yield f"data: {json.dumps(response_body(chunk, prompt, finished=last))}\r\n\r\n"
+        if not last:
+            await asyncio.sleep(settings["latency_ms"] / 1000 / settings["chunks"])
+
+
+@app.post("/_control")
+async def control(request: Request):
+    settings.update(await request.json())
+    return settings
+
+
+@app.get("/_stats")
+async def get_stats():
+    return dict(stats, settings=settings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8090)
+    parser.add_argument("--latency-ms", type=float, default=settings["latency_ms"], help="median latency")
+    parser.add_argument("--p99-ms", type=float, default=settings["p99_ms"], help="p99 latency")
+    parser.add_argument("--error-rate", type=float, default=settings["error_rate"], help="fraction of failed calls")
+    parser.add_argument("--error-codes", default="429,503", help="comma separated HTTP codes to fail with")
+    parser.add_argument("--words", type=int, default=settings["words"], help="words per answer")
+    parser.add_argument("--chunks", type=int, default=settings["chunks"], help="chunks per streamed answer")
+    args = parser.parse_args()
+    settings.update(latency_ms=args.latency_ms, p99_ms=args.p99_ms, error_rate=args.error_rate,
+                    error_codes=[int(code) for code in args.error_codes.split(",")],
+                    words=args.words, chunks=args.chunks)
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,212 @@
+"""Local stand-in for a Redis server, for the shared session store.
+
+Speaks enough of the Redis protocol (RESP2) for shared_sessions and
+resp_client: strings with expiry and pub/sub. Everything is in memory in a
+single asyncio process, like Redis itself.
+
+    python benchmarks/fake_redis.py --port 6390 --latency-ms 0.5
+
+    SESSION_BACKEND=redis REDIS_URL=redis://127.0.0.1:6390/0 uvicorn main:app --workers 4
+
+--latency-ms delays every command, to see roughly what a network hop costs
+(a pipeline pays it once per command, so it overstates pipelined calls). It
+can also run inside another asyncio program:
+
+    server = await start_server(port=0)
+    port = server.sockets[0].getsockname()[1]
+
+Supported: PING, ECHO, AUTH, SELECT, GET, SET (EX/PX/NX/XX), DEL, EXISTS,
+EXPIRE, PEXPIRE, TTL, PTTL, DBSIZE, FLUSHALL, PUBLISH, SUBSCRIBE, UNSUBSCRIBE
+and QUIT. SELECT is accepted but there is only one keyspace.
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+from collections import defaultdict
+from typing import Dict, Optional, Set, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from resp_client import read_reply
+
+
+class Reply:
+    """Encoders for the reply types."""
+
+    OK = b"+OK\r\n"
+
+    @staticmethod
+    def simple(text: str) -> bytes:
+        return b"+" + text.encode("utf-8") + b"\r\n"
+
+    @staticmethod
+    def error(text: str) -> bytes:
+        return b"-" + text.encode("utf-8") + b"\r\n"
+
+    @staticmethod
+    def integer(value: int) -> bytes:
+        return b":%d\r\n" % value
+
+    @staticmethod
+    def bulk(data: Optional[bytes]) -> bytes:
+        return b"$-1\r\n" if data is None else b"$%d\r\n%s\r\n" % (len(data), data)
+
+    @staticmethod
+    def array(items) -> bytes:
+        return b"*%d\r\n" % len(items) + b"".join(items)
+
+
+class FakeRedis:
+    def __init__(self, latency_ms: float = 0.0):
+        self.latency = latency_ms / 1000
+        self.data: Dict[bytes, Tuple[bytes, Optional[float]]] = {}  # key -> (value, expires_at)
+        self.channels: Dict[bytes, Set[asyncio.StreamWriter]] = defaultdict(set)
+        self.commands = 0
+
+    def _lookup(self, key: bytes) -> Optional[Tuple[bytes, Optional[float]]]:
+        entry = self.data.get(key)
+        if entry is not None and entry[1] is not None and entry[1] <= time.monotonic():
+            # Expired keys are removed lazily, when they are next touched
+            del self.data[key]
+            return None
+        return entry
+
+    def _expire(self, key: bytes, seconds: float) -> bytes:
+        entry = self._lookup(key)
+        if entry is None:
+            return Reply.integer(0)
+        self.data[key] = (entry[0], time.monotonic() + seconds)
+        return Reply.integer(1)
+
+    def _ttl(self, key: bytes, scale: int) -> bytes:
+        entry = self._lookup(key)
+        if entry is None:
+            return Reply.integer(-2)
+        if entry[1] is None:
+            return Reply.integer(-1)
+        return Reply.integer(max(int((entry[1] - time.monotonic()) * scale), 0))
+
+    def _set(self, args: list) -> bytes:
+        key, value, options = args[0], args[1], [arg.upper() for arg in args[2:]]
+        expires_at = None
+        if b"EX" in options:
+            expires_at = time.monotonic() + int(options[options.index(b"EX") + 1])
+        elif b"PX" in options:
+            expires_at = time.monotonic() + int(options[options.index(b"PX") + 1]) / 1000
+        exists = self._lookup(key) is not None
+        if (b"NX" in options and exists) or (b"XX" in options and not exists):
+            return Reply.bulk(None)
+        self.data[key] = (value, expires_at)
+        return Reply.OK
+
+    def _publish(self, channel: bytes, message: bytes) -> bytes:
+        subscribers = self.channels.get(channel, ())
+        payload = Reply.array([Reply.bulk(b"message"), Reply.bulk(channel), Reply.bulk(message)])
+        for writer in list(subscribers):
+            writer.write(payload)
+        return Reply.integer(len(subscribers))
+
+    def execute(self, args: list, writer: asyncio.StreamWriter, subscribed: Set[bytes]) -> bytes:
+        self.commands += 1
+        name = args[0].upper()
+        args = args[1:]
+        if name == b"PING":
+            return Reply.simple("PONG") if not args else Reply.bulk(args[0])
+        if name == b"ECHO":
+            return Reply.bulk(args[0])
+        if name in (b"AUTH", b"SELECT"):
+            return Reply.OK
+        if name == b"GET":
+            entry = self._lookup(args[0])
+            return Reply.bulk(entry[0] if entry else None)
+        if name == b"SET":
+            return self._set(args)
+        if name == b"DEL":
+            return Reply.integer(sum(self.data.pop(key, None) is not None for key in args))
+        if name == b"EXISTS":
+            return Reply.integer(sum(self._lookup(key) is not None for key in args))
+        if name == b"EXPIRE":
+            return self._expire(args[0], int(args[1]))
+        if name == b"PEXPIRE":
+            return self._expire(args[0], int(args[1]) / 1000)
+        if name == b"TTL":
+            return self._ttl(args[0], 1)
+        if name == b"PTTL":
+            return self._ttl(args[0], 1000)
+        if name == b"DBSIZE":
+            return Reply.integer(sum(self._lookup(key) is not None for key in list(self.data)))
+        if name == b"FLUSHALL":
+            self.data.clear()
+            return Reply.OK
+        if name == b"PUBLISH":
+            return self._publish(args[0], args[1])
+        if name == b"SUBSCRIBE":
+            replies = []
+            for channel in args:
+                self.channels[channel].add(writer)
+                subscribed.add(channel)
+                replies.append(Reply.array([Reply.bulk(b"subscribe"), Reply.bulk(channel),
+                                            Reply.integer(len(subscribed))]))
+            return b"".join(replies)
+        if name == b"UNSUBSCRIBE":
+            replies = []
+            for channel in args or list(subscribed):
+                self.channels[channel].discard(writer)
+                subscribed.discard(channel)
+                replies.append(Reply.array([Reply.bulk(b"unsubscribe"), Reply.bulk(channel),
+                                            Reply.integer(len(subscribed))]))
+            return b"".join(replies)
+        return Reply.error(f"ERR unknown command '{name.decode('utf-8', 'replace')}'")
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        subscribed: Set[bytes] = set()
+        try:
+            while True:
+                command = await read_reply(reader)
+                if not isinstance(command, list) or not command:
+                    writer.write(Reply.error("ERR protocol error"))
+                    break
+                if command[0].upper() == b"QUIT":
+                    writer.write(Reply.OK)
+                    break
+                if self.latency:
+                    await asyncio.sleep(self.latency)
+                try:
+                    writer.write(self.execute(command, writer, subscribed))
+                except (IndexError, ValueError):
+                    writer.write(Reply.error("ERR syntax error or wrong number of arguments"))
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            for channel in subscribed:
+                self.channels[channel].discard(writer)
+            writer.close()
+
+
+async def start_server(host: str = "127.0.0.1", port: int = 6390, latency_ms: float = 0.0) -> asyncio.AbstractServer:
+    fake = FakeRedis(latency_ms)
+    return await asyncio.start_server(fake.handle, host, port)
+
+
+async def serve(host: str, port: int, latency_ms: float):
+    server = await start_server(host, port, latency_ms)
+    async with server:
+        await server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=6390)
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="delay before every command")
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(args.host, args.port, args.latency_ms))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
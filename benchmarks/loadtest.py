@@ -0,0 +1,367 @@
+"""Offline load test for main.py against the fake Gemini server.
+
+Starts benchmarks/fake_gemini.py and the FastAPI app under uvicorn, then
+drives mixed traffic at increasing concurrency. No real API quota is used.
+The traffic mix covers chat (JSON and streaming), the five tool endpoints,
+login and save-chat. Each level is reported with:
+
+  * requests/sec and p50/p95/p99 latency, overall and per operation
+    (time to first token for streams)
+  * status breakdown (4xx, including 429s from the rate limiter, and errors)
+  * event-loop lag and RSS for every worker process, read from /api/metrics
+
+    python benchmarks/loadtest.py --concurrency 4,16,64 --duration 15
+    python benchmarks/loadtest.py --workers 2 --latency-ms 800 --error-rate 0.02 --json run.json
+    python benchmarks/loadtest.py --compare run.json     # deltas against a saved run
+    python benchmarks/loadtest.py --workers 4 --sessions redis
+
+By default sessions live in each worker's memory, so with --workers > 1 a
+session made on one worker is unknown to the others. Virtual users keep one
+keep-alive connection each, which pins them to a worker, so this only shows
+up when connections move. --sessions redis starts benchmarks/fake_redis.py
+and shares sessions between the workers (SESSION_BACKEND=redis), which adds
+the session store round trips to every request.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+
+import httpx
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# (operation, weight)
+MIX = [
+    ("chat", 30), ("chat_stream", 10),
+    ("assess", 6), ("skills", 6), ("resume", 6), ("market", 6), ("learning", 6),
+    ("login", 15), ("save_chat", 15),
+]
+ROLES = ["Data Scientist", "Product Manager", "Backend Engineer", "Designer", "Nurse", "Accountant"]
+LEVELS = ["Entry Level", "Mid Level", "Senior Level"]
+FIELDS = ["Technology", "Healthcare", "Finance", "Education"]
+CITIES = ["Remote", "New York", "Berlin", "Bangalore"]
+SKILLS = ["Python", "SQL", "Machine Learning", "Public Speaking", "Figma"]
+STYLES = ["Visual", "Hands-on", "Reading", "Video-based"]
+ANSWERS = [["Office", "Remote", "Hybrid"], ["Team collaboration", "Independent work"],
+           ["Creative tasks", "Analytical tasks"], ["High flexibility", "Standard hours"],
+           ["Varied daily tasks", "Project-based"]]
+QUESTIONS = ["How do I switch careers into {}?", "What salary should a {} ask for?",
+             "Which certifications help a {}?", "How do I prepare for a {} interview?"]
+
+
+def tool_body(op: str, rng: random.Random) -> dict:
+    # Small input pools, so cacheable tools see a realistic share of repeats
+    if op == "assess":
+        return {f"q{i + 1}": rng.choice(choices) for i, choices in enumerate(ANSWERS)}
+    if op == "skills":
+        return {"current_skills": ", ".join(rng.sample(SKILLS, 2)), "target_role": rng.choice(ROLES)}
+    if op == "resume":
+        return {"job_role": rng.choice(ROLES), "experience_level": rng.choice(LEVELS)}
+    if op == "market":
+        return {"field": rng.choice(FIELDS), "location": rng.choice(CITIES)}
+    return {"skill": rng.choice(SKILLS), "learning_style": rng.choice(STYLES)}
+
+
+class Recorder:
+    def __init__(self):
+        self.latency = {}  # op -> [seconds]
+        self.status = {}  # op -> {"2xx": n, "4xx": n, "429": n, "error": n}
+
+    def record(self, op: str, seconds: float, outcome: str):
+        if outcome in ("2xx", "4xx"):
+            self.latency.setdefault(op, []).append(seconds)
+        counts = self.status.setdefault(op, {"2xx": 0, "4xx": 0, "429": 0, "error": 0})
+        counts[outcome] += 1
+
+
+def outcome_of(status: int) -> str:
+    if status == 429:
+        return "429"
+    if status < 400:
+        return "2xx"
+    return "4xx" if status < 500 else "error"
+
+
+class VirtualUser:
+    def __init__(self, client: httpx.AsyncClient, uid: int, rec: Recorder, rng: random.Random):
+        self.client = client
+        self.username = f"load{uid}_{os.getpid()}"
+        self.password = "loadtest-pass-1"
+        self.rec = rec
+        self.rng = rng
+        self.headers = {}
+        self.unsaved = False
+
+    async def setup(self):
+        await self.client.post("/api/signup", json={
+            "username": self.username, "email": f"{self.username}@example.com",
+            "password": self.password, "confirm_password": self.password})
+        await self.login()
+
+    async def login(self) -> int:
+        response = await self.client.post("/api/login", json={"username": self.username, "password": self.password})
+        if response.status_code == 200:
+            self.headers = {"session-id": response.json()["session_id"], "username": self.username}
+            self.unsaved = False
+        return response.status_code
+
+    async def step(self, op: str):
+        start = time.perf_counter()
+        first_token = None
+        try:
+            if op == "save_chat" and not self.unsaved:
+                op = "chat"  # nothing to save yet: have a conversation first
+            if op == "login":
+                status = await self.login()
+            elif op == "save_chat":
+                status = (await self.client.post("/api/save-chat", headers=self.headers)).status_code
+                self.unsaved = False
+            elif op == "chat":
+                question = self.rng.choice(QUESTIONS).format(self.rng.choice(ROLES))
+                status = (await self.client.post("/api/chat", json={"message": question},
+                                                 headers=self.headers)).status_code
+            elif op == "chat_stream":
+                status, first_token = await self.stream()
+            else:
+                status = (await self.client.post(f"/api/{op}", json=tool_body(op, self.rng),
+                                                 headers=self.headers)).status_code
+        except httpx.HTTPError:
+            self.rec.record(op, time.perf_counter() - start, "error")
+            return
+        if op not in ("login", "save_chat") and status == 200:
+            self.unsaved = True
+        # Streams are measured to the first token, the latency a user notices
+        self.rec.record(op, (first_token or time.perf_counter()) - start, outcome_of(status))
+
+    async def stream(self):
+        question = self.rng.choice(QUESTIONS).format(self.rng.choice(ROLES))
+        first_token = None
+        async with self.client.stream("POST", "/api/chat/stream", json={"message": question},
+                                      headers=self.headers) as response:
+            async for line in response.aiter_lines():
+                if first_token is None and line.startswith("data:"):
+                    first_token = time.perf_counter()
+                if line.startswith("event: error"):
+                    return 502, first_token
+        return response.status_code, first_token
+
+
+async def poll_process_stats(client: httpx.AsyncClient, stop: asyncio.Event, processes: dict):
+    while not stop.is_set():
+        try:
+            stats = (await client.get("/api/metrics")).json()["process"]
+        except (httpx.HTTPError, KeyError, ValueError):
+            stats = None
+        if stats:
+            seen = processes.setdefault(stats["pid"], {"rss_bytes": 0, "loop_lag_p99_ms": 0.0, "loop_lag_max_ms": 0.0})
+            seen["rss_bytes"] = stats["rss_bytes"]
+            seen["loop_lag_p99_ms"] = max(seen["loop_lag_p99_ms"], stats["loop_lag_ms"]["p99"])
+            seen["loop_lag_max_ms"] = max(seen["loop_lag_max_ms"], stats["loop_lag_ms"]["max_recent"])
+        try:
+            await asyncio.wait_for(stop.wait(), 0.5)
+        except asyncio.TimeoutError:
+            pass
+
+
+async def run_level(base_url: str, concurrency: int, duration: float, seed: int) -> dict:
+    rec = Recorder()
+    limits = httpx.Limits(max_connections=concurrency + 4, max_keepalive_connections=concurrency + 4)
+    async with httpx.AsyncClient(base_url=base_url, timeout=120, limits=limits) as client:
+        users = [VirtualUser(client, i, rec, random.Random(seed + i)) for i in range(concurrency)]
+        await asyncio.gather(*(user.setup() for user in users))
+        rec.latency.clear()
+        rec.status.clear()
+
+        stop = asyncio.Event()
+        processes = {}
+        poller = asyncio.create_task(poll_process_stats(client, stop, processes))
+        ops, weights = zip(*MIX)
+        deadline = time.perf_counter() + duration
+
+        async def drive(user: VirtualUser):
+            while time.perf_counter() < deadline:
+                await user.step(user.rng.choices(ops, weights)[0])
+
+        started = time.perf_counter()
+        await asyncio.gather(*(drive(user) for user in users))
+        elapsed = time.perf_counter() - started
+        stop.set()
+        await poller
+    return summarize(concurrency, elapsed, rec, processes)
+
+
+def percentiles(values: list) -> dict:
+    if not values:
+        return {"p50": None, "p95": None, "p99": None}
+    ordered = sorted(values)
+    def pick(q):
+        return round(ordered[min(len(ordered) - 1, int(len(ordered) * q))] * 1000, 1)
+    return {"p50": pick(0.5), "p95": pick(0.95), "p99": pick(0.99)}
+
+
+def summarize(concurrency: int, elapsed: float, rec: Recorder, processes: dict) -> dict:
+    ops = {}
+    for op, counts in sorted(rec.status.items()):
+        total = sum(counts.values())
+        ops[op] = dict(counts, count=total, rps=round(total / elapsed, 1), **percentiles(rec.latency.get(op, [])))
+    every = [value for values in rec.latency.values() for value in values]
+    total = sum(op["count"] for op in ops.values())
+    return {
+        "concurrency": concurrency,
+        "seconds": round(elapsed, 2),
+        "requests": total,
+        "rps": round(total / elapsed, 1),
+        "errors": sum(op["error"] for op in ops.values()),
+        "rejected_429": sum(op["429"] for op in ops.values()),
+        **percentiles(every),
+        "ops": ops,
+        "processes": {str(pid): stats for pid, stats in processes.items()},
+    }
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_until_up(url: str, process: subprocess.Popen, timeout: float = 30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if process.poll() is not None:
+            sys.exit(f"{url} exited with {process.returncode}")
+        try:
+            httpx.get(url, timeout=1)
+            return
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    sys.exit(f"{url} did not come up within {timeout:g}s")
+
+
+def wait_until_listening(port: int, process: subprocess.Popen, timeout: float = 30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if process.poll() is not None:
+            sys.exit(f"port {port} exited with {process.returncode}")
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.2)
+    sys.exit(f"port {port} did not come up within {timeout:g}s")
+
+
+def start_servers(args):
+    fake_port, app_port = free_port(), free_port()
+    processes = []
+    fake = subprocess.Popen([sys.executable, os.path.join(ROOT, "benchmarks", "fake_gemini.py"),
+                             "--port", str(fake_port), "--latency-ms", str(args.latency_ms),
+                             "--p99-ms", str(args.p99_ms), "--error-rate", str(args.error_rate),
+                             "--words", str(args.words)])
+    processes.append(fake)
+    wait_until_up(f"http://127.0.0.1:{fake_port}/_stats", fake)
+    # Rate limits would otherwise turn most of the load into 429s; pass
+    # --keep-rate-limits to measure them instead
+    env = dict(os.environ, GEMINI_BASE_URL=f"http://127.0.0.1:{fake_port}", GEMINI_API_KEY="fake",
+               STORAGE_BACKEND=args.storage, SQLITE_PATH=os.path.join(ROOT, "loadtest.db"),
+               SESSION_BACKEND=args.sessions)
+    if not args.keep_rate_limits:
+        for kind in ("GUEST", "USER", "IP"):
+            env[f"RATE_LIMIT_{kind}_PER_MIN"] = "1000000"
+            env[f"RATE_LIMIT_{kind}_BURST"] = "1000000"
+    if args.sessions == "redis":
+        redis_port = free_port()
+        redis = subprocess.Popen([sys.executable, os.path.join(ROOT, "benchmarks", "fake_redis.py"),
+                                  "--port", str(redis_port)])
+        processes.append(redis)
+        wait_until_listening(redis_port, redis)
+        env["REDIS_URL"] = f"redis://127.0.0.1:{redis_port}/0"
+    app = subprocess.Popen([sys.executable, "-m", "uvicorn", "main:app", "--port", str(app_port),
+                            "--workers", str(args.workers), "--log-level", "warning"], cwd=ROOT, env=env)
+    processes.append(app)
+    wait_until_up(f"http://127.0.0.1:{app_port}/terms", app)
+    return processes, f"http://127.0.0.1:{app_port}"
+
+
+def ms(value) -> str:
+    return f"{value:8.1f}" if value is not None else f"{'-':>8}"
+
+
+def report(results: list, baseline: dict = None):
+    previous = {level["concurrency"]: level for level in (baseline or {}).get("levels", [])}
+    print(f"{'conc':>5} {'rps':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>7} {'429':>6}")
+    for level in results:
+        print(f"{level['concurrency']:>5} {level['rps']:>8.1f} {ms(level['p50'])} {ms(level['p95'])} "
+              f"{ms(level['p99'])} {level['errors']:>7} {level['rejected_429']:>6}")
+        old = previous.get(level["concurrency"])
+        if old:
+            deltas = [f"{key} {delta(old[key], level[key])}" for key in ("rps", "p50", "p95", "p99")]
+            print(f"{'':>5} vs baseline: " + ", ".join(deltas))
+    for level in results:
+        print(f"\nconcurrency {level['concurrency']}")
+        print(f"  {'operation':<12}{'count':>7}{'rps':>8}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'4xx':>6}{'429':>6}{'err':>6}")
+        for op, stats in level["ops"].items():
+            print(f"  {op:<12}{stats['count']:>7}{stats['rps']:>8.1f} {ms(stats['p50'])} {ms(stats['p95'])} "
+                  f"{ms(stats['p99'])}{stats['4xx']:>6}{stats['429']:>6}{stats['error']:>6}")
+        for pid, stats in level["processes"].items():
+            print(f"  worker {pid}: rss {stats['rss_bytes'] / 2 ** 20:.1f} MiB, loop lag p99 "
+                  f"{stats['loop_lag_p99_ms']:.1f} ms (max {stats['loop_lag_max_ms']:.1f} ms)")
+
+
+def delta(old, new) -> str:
+    if old is None or new is None or old == 0:
+        return "n/a"
+    return f"{(new - old) / old * 100:+.1f}%"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", default="4,16,64", help="comma separated virtual-user counts")
+    parser.add_argument("--duration", type=float, default=15, help="seconds per concurrency level")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn worker processes")
+    parser.add_argument("--latency-ms", type=float, default=300, help="fake model median latency")
+    parser.add_argument("--p99-ms", type=float, default=1500, help="fake model p99 latency")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fake model failure rate")
+    parser.add_argument("--words", type=int, default=120, help="words per fake answer")
+    parser.add_argument("--storage", default="memory", choices=["memory", "sqlite"])
+    parser.add_argument("--sessions", default="memory", choices=["memory", "redis"],
+                        help="session backend (redis starts benchmarks/fake_redis.py)")
+    parser.add_argument("--keep-rate-limits", action="store_true", help="leave the app's rate limits on")
+    parser.add_argument("--app-url", help="load an already running app instead of starting one")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", help="also write the results to this file")
+    parser.add_argument("--compare", help="print deltas against a previous --json file")
+    args = parser.parse_args()
+
+    processes = []
+    base_url = args.app_url
+    if base_url is None:
+        processes, base_url = start_servers(args)
+    try:
+        results = [asyncio.run(run_level(base_url, int(level), args.duration, args.seed))
+                   for level in args.concurrency.split(",")]
+    finally:
+        for process in reversed(processes):
+            process.terminate()
+            process.wait()
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    print(f"{args.workers} worker(s), {args.sessions} sessions, fake model {args.latency_ms:g} ms median / {args.p99_ms:g} ms p99, "
+          f"{args.error_rate:.0%} errors, {args.duration:g}s per level")
+    report(results, baseline)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"args": vars(args), "levels": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""Bounded conversation context for multi-turn chat.
+
+A chat prompt is the base prompt prefixed with a rolling summary of older
+turns and the last few turns verbatim, trimmed to a token budget so prompt
+size (and latency) stays flat however long the session gets. The summary is
+refreshed in the background after each response, folding in only the turns
+that have aged out of the verbatim window since the last refresh.
+
+Sessions carry the state for this: `summary` (text), `summarized_upto`
+(absolute index of the first turn not yet in the summary) and `summarizing`.
+"""
+import asyncio
+import os
+from typing import Awaitable, Callable, Optional
+
+from session_store import Session
+
+DEFAULT_TOKEN_BUDGET = int(os.getenv("CHAT_CONTEXT_TOKENS", "1500"))
+DEFAULT_RECENT_TURNS = int(os.getenv("CHAT_CONTEXT_TURNS", "4"))
+SUMMARY_MAX_CHARS = 1500
+TURN_MAX_CHARS = 1200
+
+SUMMARY_PROMPT = """You maintain a running summary of a career-advice conversation.
+Current summary:
+{summary}
+
+New exchanges to fold in:
+{turns}
+
+Rewrite the summary to include the new exchanges. Keep the user's goals, background,
+constraints and the advice already given. At most 150 words, plain prose."""
+
+
+def estimate_tokens(text: str) -> int:
+    # ~4 characters per token is close enough for budgeting English text
+    return len(text) // 4 + 1
+
+
+def _clip(text: str, limit: int) -> str:
+    return text if len(text) <= limit else text[:limit] + "..."
+
+
+def format_turn(turn) -> str:
+    return f"User: {_clip(turn[0], TURN_MAX_CHARS)}\nAdvisor: {_clip(turn[1], TURN_MAX_CHARS)}"
+
+
+class ContextBuilder:
+    def __init__(self, gateway, token_budget: int = DEFAULT_TOKEN_BUDGET,
+                 recent_turns: int = DEFAULT_RECENT_TURNS, summary_model: Optional[str] = None,
+                 on_summary: Optional[Callable[[Session], Awaitable[None]]] = None):
+        self.gateway = gateway
+        self.summary_model = summary_model
+        # Awaited after a session's summary changes (shared session stores write it back)
+        self.on_summary = on_summary
+        self.token_budget = token_budget
+        self.recent_turns = recent_turns
+        self._tasks = set()
+
+    def build(self, session: Session, prompt: str) -> str:
+        history = session.chat_history
+        summary = session.current_summary()
+        if not history and not summary:
+            return prompt
+
+        budget = self.token_budget - estimate_tokens(prompt)
+        sections = []
+        if summary:
+            sections.append(f"Summary of the earlier conversation:\n{summary}")
+            budget -= estimate_tokens(sections[0])
+
+        # Newest turns first until the window or the budget runs out
+        recent = []
+        for turn in reversed(history[-self.recent_turns:] if self.recent_turns else []):
+            text = format_turn(turn)
+            cost = estimate_tokens(text)
+            if cost > budget:
+                break
+            recent.append(text)
+            budget -= cost
+        if recent:
+            sections.append("Recent conversation:\n" + "\n\n".join(reversed(recent)))
+
+        if not sections:
+            return prompt
+        return "\n\n".join(sections) + "\n\n" + prompt
+
+    def schedule_summary(self, session: Session):
+        """Fold turns that left the verbatim window into the summary, in the background."""
+        if session.summarizing:
+            return
+        start, end = self._pending_range(session)
+        if start >= end:
+            return
+        session.summarizing = True
+        task = asyncio.create_task(self._summarize(session, start, end))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    def _pending_range(self, session: Session):
+        base = session.turn_base
+        start = max(session.summarized_upto, base)
+        end = base + max(len(session.chat_history) - self.recent_turns, 0)
+        return start, end
+
+    async def _summarize(self, session: Session, start: int, end: int):
+        try:
+            marker = session.summarized_upto
+            base = session.turn_base
+            turns = session.chat_history[max(start - base, 0):max(end - base, 0)]
+            summary = session.summary
+            if turns:
+                prompt = SUMMARY_PROMPT.format(summary=summary or "(none yet)",
+                                               turns="\n\n".join(format_turn(turn) for turn in turns))
+                summary = _clip((await self.gateway.generate(prompt, model=self.summary_model)).strip(), SUMMARY_MAX_CHARS)
+            # The chat was cleared while we waited: this summary is stale
+            if session.summarized_upto != marker:
+                return
+            session.summary = summary
+            session.summarized_upto = end
+            if self.on_summary is not None:
+                await self.on_summary(session)
+        except Exception:
+            # Best effort: the next response retries from the same point
+            pass
+        finally:
+            session.summarizing = False
+
+    async def drain(self):
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
@@ -0,0 +1,96 @@
+"""Password hashing and verification off the event loop.
+
+Passwords are hashed with scrypt and stored as
+
+    scrypt$<n>$<r>$<p>$<salt b64>$<hash b64>
+
+The work factor comes from PASSWORD_SCRYPT_N (a power of two). Hashing runs
+in a dedicated pool so a login never stalls the event loop: a thread pool by
+default (OpenSSL's scrypt releases the GIL), or a process pool with
+CREDENTIAL_POOL=process. Hashes made with other parameters, and plaintext
+passwords stored before hashing was introduced, still verify and are flagged
+for rehashing.
+"""
+import asyncio
+import base64
+import hashlib
+import hmac
+import os
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Optional, Tuple
+
+SCRYPT_N = int(os.getenv("PASSWORD_SCRYPT_N", str(2 ** 14)))
+SCRYPT_R = 8
+SCRYPT_P = 1
+SALT_BYTES = 16
+HASH_BYTES = 32
+PREFIX = "scrypt"
+
+POOL_KIND = os.getenv("CREDENTIAL_POOL", "thread")
+POOL_WORKERS = int(os.getenv("CREDENTIAL_WORKERS", str(os.cpu_count() or 1)))
+
+_executor: Optional[Executor] = None
+
+
+def _scrypt(password: str, salt: bytes, n: int, r: int, p: int) -> bytes:
+    # OpenSSL needs ~128 * n * r * p bytes; leave headroom over its 32 MiB default
+    maxmem = 128 * n * r * p + 16 * 1024 * 1024
+    return hashlib.scrypt(password.encode("utf-8"), salt=salt, n=n, r=r, p=p, maxmem=maxmem, dklen=HASH_BYTES)
+
+
+def hash_password_sync(password: str, n: Optional[int] = None) -> str:
+    n = n or SCRYPT_N
+    salt = os.urandom(SALT_BYTES)
+    digest = _scrypt(password, salt, n, SCRYPT_R, SCRYPT_P)
+    return "$".join([PREFIX, str(n), str(SCRYPT_R), str(SCRYPT_P),
+                     base64.b64encode(salt).decode(), base64.b64encode(digest).decode()])
+
+
+def verify_password_sync(password: str, stored: str) -> bool:
+    if not stored.startswith(PREFIX + "$"):
+        # Legacy plaintext record
+        return hmac.compare_digest(password.encode("utf-8"), stored.encode("utf-8"))
+    try:
+        _, n, r, p, salt, digest = stored.split("$")
+        expected = base64.b64decode(digest)
+        actual = _scrypt(password, base64.b64decode(salt), int(n), int(r), int(p))
+    except ValueError:
+        return False
+    return hmac.compare_digest(actual, expected)
+
+
+def needs_rehash(stored: str, n: Optional[int] = None) -> bool:
+    return stored.split("$")[:4] != [PREFIX, str(n or SCRYPT_N), str(SCRYPT_R), str(SCRYPT_P)]
+
+
+def _get_executor() -> Executor:
+    global _executor
+    if _executor is None:
+        pool = ProcessPoolExecutor if POOL_KIND == "process" else ThreadPoolExecutor
+        _executor = pool(max_workers=POOL_WORKERS)
+    return _executor
+
+
+async def hash_password(password: str) -> str:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_get_executor(), hash_password_sync, password)
+
+
+async def verify_password(password: str, stored: str) -> Tuple[bool, Optional[str]]:
+    """Check `password` against `stored` without blocking the event loop.
+
+    Returns (ok, new_hash). `new_hash` is set when the password matched but was
+    stored with outdated parameters (or in plaintext); the caller should save it.
+    """
+    loop = asyncio.get_running_loop()
+    ok = await loop.run_in_executor(_get_executor(), verify_password_sync, password, stored)
+    if ok and needs_rehash(stored):
+        return True, await hash_password(password)
+    return ok, None
+
+
+def shutdown():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False)
+        _executor = None
@@ -0,0 +1,43 @@
+"""JSON encoding for API responses, through orjson when it is installed.
+
+FastAPI's default path runs every returned dict through `jsonable_encoder`
+(a recursive copy that checks each value's type) and then stdlib `json`. For
+a long history that is thousands of small dicts and strings, encoded twice.
+Handlers whose payloads are already plain dicts, lists and strings return a
+`FastJSONResponse` directly, which skips `jsonable_encoder` and hands the
+payload straight to orjson. orjson is several times faster than stdlib
+`json`, and its output is compact UTF-8.
+
+Without orjson, the stdlib fallback writes the same compact output
+(`benchmarks/bench_json.py` compares the two).
+"""
+import json
+from typing import Any
+
+from starlette.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def dumps(payload: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(payload)
+    return json.dumps(payload, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+
+def dumps_str(payload: Any) -> str:
+    return dumps(payload).decode("utf-8")
+
+
+def loads(data):
+    return orjson.loads(data) if orjson is not None else json.loads(data)
+
+
+class FastJSONResponse(JSONResponse):
+    """A JSONResponse for payloads that are already JSON types: no jsonable_encoder pass."""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
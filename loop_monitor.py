@@ -0,0 +1,56 @@
+"""Process health probes: event-loop lag and resident memory.
+
+`LoopLagMonitor.run()` sleeps for a fixed interval and records how late it
+wakes up. A CPU-bound handler or blocking call anywhere in the process shows
+up as lag, which is the number that explains latency that upstream timings
+do not.
+"""
+import asyncio
+import os
+import sys
+import time
+from collections import deque
+
+DEFAULT_INTERVAL = 0.1
+WINDOW = 100  # samples kept: the last ten seconds at the default interval
+
+
+def rss_bytes() -> int:
+    """Current resident set size (peak RSS where /proc is unavailable)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        try:
+            import resource  # POSIX only
+        except ImportError:
+            return 0
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # ru_maxrss is bytes on macOS, kilobytes elsewhere
+        return peak if sys.platform == "darwin" else peak * 1024
+
+
+class LoopLagMonitor:
+    def __init__(self, interval: float = DEFAULT_INTERVAL):
+        self.interval = interval
+        self._samples = deque(maxlen=WINDOW)
+        self.max_lag = 0.0
+
+    async def run(self):
+        while True:
+            start = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, time.perf_counter() - start - self.interval)
+            self._samples.append(lag)
+            self.max_lag = max(self.max_lag, lag)
+
+    def stats(self) -> dict:
+        ordered = sorted(self._samples)
+        def pick(q):
+            return round(ordered[min(len(ordered) - 1, int(len(ordered) * q))] * 1000, 2) if ordered else 0.0
+        return {
+            "pid": os.getpid(),
+            "rss_bytes": rss_bytes(),
+            "loop_lag_ms": {"p50": pick(0.5), "p99": pick(0.99), "max_recent": pick(1.0),
+                            "max": round(self.max_lag * 1000, 2)},
+        }
@@ -1,21 +1,72 @@
 from fastapi import FastAPI, HTTPException, Request
-from fastapi.staticfiles import StaticFiles
-from fastapi.responses import HTMLResponse, FileResponse
+from fastapi.responses import HTMLResponse, StreamingResponse, PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
-from google import genai
+from pydantic import BaseModel, create_model
+from contextlib import asynccontextmanager
 import os
+import time
+import asyncio
 from datetime import datetime
 from dotenv import load_dotenv
 from typing import List, Dict, Optional
+from model_gateway import ModelGateway, GatewayTimeout, ClientDisconnected
+from resilience import UpstreamUnavailable
+from rate_limit import RateLimiter, AdmissionControl, Rejected
+from response_cache import ResponseCache
+from session_store import Session, Turn
+from shared_sessions import open_sessions, SessionStoreUnavailable
+from storage import open_storage, new_chat_id, AlreadyExists, CHAT_PAGE_SIZE
+from write_behind import WriteBehind
+from context_builder import ContextBuilder
+from loop_monitor import LoopLagMonitor
+from metrics import registry, MetricsMiddleware, Trace, SIZE_BUCKETS
+from static_assets import StaticAssets, CompressJSON
+from fast_json import FastJSONResponse, dumps_str
+from tools import TOOLS, MODEL_TIERS, Tool, ToolCall, ToolInputError, prepare
+import credentials
+import tools
 
-# Load API key (dotenv for local dev, Vercel injects env vars automatically)
+# Load API key (dotenv for local dev, Vercel injects env vars automatically).
+# The Gemini client itself is created by the gateway on the first model call.
+# Tools pick their own model tier (see tools.py); MODEL is the default.
 load_dotenv()
-api_key = os.getenv("GEMINI_API_KEY") or os.getenv("GOOGLE_API_KEY")
-client = genai.Client(api_key=api_key)
-MODEL = "gemini-2.5-flash"
+MODEL = MODEL_TIERS["strong"]
+gateway = ModelGateway(MODEL)
+response_cache = ResponseCache()
+# Summaries are bookkeeping, not answers: keep them on the fast tier
+context_builder = ContextBuilder(gateway, summary_model=MODEL_TIERS["fast"],
+                                 on_summary=lambda session: sessions.save_summary(session))
+loop_monitor = LoopLagMonitor()
+# Opt-in: needs numpy, and a close-but-wrong match answers a different question
+semantic_cache = None
+if os.getenv("SEMANTIC_CACHE", "0") == "1":
+    from semantic_cache import SemanticCache
+    semantic_cache = SemanticCache()
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await sessions.start()
+    sweeper = asyncio.create_task(sessions.run_sweeper())
+    lag_probe = asyncio.create_task(loop_monitor.run())
+    writer = write_behind.start()
+    compactor = asyncio.create_task(compact_chats())
+    yield
+    sweeper.cancel()
+    lag_probe.cancel()
+    compactor.cancel()
+    # Flush queued writes before the storage goes away
+    await write_behind.close()
+    writer.cancel()
+    await sessions.close()
+    storage.close()
+    credentials.shutdown()
+
+# Handlers with large payloads return FastJSONResponse themselves to skip
+# jsonable_encoder; the default class still gives everything else orjson
+app = FastAPI(lifespan=lifespan, default_response_class=FastJSONResponse)
+app.add_middleware(MetricsMiddleware)
+# History and saved-chat payloads get large; streams are left uncompressed
+app.add_middleware(CompressJSON)
 
 # Add CORS middleware
 app.add_middleware(
@@ -26,24 +77,39 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-app.mount("/static", StaticFiles(directory="static"), name="static")
+# Shared session backend down (SESSION_BACKEND=redis): tell clients to retry
+SESSIONS_UNAVAILABLE = "Sessions are temporarily unavailable, please try again shortly"
+
+@app.exception_handler(SessionStoreUnavailable)
+async def session_store_unavailable(request: Request, e: SessionStoreUnavailable):
+    return FastJSONResponse({"detail": SESSIONS_UNAVAILABLE}, status_code=503, headers={"Retry-After": "1"})
+
+# Static files are read, fingerprinted and compressed once, at startup
+static_assets = StaticAssets("static")
+
+def static_file(request: Request, name: str):
+    response = static_assets.response(request, name)
+    if response is None:
+        raise HTTPException(status_code=404, detail="Not Found")
+    return response
+
+@app.api_route("/static/{name}", methods=["GET", "HEAD"])
+async def static(name: str, request: Request):
+    return static_file(request, name)
 
 @app.get("/contact", response_class=HTMLResponse)
-async def contact_page():
-    return FileResponse('static/contact.html')
+async def contact_page(request: Request):
+    return static_file(request, "contact.html")
 
 @app.get("/terms", response_class=HTMLResponse)
-async def terms_page():
-    return FileResponse('static/terms.html')
+async def terms_page(request: Request):
+    return static_file(request, "terms.html")
 
 @app.get("/privacy", response_class=HTMLResponse)
-async def privacy_page():
-    return FileResponse('static/privacy.html')
+async def privacy_page(request: Request):
+    return static_file(request, "privacy.html")
 
 # Data models
-class ChatMessage(BaseModel):
-    message: str
-
 class AuthData(BaseModel):
     username: str
     password: str
@@ -60,36 +126,49 @@ class ContactData(BaseModel):
 class ForgotPasswordData(BaseModel):
     email: str
 
-class AssessmentData(BaseModel):
-    q1: str
-    q2: str
-    q3: str
-    q4: str
-    q5: str
-
-class SkillsData(BaseModel):
-    current_skills: str
-    target_role: str
-
-class ResumeData(BaseModel):
-    job_role: str
-    experience_level: str
+# Request models for the advisor tools are generated from the registry
+TOOL_MODELS = {
+    tool.name: create_model(tool.schema_name, **{field: (str, ...) for field in tool.fields})
+    for tool in TOOLS.values()
+}
 
-class MarketData(BaseModel):
-    field: str
-    location: str
+# Storage. Chat writes go through the write-behind queue, off the request path;
+# handlers run everything else in a worker thread, since another process can
+# hold the SQLite write lock for a while
+storage = open_storage()
+write_behind = WriteBehind(storage)
+# In-process by default; SESSION_BACKEND=redis shares them across workers and nodes
+sessions = open_sessions()
+CHAT_COMPACT_INTERVAL = float(os.getenv("CHAT_COMPACT_INTERVAL", "3600"))
+CHAT_COMPACT_IDLE = float(os.getenv("CHAT_COMPACT_IDLE", str(24 * 3600)))
 
-class LearningData(BaseModel):
-    skill: str
-    learning_style: str
+async def compact_chats():
+    # Queued like any other write, so it never races the appends
+    while True:
+        await asyncio.sleep(CHAT_COMPACT_INTERVAL)
+        await write_behind.put(("compact_chats", CHAT_COMPACT_IDLE))
 
-# Storage
-users_db = {}
-sessions = {}
+async def generate_reply(call: ToolCall, request: Request, trace: Trace) -> str:
+    async def generate(call: ToolCall) -> str:
+        # Cached results are shared between coalesced callers, so they are
+        # not tied to this client's connection
+        with MODEL_LATENCY.time(model=call.model, mode="generate"):
+            return await gateway.generate(call.prompt, model=call.model, timeout=call.tool.timeout,
+                                          config=call.config, fallback_model=call.fallback_model,
+                                          slo=call.latency_slo, request=None if call.cacheable else request)
+    try:
+        return await tools.run(call, generate, response_cache, trace, semantic_cache)
+    except GatewayTimeout as e:
+        raise HTTPException(status_code=504, detail=f"Error: {str(e)}")
+    except ClientDisconnected:
+        raise HTTPException(status_code=499, detail="Client closed request")
+    except UpstreamUnavailable as e:
+        raise HTTPException(status_code=503, detail="The advisor is busy right now, please try again shortly",
+                            headers={"Retry-After": str(max(1, round(e.retry_after)))})
 
 @app.get("/", response_class=HTMLResponse)
-async def read_root():
-    return FileResponse('static/index.html')
+async def read_root(request: Request):
+    return static_file(request, "index.html")
 
 @app.post("/api/signup")
 async def signup(data: AuthData):
@@ -99,15 +178,17 @@ async def signup(data: AuthData):
         raise HTTPException(status_code=400, detail="Passwords don't match")
     if len(data.password) < 6:
         raise HTTPException(status_code=400, detail="Password must be at least 6 characters")
-    if data.username in users_db:
+    if await asyncio.to_thread(storage.get_user, data.username) is not None:
         raise HTTPException(status_code=400, detail="Username already exists")
     
-    users_db[data.username] = {
-        "email": data.email,
-        "password": data.password,
-        "full_name": data.full_name or data.username,
-        "chat_history": []
-    }
+    password_hash = await credentials.hash_password(data.password)
+    try:
+        await asyncio.to_thread(storage.create_user, data.username, data.email, password_hash,
+                                data.full_name or data.username)
+    except AlreadyExists as e:
+        detail = "Email already registered" if e.field == "email" else "Username already exists"
+        raise HTTPException(status_code=400, detail=detail)
+    
     return {"message": "Account created successfully! Please login."}
 
 @app.post("/api/login")
@@ -115,167 +196,249 @@ async def login(data: AuthData):
     if not data.username or not data.password:
         raise HTTPException(status_code=400, detail="Please enter username and password")
     
-    if data.username not in users_db or users_db[data.username]["password"] != data.password:
+    user = await asyncio.to_thread(storage.get_user, data.username)
+    if user is None:
         raise HTTPException(status_code=400, detail="Invalid username or password")
     
-    session_id = f"{data.username}_{datetime.now().timestamp()}"
-    sessions[session_id] = {
-        "username": data.username,
-        "chat_history": [],
-        "saved": True
-    }
+    ok, new_hash = await credentials.verify_password(data.password, user["password"])
+    if not ok:
+        raise HTTPException(status_code=400, detail="Invalid username or password")
+    if new_hash:
+        # Work factor changed (or legacy plaintext): upgrade transparently
+        await asyncio.to_thread(storage.update_user, data.username, password=new_hash)
     
-    # Ensure chat_history exists
-    if "chat_history" not in users_db[data.username]:
-        users_db[data.username]["chat_history"] = []
+    session_id, _ = await sessions.acreate(data.username)
     
-    chat_list = [f"{chat['timestamp']} - {chat['title']}" for chat in users_db[data.username]["chat_history"]]
-    return {"message": f"Welcome back, {data.username}!", "session_id": session_id, "chat_history": chat_list}
+    # First page of saved-chat metadata only; the rest comes from /api/chats
+    await write_behind.barrier()
+    chat_list, next_cursor = await asyncio.to_thread(storage.list_chats, data.username)
+    return FastJSONResponse({"message": f"Welcome back, {data.username}!", "session_id": session_id,
+                             "chat_history": chat_list, "next_cursor": next_cursor})
 
-@app.post("/api/chat")
-async def chat(data: ChatMessage, request: Request):
-    session_id = request.headers.get("session-id", "guest")
-    
-    if not data.message.strip():
-        raise HTTPException(status_code=400, detail="Message cannot be empty")
-    
+# History is sent as deltas: every turn carries a monotonically increasing
+# index that survives clear-chat and trimming (see session_store).
+HISTORY_PAGE_SIZE = 50
+HISTORY_MAX_PAGE_SIZE = 200
+
+def turn_payload(index: int, turn: Turn) -> dict:
+    return {"index": index, "user": turn[0], "bot": turn[1]}
+
+def last_turn_index(session: Session) -> int:
+    return session.turn_base + len(session.chat_history) - 1
+
+def turns_since(session: Session, since: int, limit: Optional[int] = None) -> list:
+    base = session.turn_base
+    start = max(since + 1 - base, 0)
+    stop = None if limit is None else start + limit
+    return [turn_payload(base + start + i, turn) for i, turn in enumerate(session.chat_history[start:stop])]
+
+async def persist_turns(session: Session):
+    """Append the turns the session's saved chat does not have yet."""
+    turns = session.chat_history[max(session.saved_upto - session.turn_base, 0):]
+    if turns:
+        await write_behind.put(("append_turns", session.chat_owner, session.chat_id, tuple(turns)))
+    session.saved_upto = last_turn_index(session) + 1
+
+async def record_turn(session: Session, user_input: str, response_text: str) -> dict:
+    sessions.append_turn(session, (user_input, response_text))
+    if session.chat_id is not None:
+        # A saved chat is a live record: later turns are appended as they happen
+        await persist_turns(session)
+    await sessions.save(session)
+    return turn_payload(last_turn_index(session), session.chat_history[-1])
+
+def turn_result(session_id: str, session: Session, response_text: str, turn: dict, since: Optional[int]) -> dict:
+    result = {"response": response_text, "turn": turn, "turn_index": turn["index"],
+              "session_id": session_id, "updated_history": True}
+    if since is not None:
+        # Client asked to resync: include everything it has not seen yet
+        result["turns"] = turns_since(session, since)
+    return result
+
+def since_param(request: Request) -> Optional[int]:
+    since = request.query_params.get("since")
     try:
-        prompt = f"As a career advisor, answer: {data.message}"
-        response = client.models.generate_content(model=MODEL, contents=prompt)
-        response_text = response.text
-        
-        if session_id not in sessions:
-            sessions[session_id] = {"chat_history": [], "saved": True}
-        
-        sessions[session_id]["chat_history"].append([data.message, response_text])
-        sessions[session_id]["saved"] = False
-        
-        return {"response": response_text, "history": sessions[session_id]["chat_history"], "updated_history": True}
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error: {str(e)}")
+        return int(since) if since is not None else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="'since' must be an integer turn index")
 
-@app.post("/api/assess")
-async def assess_career(data: AssessmentData, request: Request):
-    session_id = request.headers.get("session-id", "guest")
-    
-    if not all([data.q1, data.q2, data.q3, data.q4, data.q5]):
-        raise HTTPException(status_code=400, detail="Please answer all questions")
-    
+def prepare_call(tool: Tool, data: BaseModel, session: Session, trace: Trace) -> ToolCall:
     try:
-        prompt = f"""Career assessment:
-        1. Work environment: {data.q1}
-        2. Work style: {data.q2}
-        3. Task preference: {data.q3}
-        4. Work-life balance: {data.q4}
-        5. Routine preference: {data.q5}
-        
-        Suggest 3 career paths with explanations."""
-        
-        response = client.models.generate_content(model=MODEL, contents=prompt)
-        response_text = response.text
-        
-        if session_id not in sessions:
-            sessions[session_id] = {"chat_history": [], "saved": True}
-        
-        user_input = f"Career Assessment: {data.q1}, {data.q2}, {data.q3}, {data.q4}, {data.q5}"
-        sessions[session_id]["chat_history"].append([user_input, response_text])
-        sessions[session_id]["saved"] = False
-        
-        return {"response": response_text, "history": sessions[session_id]["chat_history"], "updated_history": True}
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error: {str(e)}")
+        call = prepare(tool, data.model_dump(), MODEL, trace,
+                       context=lambda prompt: context_builder.build(session, prompt))
+    except ToolInputError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    PROMPT_CHARS.observe(len(call.prompt), tool=tool.name)
+    return call
 
-@app.post("/api/skills")
-async def analyze_skills(data: SkillsData, request: Request):
-    session_id = request.headers.get("session-id", "guest")
-    
-    if not data.current_skills or not data.target_role:
-        raise HTTPException(status_code=400, detail="Please fill both fields")
-    
+async def answer(request: Request, tool: Tool, data: BaseModel):
+    trace = Trace(tool.path)
+    since = since_param(request)
+    session_id, session = await sessions.aget_or_create(request.headers.get("session-id"))
+    call = prepare_call(tool, data, session, trace)
     try:
-        prompt = f"Skills: {data.current_skills}, Target: {data.target_role}. Identify gaps and learning path."
-        response = client.models.generate_content(model=MODEL, contents=prompt)
-        response_text = response.text
-        
-        if session_id not in sessions:
-            sessions[session_id] = {"chat_history": [], "saved": True}
-        
-        user_input = f"Skills Analysis: {data.current_skills} -> {data.target_role}"
-        sessions[session_id]["chat_history"].append([user_input, response_text])
-        sessions[session_id]["saved"] = False
-        
-        return {"response": response_text, "history": sessions[session_id]["chat_history"], "updated_history": True}
+        response_text = await generate_reply(call, request, trace)
+        RESPONSE_CHARS.observe(len(response_text), tool=tool.name)
+        with trace.span("persist"):
+            turn = await record_turn(session, call.user_input, response_text)
+            if tool.with_context:
+                context_builder.schedule_summary(session)
+        with trace.span("serialize"):
+            response = FastJSONResponse(turn_result(session_id, session, response_text, turn, since))
+        response.headers["Server-Timing"] = trace.server_timing()
+        return response
+    except (HTTPException, SessionStoreUnavailable):
+        # The latter becomes a 503 with Retry-After (session_store_unavailable)
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error: {str(e)}")
 
-@app.post("/api/resume")
-async def resume_tips(data: ResumeData, request: Request):
-    session_id = request.headers.get("session-id", "guest")
-    
-    if not data.job_role or not data.experience_level:
-        raise HTTPException(status_code=400, detail="Please fill both fields")
+def sse_event(payload: dict, event: Optional[str] = None) -> str:
+    data = dumps_str(payload)
+    return f"event: {event}\ndata: {data}\n\n" if event else f"data: {data}\n\n"
+
+async def stream_answer(request: Request, tool: Tool, data: BaseModel) -> StreamingResponse:
+    since = since_param(request)
+    session_id, session = await sessions.aget_or_create(request.headers.get("session-id"))
+    trace = Trace(tool.path + "/stream")
+    call = prepare_call(tool, data, session, trace)
     
-    try:
-        prompt = f"Resume tips for {data.job_role} at {data.experience_level} level. Give 5 specific tips."
-        response = client.models.generate_content(model=MODEL, contents=prompt)
-        response_text = response.text
-        
-        if session_id not in sessions:
-            sessions[session_id] = {"chat_history": [], "saved": True}
+    async def events():
+        tokens = asyncio.Queue()
         
-        user_input = f"Resume Tips: {data.job_role} ({data.experience_level})"
-        sessions[session_id]["chat_history"].append([user_input, response_text])
-        sessions[session_id]["saved"] = False
+        async def generate(call: ToolCall) -> str:
+            # Tokens go to this request's queue as they arrive. Requests
+            # coalesced onto this call by the cache get the whole text at the end
+            parts = []
+            started = time.perf_counter()
+            async for token in gateway.stream(call.prompt, model=call.model, timeout=tool.timeout,
+                                              config=call.config, fallback_model=call.fallback_model,
+                                              slo=call.latency_slo):
+                if not parts:
+                    TIME_TO_FIRST_TOKEN.observe(time.perf_counter() - started, model=call.model)
+                parts.append(token)
+                tokens.put_nowait(token)
+            MODEL_LATENCY.observe(time.perf_counter() - started, model=call.model, mode="stream")
+            return "".join(parts)
         
-        return {"response": response_text, "history": sessions[session_id]["chat_history"], "updated_history": True}
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error: {str(e)}")
+        # Same cache, semantic cache and single-flight path as the JSON endpoints
+        reply = asyncio.ensure_future(tools.run(call, generate, response_cache, trace, semantic_cache))
+        reply.add_done_callback(lambda _: tokens.put_nowait(None))
+        streamed = False
+        try:
+            while (token := await tokens.get()) is not None:
+                streamed = True
+                yield sse_event({"token": token})
+            response_text = reply.result()
+        except UpstreamUnavailable as e:
+            yield sse_event({"detail": "The advisor is busy right now, please try again shortly",
+                             "retry_after": max(1, round(e.retry_after))}, event="error")
+            return
+        except Exception as e:
+            yield sse_event({"detail": f"Error: {str(e)}"}, event="error")
+            return
+        finally:
+            # Client went away: stop our own upstream call (a shared one carries on)
+            reply.cancel()
+        if not streamed:
+            # Cached or coalesced: the answer arrives as one chunk
+            yield sse_event({"token": response_text})
+        RESPONSE_CHARS.observe(len(response_text), tool=tool.name)
+        try:
+            with trace.span("persist"):
+                turn = await record_turn(session, call.user_input, response_text)
+                if tool.with_context:
+                    context_builder.schedule_summary(session)
+        except SessionStoreUnavailable:
+            # The tokens are already out, so this has to be an event, not a 503
+            yield sse_event({"detail": SESSIONS_UNAVAILABLE, "retry_after": 1}, event="error")
+            return
+        with trace.span("serialize"):
+            done = sse_event(turn_result(session_id, session, response_text, turn, since), event="done")
+        yield done
+    
+    # Later stages happen after the headers are sent, so only validate and
+    # build_prompt make it into Server-Timing; all stages reach /metrics
+    return AdmittedStream(events(), media_type="text/event-stream",
+                          headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no",
+                                   "Server-Timing": trace.server_timing()})
+
+# Admission: per-client token buckets, then a global cap on concurrent LLM requests
+rate_limiter = RateLimiter()
+admission = AdmissionControl()
+# Only trust X-Forwarded-For behind a proxy that sets it, or clients can spoof their IP
+TRUST_FORWARDED_FOR = os.getenv("TRUST_FORWARDED_FOR", "0") == "1"
+
+def client_ip(request: Request) -> Optional[str]:
+    forwarded = request.headers.get("x-forwarded-for")
+    if TRUST_FORWARDED_FOR and forwarded:
+        return forwarded.split(",")[0].strip()
+    return request.client.host if request.client else None
+
+def too_many_requests(e: Rejected) -> HTTPException:
+    return HTTPException(status_code=429, detail="Too many requests, please slow down",
+                         headers={"Retry-After": str(max(1, round(e.retry_after)))})
 
-@app.post("/api/market")
-async def market_insights(data: MarketData, request: Request):
-    session_id = request.headers.get("session-id", "guest")
+async def admit(request: Request):
+    session_id = request.headers.get("session-id")
+    session = await sessions.aget(session_id)
+    try:
+        rate_limiter.check(session.username if session else None, session_id if session else None,
+                           client_ip(request))
+        with QUEUE_WAIT.time():
+            await admission.acquire()
+    except Rejected as e:
+        raise too_many_requests(e)
+
+class AdmittedStream(StreamingResponse):
+    """A stream that holds an admission slot until it has been sent.
+
+    Released around the whole response rather than inside the body
+    generator: when sending the headers fails (the client is already gone)
+    the generator is never started, so its `finally` would never run.
+    """
+    release = None
     
-    if not data.field or not data.location:
-        raise HTTPException(status_code=400, detail="Please fill both fields")
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            self.release_slot()
     
-    try:
-        prompt = f"Job market insights for {data.field} in {data.location}. Include salary and trends."
-        response = client.models.generate_content(model=MODEL, contents=prompt)
-        response_text = response.text
-        
-        if session_id not in sessions:
-            sessions[session_id] = {"chat_history": [], "saved": True}
-        
-        user_input = f"Market Insights: {data.field} in {data.location}"
-        sessions[session_id]["chat_history"].append([user_input, response_text])
-        sessions[session_id]["saved"] = False
-        
-        return {"response": response_text, "history": sessions[session_id]["chat_history"], "updated_history": True}
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error: {str(e)}")
+    def release_slot(self):
+        release, self.release = self.release, None
+        if release is not None:
+            release()
 
-@app.post("/api/learning")
-async def learning_resources(data: LearningData, request: Request):
-    session_id = request.headers.get("session-id", "guest")
+# One JSON and one streaming endpoint per registered tool
+def add_tool_routes(tool: Tool):
+    model = TOOL_MODELS[tool.name]
     
-    if not data.skill or not data.learning_style:
-        raise HTTPException(status_code=400, detail="Please fill both fields")
+    async def run(data: model, request: Request):
+        await admit(request)
+        try:
+            return await answer(request, tool, data)
+        finally:
+            admission.release()
     
-    try:
-        prompt = f"Learning resources for {data.skill} with {data.learning_style} learning style."
-        response = client.models.generate_content(model=MODEL, contents=prompt)
-        response_text = response.text
-        
-        if session_id not in sessions:
-            sessions[session_id] = {"chat_history": [], "saved": True}
-        
-        user_input = f"Learning Resources: {data.skill} ({data.learning_style})"
-        sessions[session_id]["chat_history"].append([user_input, response_text])
-        sessions[session_id]["saved"] = False
-        
-        return {"response": response_text, "history": sessions[session_id]["chat_history"], "updated_history": True}
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error: {str(e)}")
+    async def run_stream(data: model, request: Request):
+        await admit(request)
+        try:
+            response = await stream_answer(request, tool, data)
+        except BaseException:
+            admission.release()
+            raise
+        # The slot is held until the stream finishes or the client goes away
+        response.release = admission.release
+        return response
+    
+    run.__name__ = f"{tool.name}_tool"
+    run_stream.__name__ = f"{tool.name}_tool_stream"
+    app.post(tool.path)(run)
+    app.post(tool.path + "/stream")(run_stream)
+
+for tool in TOOLS.values():
+    add_tool_routes(tool)
 
 @app.post("/api/contact")
 async def contact_us(data: ContactData):
@@ -290,14 +453,7 @@ async def forgot_password(data: ForgotPasswordData):
     if not data.email:
         raise HTTPException(status_code=400, detail="Please enter your email")
     
-    # Find user by email
-    user_found = False
-    for username, user_data in users_db.items():
-        if user_data["email"] == data.email:
-            user_found = True
-            break
-    
-    if not user_found:
+    if await asyncio.to_thread(storage.find_username_by_email, data.email) is None:
         raise HTTPException(status_code=400, detail="Email not found")
     
     # In a real app, you'd send a password reset email
@@ -305,20 +461,25 @@ async def forgot_password(data: ForgotPasswordData):
 
 @app.post("/api/save-chat")
 async def save_chat(request: Request):
-    session_id = request.headers.get("session-id")
-    username = request.headers.get("username")
-    
-    if not session_id or not username or username not in users_db:
+    session = await sessions.aget(request.headers.get("session-id"))
+    if session is None or not session.username:
         raise HTTPException(status_code=400, detail="Please login to save chats")
     
-    if session_id not in sessions or not sessions[session_id]["chat_history"]:
+    # The account is the one the session logged in as; the header is only a cross-check
+    username = session.username
+    claimed = request.headers.get("username")
+    if claimed is not None and claimed != username:
+        raise HTTPException(status_code=403, detail="This session belongs to another user")
+    
+    if not session.chat_history:
         raise HTTPException(status_code=400, detail="No chat to save")
     
-    if sessions[session_id]["saved"]:
-        return {"message": "Chat already saved"}
+    if session.chat_id is not None and session.chat_owner == username:
+        # Already a live record: every turn since the first save was appended to it
+        return {"message": "Chat already saved", "chat_id": session.chat_id}
     
     timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    history = sessions[session_id]["chat_history"]
+    history = session.chat_history
     title = "New Chat"
     if history:
         title = history[0][0][:30] + "..." if len(history[0][0]) > 30 else history[0][0]
@@ -326,21 +487,140 @@ async def save_chat(request: Request):
     chat_data = {
         "title": title,
         "timestamp": timestamp,
-        "messages": history.copy()
+        # Snapshot now, the write lands later; the turns themselves are shared
+        "messages": tuple(history)
     }
     
-    users_db[username]["chat_history"].append(chat_data)
-    sessions[session_id]["saved"] = True
+    chat_id = new_chat_id()
+    if sessions.shared:
+        # Any worker may append the next turn, from its own queue: the record
+        # has to exist before the chat id is published with the session
+        await asyncio.to_thread(storage.add_chat, username, chat_data, chat_id)
+    else:
+        await write_behind.put(("add_chat", username, chat_data, chat_id))
+    session.chat_owner, session.chat_id = username, chat_id
+    session.saved_upto = last_turn_index(session) + 1
+    await sessions.save(session)
     
-    return {"message": "Chat saved successfully!"}
+    return {"message": "Chat saved successfully!", "chat_id": chat_id}
+
+async def session_username(request: Request) -> str:
+    session = await sessions.aget(request.headers.get("session-id"))
+    if session is None or not session.username:
+        raise HTTPException(status_code=401, detail="Please login to view saved chats")
+    return session.username
+
+@app.get("/api/chats")
+async def list_chats(request: Request, cursor: Optional[str] = None, limit: int = CHAT_PAGE_SIZE):
+    username = await session_username(request)
+    await write_behind.barrier()
+    chats, next_cursor = await asyncio.to_thread(storage.list_chats, username, cursor,
+                                                 max(1, min(limit, 100)))
+    return FastJSONResponse({"chats": chats, "next_cursor": next_cursor})
+
+@app.get("/api/chats/{chat_id}")
+async def get_chat(chat_id: str, request: Request):
+    username = await session_username(request)
+    await write_behind.barrier()
+    chat = await asyncio.to_thread(storage.get_chat, username, chat_id)
+    if chat is None:
+        raise HTTPException(status_code=404, detail="Chat not found")
+    return FastJSONResponse(chat)
+
+# Prometheus metrics. Request counts and latency come from MetricsMiddleware
+# and per-stage timings from metrics.Trace; the rest is defined here.
+MODEL_LATENCY = registry.histogram("model_request_duration_seconds", "Upstream model call latency",
+                                   ("model", "mode"))
+TIME_TO_FIRST_TOKEN = registry.histogram("model_time_to_first_token_seconds",
+                                         "Time until a streamed answer's first token", ("model",))
+PROMPT_CHARS = registry.histogram("prompt_chars", "Prompt size sent upstream, in characters", ("tool",),
+                                  buckets=SIZE_BUCKETS)
+RESPONSE_CHARS = registry.histogram("response_chars", "Answer size, in characters", ("tool",),
+                                    buckets=SIZE_BUCKETS)
+QUEUE_WAIT = registry.histogram("admission_queue_wait_seconds", "Time spent waiting for an admission slot")
+BREAKER_STATES = {"closed": 0, "half_open": 1, "open": 2}
+
+@registry.collect
+def component_metrics():
+    cache, live, gate = response_cache.stats(), sessions.stats(), gateway.stats()
+    yield "response_cache_hits_total", "counter", "Response cache hits", cache["hits"], None
+    yield "response_cache_misses_total", "counter", "Response cache misses", cache["misses"], None
+    yield "response_cache_coalesced_total", "counter", "Cache misses served by an in-flight call", cache["coalesced"], None
+    yield "response_cache_entries", "gauge", "Entries in the response cache", cache["entries"], None
+    if semantic_cache is not None:
+        semantic = semantic_cache.stats()
+        yield "semantic_cache_hits_total", "counter", "Questions answered by a near-duplicate", semantic["hits"], None
+        yield "semantic_cache_misses_total", "counter", "Semantic cache lookups without a close match", semantic["misses"], None
+        yield "semantic_cache_entries", "gauge", "Questions held in the semantic cache", semantic["entries"], None
+        yield "semantic_cache_evictions_total", "counter", "Semantic cache entries evicted to stay under the cap", semantic["evictions"], None
+    yield "sessions_live", "gauge", "Live chat sessions", live["live"], None
+    yield "sessions_history_bytes", "gauge", "Bytes of chat history held in sessions", live["history_bytes"], None
+    yield "sessions_evicted_total", "counter", "Sessions evicted to stay under the cap", live["evicted"], None
+    yield "sessions_expired_total", "counter", "Sessions dropped after idling", live["expired"], None
+    if "near_cache" in live:
+        near = live["near_cache"]
+        yield "sessions_near_cache_hits_total", "counter", "Session reads served by this worker's near-cache", near["hits"], None
+        yield "sessions_near_cache_misses_total", "counter", "Session reads that went to the shared store", near["misses"], None
+        yield "sessions_invalidations_total", "counter", "Near-cache entries dropped after another worker's write", \
+            near["invalidations"], None
+        yield "sessions_remote_errors_total", "counter", "Failed calls to the shared session store", live["remote_errors"], None
+    yield "model_in_flight", "gauge", "Upstream model calls in progress", gate["in_flight"], None
+    yield "model_fallbacks_total", "counter", "Calls answered by the fallback tier", gate["fallbacks"], None
+    yield "model_retries_total", "counter", "Upstream attempts retried", gate["resilience"]["retries"], None
+    yield "model_hedges_total", "counter", "Hedged upstream attempts", gate["resilience"]["hedges"], None
+    for model, breaker in gate["resilience"]["breakers"].items():
+        yield ("model_circuit_state", "gauge", "Circuit breaker state (0 closed, 1 half-open, 2 open)",
+               BREAKER_STATES[breaker["state"]], {"model": model})
+    writes = write_behind.stats()
+    yield "write_behind_queue_depth", "gauge", "Storage writes waiting to be flushed", writes["depth"], None
+    yield "write_behind_written_total", "counter", "Storage writes flushed", writes["written"], None
+    yield "write_behind_failed_total", "counter", "Storage writes dropped after failing", writes["failed"], None
+    yield "write_behind_batches_total", "counter", "Write-behind flushes", writes["batches"], None
+    yield "write_behind_backpressure_total", "counter", "Writes that waited for room in a full queue", \
+        writes["backpressure_waits"], None
+    yield "admission_active", "gauge", "LLM requests holding an admission slot", admission.active, None
+    yield "admission_waiting", "gauge", "LLM requests queued for an admission slot", admission.waiting, None
+    for reason, count in admission.stats()["rejected"].items():
+        yield "admission_rejected_total", "counter", "Requests turned away by admission control", count, {"reason": reason}
+    for kind, count in rate_limiter.stats()["rejected"].items():
+        yield "rate_limit_rejected_total", "counter", "Requests rejected by the rate limiter", count, {"kind": kind}
+    process = loop_monitor.stats()
+    yield "process_resident_memory_bytes", "gauge", "Resident memory", process["rss_bytes"], None
+    yield "event_loop_lag_p99_seconds", "gauge", "Event-loop lag p99 over the last ten seconds", \
+        process["loop_lag_ms"]["p99"] / 1000, None
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def prometheus_metrics():
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/api/metrics")
+async def metrics():
+    return {"response_cache": response_cache.stats(),
+            "semantic_cache": semantic_cache.stats() if semantic_cache is not None else None,
+            "sessions": sessions.stats(), "write_behind": write_behind.stats(), "gateway": gateway.stats(),
+            "rate_limit": rate_limiter.stats(), "admission": admission.stats(), "process": loop_monitor.stats()}
 
 @app.get("/api/clear-chat")
 async def clear_chat(request: Request):
-    session_id = request.headers.get("session-id", "guest")
-    if session_id in sessions:
-        sessions[session_id]["chat_history"] = []
-        sessions[session_id]["saved"] = True
-    return {"message": "Chat cleared!", "history": []}
+    session = await sessions.aget(request.headers.get("session-id"))
+    turn_index = -1
+    if session is not None:
+        sessions.clear(session)
+        await sessions.save(session)
+        turn_index = last_turn_index(session)
+    return {"message": "Chat cleared!", "history": [], "turn_index": turn_index}
+
+@app.get("/api/history")
+async def get_history(request: Request, since: int = -1, limit: int = HISTORY_PAGE_SIZE):
+    session = await sessions.aget(request.headers.get("session-id"))
+    limit = max(1, min(limit, HISTORY_MAX_PAGE_SIZE))
+    if session is None:
+        return {"turns": [], "turn_index": -1, "next_since": None}
+    
+    turns = turns_since(session, since, limit)
+    last = last_turn_index(session)
+    next_since = turns[-1]["index"] if turns and turns[-1]["index"] < last else None
+    return FastJSONResponse({"turns": turns, "turn_index": last, "next_since": next_since})
 
 if __name__ == "__main__":
     import uvicorn
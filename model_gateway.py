@@ -0,0 +1,225 @@
+"""Shared gateway for Gemini calls made by the FastAPI handlers.
+
+All model traffic goes through the async client so a slow generation never
+blocks the event loop. A semaphore caps concurrent upstream calls, every call
+gets a timeout, and calls are cancelled when the HTTP client goes away.
+Calls may carry a fallback model and a latency SLO: when the primary model
+has not answered (or, for streams, produced its first chunk) within the SLO
+it is abandoned and the fallback answers instead, within what is left of the
+timeout. Each upstream attempt goes through `resilience` (retries with
+backoff, a circuit breaker per model, optional hedging).
+The SDK is imported and the client built on first use, so cold starts that
+only serve static pages never pay for it. That happens in a worker thread:
+importing google.genai takes hundreds of milliseconds, which on the event
+loop would stall every other request on the worker.
+"""
+import asyncio
+import os
+from typing import AsyncIterator, Callable, Optional
+
+from fastapi import Request
+
+from resilience import Resilience, UpstreamUnavailable
+
+DEFAULT_CONCURRENCY = int(os.getenv("MODEL_CONCURRENCY", "16"))
+DEFAULT_TIMEOUT = float(os.getenv("MODEL_TIMEOUT", "60"))
+DISCONNECT_POLL_INTERVAL = 0.5
+
+
+class GatewayTimeout(Exception):
+    """The model did not answer within the configured timeout."""
+
+
+class ClientDisconnected(Exception):
+    """The HTTP client went away before the model answered."""
+
+
+def client_options() -> dict:
+    # GEMINI_BASE_URL points the SDK at another endpoint, e.g. the fake model
+    # server in benchmarks/fake_gemini.py
+    base_url = os.getenv("GEMINI_BASE_URL")
+    return {"http_options": {"base_url": base_url}} if base_url else {}
+
+
+def default_client():
+    from google import genai
+    return genai.Client(api_key=os.getenv("GEMINI_API_KEY") or os.getenv("GOOGLE_API_KEY"), **client_options())
+
+
+class ModelGateway:
+    def __init__(self, model: str, client=None, client_factory: Callable = default_client,
+                 max_concurrency: int = DEFAULT_CONCURRENCY, timeout: float = DEFAULT_TIMEOUT,
+                 resilience: Optional[Resilience] = None):
+        self._client = client
+        self._client_factory = client_factory
+        self.model = model
+        self.timeout = timeout
+        self.max_concurrency = max_concurrency
+        self.resilience = resilience or Resilience()
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._client_lock = asyncio.Lock()
+        self.in_flight = 0
+        self.fallbacks = 0
+
+    async def get_client(self):
+        if self._client is None:
+            async with self._client_lock:
+                if self._client is None:
+                    self._client = await asyncio.to_thread(self._client_factory)
+        return self._client
+
+    async def generate(self, prompt: str, model: Optional[str] = None,
+                       request: Optional[Request] = None, timeout: Optional[float] = None,
+                       config: Optional[dict] = None, fallback_model: Optional[str] = None,
+                       slo: Optional[float] = None) -> str:
+        """Return the model's text for `prompt`.
+
+        `config` is passed through as the generation config. When `request`
+        is given the call is cancelled as soon as the client disconnects,
+        freeing the concurrency slot for someone who is still waiting.
+        """
+        call = self._call(prompt, model or self.model, timeout or self.timeout, config, fallback_model, slo)
+        if request is None:
+            return await call
+        return await _cancel_on_disconnect(call, request)
+
+    async def _call(self, prompt: str, model: str, timeout: float, config: Optional[dict],
+                    fallback_model: Optional[str], slo: Optional[float]) -> str:
+        async with self._semaphore:
+            self.in_flight += 1
+            current = model
+            try:
+                if fallback_model and slo and slo < timeout:
+                    loop = asyncio.get_running_loop()
+                    started = loop.time()
+                    try:
+                        response = await asyncio.wait_for(self._generate(prompt, model, config), slo)
+                    except (asyncio.TimeoutError, UpstreamUnavailable):
+                        # Too slow, or throttled / circuit open: the fast tier answers
+                        self.fallbacks += 1
+                        current = fallback_model
+                        response = await asyncio.wait_for(
+                            self._generate(prompt, fallback_model, _fallback_config(config)),
+                            timeout - (loop.time() - started),
+                        )
+                else:
+                    response = await asyncio.wait_for(self._generate(prompt, model, config), timeout)
+            except asyncio.TimeoutError:
+                self._timed_out(current)
+                raise GatewayTimeout(f"Model did not respond within {timeout:g}s")
+            finally:
+                self.in_flight -= 1
+        return response.text
+
+    def _generate(self, prompt: str, model: str, config: Optional[dict]):
+        async def attempt():
+            client = await self.get_client()
+            return await client.aio.models.generate_content(model=model, contents=prompt, config=config)
+        return self.resilience.call(model, attempt)
+
+    async def stream(self, prompt: str, model: Optional[str] = None, timeout: Optional[float] = None,
+                     config: Optional[dict] = None, fallback_model: Optional[str] = None,
+                     slo: Optional[float] = None) -> AsyncIterator[str]:
+        """Yield text chunks as the model produces them.
+
+        `timeout` bounds the wait for each chunk rather than the whole
+        generation; `slo` bounds the wait for the first one before switching
+        to `fallback_model`. Starlette cancels the generator when the client
+        disconnects, which closes the upstream stream and frees the slot.
+        """
+        timeout = timeout or self.timeout
+        model = model or self.model
+        use_fallback = bool(fallback_model and slo and slo < timeout)
+        current = model
+        async with self._semaphore:
+            self.in_flight += 1
+            try:
+                try:
+                    try:
+                        iterator, first = await asyncio.wait_for(
+                            self._open_stream(prompt, model, config), slo if use_fallback else timeout)
+                    except (asyncio.TimeoutError, UpstreamUnavailable):
+                        if not use_fallback:
+                            raise
+                        self.fallbacks += 1
+                        current = fallback_model
+                        iterator, first = await asyncio.wait_for(
+                            self._open_stream(prompt, fallback_model, _fallback_config(config)), timeout)
+                    if first is None:
+                        return
+                    yield first
+                    while True:
+                        try:
+                            chunk = await asyncio.wait_for(iterator.__anext__(), timeout)
+                        except StopAsyncIteration:
+                            break
+                        if chunk.text:
+                            yield chunk.text
+                except asyncio.TimeoutError:
+                    self._timed_out(current)
+                    raise GatewayTimeout(f"Model stalled for more than {timeout:g}s")
+            finally:
+                self.in_flight -= 1
+
+    def _timed_out(self, model: str):
+        # The attempt in flight was cancelled, which leaves the breaker without
+        # a verdict; a model that hangs past the whole timeout is failing
+        self.resilience.breaker(model).record_failure()
+
+    def _open_stream(self, prompt: str, model: str, config: Optional[dict]):
+        """Start a stream and wait for its first non-empty chunk.
+
+        Only opening the stream is retried: once text has reached the client
+        a retry would repeat it.
+        """
+        return self.resilience.call(model, lambda: self._first_chunk(prompt, model, config), hedge=False)
+
+    async def _first_chunk(self, prompt: str, model: str, config: Optional[dict]):
+        client = await self.get_client()
+        chunks = await client.aio.models.generate_content_stream(model=model, contents=prompt, config=config)
+        iterator = chunks.__aiter__()
+        while True:
+            try:
+                chunk = await iterator.__anext__()
+            except StopAsyncIteration:
+                return iterator, None
+            if chunk.text:
+                return iterator, chunk.text
+
+    def stats(self) -> dict:
+        return {
+            "in_flight": self.in_flight,
+            "max_concurrency": self.max_concurrency,
+            "timeout_seconds": self.timeout,
+            "fallbacks": self.fallbacks,
+            "resilience": self.resilience.stats(),
+        }
+
+
+def _fallback_config(config: Optional[dict]) -> Optional[dict]:
+    # Thinking budgets are tuned for the primary model; the fallback tier is
+    # there to answer quickly, so let it use its own default
+    if not config or "thinking_config" not in config:
+        return config
+    return {key: value for key, value in config.items() if key != "thinking_config"}
+
+
+async def _watch_disconnect(request: Request):
+    while not await request.is_disconnected():
+        await asyncio.sleep(DISCONNECT_POLL_INTERVAL)
+
+
+async def _cancel_on_disconnect(coro, request: Request):
+    task = asyncio.ensure_future(coro)
+    watcher = asyncio.ensure_future(_watch_disconnect(request))
+    try:
+        await asyncio.wait({task, watcher}, return_when=asyncio.FIRST_COMPLETED)
+    except asyncio.CancelledError:
+        task.cancel()
+        raise
+    finally:
+        watcher.cancel()
+    if not task.done():
+        task.cancel()
+        raise ClientDisconnected("Client disconnected")
+    return task.result()
@@ -0,0 +1,168 @@
+"""Per-client rate limiting and global admission control for the LLM routes.
+
+Two independent gates, both answered with 429 + Retry-After when they say no:
+
+  * `RateLimiter`: token buckets keyed per client. Logged-in users are keyed
+    by username. Guests are keyed by session and also by IP, because new
+    guest sessions can be minted freely, so the session alone is easy to
+    dodge. Each class has its own rate and burst.
+  * `AdmissionControl`: caps how many LLM requests run at once across the
+    process. Excess requests wait in a bounded queue. When the queue is
+    full, or a request has waited too long, it is turned away instead of
+    piling up.
+
+Buckets live in an LRU map, so memory stays bounded however many clients show up.
+"""
+import asyncio
+import os
+import time
+from collections import OrderedDict
+from typing import Optional
+
+
+def _per_second(name: str, default: str) -> float:
+    return float(os.getenv(name, default)) / 60
+
+
+GUEST_RATE = _per_second("RATE_LIMIT_GUEST_PER_MIN", "12")
+GUEST_BURST = float(os.getenv("RATE_LIMIT_GUEST_BURST", "5"))
+USER_RATE = _per_second("RATE_LIMIT_USER_PER_MIN", "30")
+USER_BURST = float(os.getenv("RATE_LIMIT_USER_BURST", "10"))
+IP_RATE = _per_second("RATE_LIMIT_IP_PER_MIN", "60")
+IP_BURST = float(os.getenv("RATE_LIMIT_IP_BURST", "20"))
+MAX_BUCKETS = int(os.getenv("RATE_LIMIT_MAX_KEYS", "50000"))
+
+DEFAULT_MAX_CONCURRENT = int(os.getenv("ADMISSION_MAX_CONCURRENT", "64"))
+DEFAULT_MAX_QUEUE = int(os.getenv("ADMISSION_MAX_QUEUE", "128"))
+DEFAULT_QUEUE_TIMEOUT = float(os.getenv("ADMISSION_QUEUE_TIMEOUT", "10"))
+
+
+class Rejected(Exception):
+    """The request was turned away; the client may retry after `retry_after` seconds."""
+
+    def __init__(self, reason: str, retry_after: float):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    __slots__ = ("rate", "burst", "tokens", "updated")
+
+    def __init__(self, rate: float, burst: float, now: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = now
+
+    def take(self, now: float) -> float:
+        """Spend one token; return 0 if allowed, else seconds until one is available."""
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate if self.rate > 0 else 60.0
+
+
+class RateLimiter:
+    def __init__(self, limits: Optional[dict] = None, max_keys: int = MAX_BUCKETS):
+        # class -> (tokens per second, burst)
+        self.limits = limits or {
+            "guest": (GUEST_RATE, GUEST_BURST),
+            "user": (USER_RATE, USER_BURST),
+            "ip": (IP_RATE, IP_BURST),
+        }
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()  # (class, key) -> TokenBucket
+        self.allowed = 0
+        self.rejected = {name: 0 for name in self.limits}
+
+    def _take(self, kind: str, key: str, now: float) -> float:
+        bucket = self._buckets.get((kind, key))
+        if bucket is None:
+            rate, burst = self.limits[kind]
+            bucket = self._buckets[(kind, key)] = TokenBucket(rate, burst, now)
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end((kind, key))
+        return bucket.take(now)
+
+    def check(self, username: Optional[str], session_id: Optional[str], ip: Optional[str]):
+        """Raise `Rejected` if this client is over its limit."""
+        now = time.monotonic()
+        if username:
+            checks = [("user", username)]
+        else:
+            checks = [("ip", ip or "unknown")]
+            if session_id:
+                checks.insert(0, ("guest", session_id))
+        for kind, key in checks:
+            wait = self._take(kind, key, now)
+            if wait:
+                self.rejected[kind] += 1
+                raise Rejected(f"rate_limited_{kind}", wait)
+        self.allowed += 1
+
+    def stats(self) -> dict:
+        return {
+            "tracked_keys": len(self._buckets),
+            "allowed": self.allowed,
+            "rejected": dict(self.rejected),
+            "limits_per_minute": {kind: {"rate": round(rate * 60, 2), "burst": burst}
+                                  for kind, (rate, burst) in self.limits.items()},
+        }
+
+
+class AdmissionControl:
+    def __init__(self, max_concurrent: int = DEFAULT_MAX_CONCURRENT, max_queue: int = DEFAULT_MAX_QUEUE,
+                 queue_timeout: float = DEFAULT_QUEUE_TIMEOUT):
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self._semaphore = asyncio.Semaphore(max_concurrent)
+        self.active = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.rejected = {"queue_full": 0, "queue_timeout": 0}
+
+    async def acquire(self):
+        """Wait for a slot; raise `Rejected` when the queue is full or the wait too long."""
+        if self._semaphore.locked():
+            if self.waiting >= self.max_queue:
+                self.rejected["queue_full"] += 1
+                raise Rejected("queue_full", 1.0)
+            self.waiting += 1
+            try:
+                await asyncio.wait_for(self._semaphore.acquire(), self.queue_timeout)
+            except asyncio.TimeoutError:
+                self.rejected["queue_timeout"] += 1
+                raise Rejected("queue_timeout", 1.0)
+            finally:
+                self.waiting -= 1
+        else:
+            await self._semaphore.acquire()
+        self.active += 1
+        self.admitted += 1
+
+    def release(self):
+        self.active -= 1
+        self._semaphore.release()
+
+    async def __aenter__(self):
+        await self.acquire()
+        return self
+
+    async def __aexit__(self, *exc):
+        self.release()
+
+    def stats(self) -> dict:
+        return {
+            "active": self.active,
+            "waiting": self.waiting,
+            "max_concurrent": self.max_concurrent,
+            "max_queue": self.max_queue,
+            "admitted": self.admitted,
+            "rejected": dict(self.rejected),
+        }
@@ -0,0 +1,282 @@
+"""Retries, circuit breaking and request hedging for upstream model calls.
+
+`Resilience.call(key, factory)` runs `factory()` (which must start a fresh
+upstream call each time it is invoked) with:
+
+  * a timeout per attempt (`attempt_timeout`), so a hung upstream call
+    counts as a failure and is retried like any other;
+  * bounded retries with full-jitter exponential backoff, for throttling
+    (429), server errors (500/502/503/504), timeouts and transport failures
+    only;
+  * a circuit breaker per key (the model name) that fails fast with
+    `CircuitOpen` after repeated failures, then lets a single probe through
+    once the cool-down has passed;
+  * optional hedging: when the first attempt has not answered within the
+    recent p95 latency, a second attempt is started and whichever finishes
+    first wins. Hedges are capped to a fraction of calls so an upstream slow
+    down cannot double our traffic.
+
+`call_sync` does the same minus hedging for the synchronous front-ends.
+Exhausted retries surface as `UpstreamUnavailable`, which the HTTP layer
+turns into a 503 with a Retry-After header.
+"""
+import asyncio
+import os
+import random
+import threading
+import time
+from collections import deque
+from typing import Awaitable, Callable, Optional, TypeVar
+
+T = TypeVar("T")
+
+RETRYABLE_CODES = {429, 500, 502, 503, 504}
+DEFAULT_MAX_ATTEMPTS = int(os.getenv("MODEL_RETRY_ATTEMPTS", "3"))
+DEFAULT_BASE_DELAY = float(os.getenv("MODEL_RETRY_BASE_DELAY", "0.25"))
+DEFAULT_MAX_DELAY = float(os.getenv("MODEL_RETRY_MAX_DELAY", "4"))
+DEFAULT_FAILURE_THRESHOLD = int(os.getenv("MODEL_BREAKER_FAILURES", "5"))
+DEFAULT_RESET_TIMEOUT = float(os.getenv("MODEL_BREAKER_RESET", "30"))
+# Below MODEL_TIMEOUT, so a hung attempt is retried before the caller gives up
+DEFAULT_ATTEMPT_TIMEOUT = float(os.getenv("MODEL_ATTEMPT_TIMEOUT", "20"))
+DEFAULT_HEDGE = os.getenv("MODEL_HEDGE", "0") == "1"
+DEFAULT_HEDGE_RATIO = float(os.getenv("MODEL_HEDGE_MAX_RATIO", "0.1"))
+HEDGE_WINDOW = 200
+HEDGE_MIN_SAMPLES = 20
+HEDGE_MIN_DELAY = 0.05
+
+
+class UpstreamUnavailable(Exception):
+    """The model is throttling or failing; try again after `retry_after` seconds."""
+
+    def __init__(self, message: str, retry_after: float = 1.0):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class CircuitOpen(UpstreamUnavailable):
+    """Failing fast: the circuit for this model is open."""
+
+
+def status_code(exc: BaseException) -> Optional[int]:
+    # google.genai.errors.APIError carries `code`; httpx errors carry a response
+    code = getattr(exc, "code", None)
+    if isinstance(code, int):
+        return code
+    response = getattr(exc, "response", None)
+    return getattr(response, "status_code", None)
+
+
+def is_retryable(exc: BaseException) -> bool:
+    code = status_code(exc)
+    if code is not None:
+        return code in RETRYABLE_CODES
+    if isinstance(exc, (ConnectionError, asyncio.TimeoutError)):
+        return True
+    try:
+        import httpx
+    except ImportError:
+        return False
+    return isinstance(exc, (httpx.TimeoutException, httpx.NetworkError, httpx.RemoteProtocolError))
+
+
+def retry_after(exc: BaseException) -> Optional[float]:
+    response = getattr(exc, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+class CircuitBreaker:
+    """closed -> open after `failure_threshold` consecutive failures; open ->
+    half-open after `reset_timeout`; half-open lets one probe through and
+    closes on its success or re-opens on its failure."""
+
+    def __init__(self, failure_threshold: int = DEFAULT_FAILURE_THRESHOLD,
+                 reset_timeout: float = DEFAULT_RESET_TIMEOUT):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self.probing = False
+        self.opened = 0
+        self.rejected = 0
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """Raise `CircuitOpen` unless a call may go upstream now."""
+        with self._lock:
+            if self.state == "open":
+                remaining = self.opened_at + self.reset_timeout - time.monotonic()
+                if remaining > 0:
+                    self.rejected += 1
+                    raise CircuitOpen("Model temporarily unavailable", retry_after=remaining)
+                self.state = "half_open"
+            if self.state == "half_open":
+                if self.probing:
+                    self.rejected += 1
+                    raise CircuitOpen("Model temporarily unavailable", retry_after=1.0)
+                self.probing = True
+
+    def record_success(self):
+        with self._lock:
+            self.state = "closed"
+            self.failures = 0
+            self.probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == "half_open" or self.failures >= self.failure_threshold:
+                if self.state != "open":
+                    self.opened += 1
+                self.state = "open"
+                self.opened_at = time.monotonic()
+            self.probing = False
+
+    def release(self):
+        """The call ended without a verdict (e.g. it was cancelled)."""
+        with self._lock:
+            self.probing = False
+
+    def stats(self) -> dict:
+        return {"state": self.state, "failures": self.failures, "opened": self.opened, "rejected": self.rejected}
+
+
+class LatencyTracker:
+    def __init__(self, window: int = HEDGE_WINDOW):
+        self._samples = deque(maxlen=window)
+
+    def observe(self, seconds: float):
+        self._samples.append(seconds)
+
+    def p95(self) -> Optional[float]:
+        if len(self._samples) < HEDGE_MIN_SAMPLES:
+            return None
+        ordered = sorted(self._samples)
+        return ordered[int(len(ordered) * 0.95) - 1]
+
+
+class Resilience:
+    def __init__(self, max_attempts: int = DEFAULT_MAX_ATTEMPTS, base_delay: float = DEFAULT_BASE_DELAY,
+                 max_delay: float = DEFAULT_MAX_DELAY, failure_threshold: int = DEFAULT_FAILURE_THRESHOLD,
+                 reset_timeout: float = DEFAULT_RESET_TIMEOUT, hedge: bool = DEFAULT_HEDGE,
+                 max_hedge_ratio: float = DEFAULT_HEDGE_RATIO, attempt_timeout: float = DEFAULT_ATTEMPT_TIMEOUT):
+        self.max_attempts = max_attempts
+        self.attempt_timeout = attempt_timeout
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.hedge = hedge
+        self.max_hedge_ratio = max_hedge_ratio
+        self._breakers = {}  # key -> CircuitBreaker
+        self._latency = {}  # key -> LatencyTracker
+        self.calls = 0
+        self.retries = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+
+    def breaker(self, key: str) -> CircuitBreaker:
+        breaker = self._breakers.get(key)
+        if breaker is None:
+            breaker = self._breakers[key] = CircuitBreaker(self.failure_threshold, self.reset_timeout)
+        return breaker
+
+    def backoff(self, attempt: int, exc: BaseException) -> float:
+        # Full jitter; a server-sent Retry-After is a lower bound
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+        hint = retry_after(exc)
+        return min(max(delay, hint), self.max_delay) if hint else delay
+
+    async def call(self, key: str, factory: Callable[[], Awaitable[T]], hedge: Optional[bool] = None) -> T:
+        breaker = self.breaker(key)
+        self.calls += 1
+        for attempt in range(self.max_attempts):
+            breaker.allow()
+            try:
+                result = await asyncio.wait_for(self._attempt(key, factory, self.hedge if hedge is None else hedge),
+                                                self.attempt_timeout)
+            except asyncio.CancelledError:
+                breaker.release()
+                raise
+            except Exception as e:
+                if not is_retryable(e):
+                    # The request was bad, not the upstream
+                    breaker.release()
+                    raise
+                breaker.record_failure()
+                if attempt + 1 >= self.max_attempts:
+                    raise UpstreamUnavailable(f"Model unavailable: {e}", retry_after(e) or 1.0) from e
+                self.retries += 1
+                await asyncio.sleep(self.backoff(attempt, e))
+            else:
+                breaker.record_success()
+                return result
+
+    async def _attempt(self, key: str, factory: Callable[[], Awaitable[T]], hedge: bool) -> T:
+        tracker = self._latency.setdefault(key, LatencyTracker())
+        start = time.monotonic()
+        delay = tracker.p95() if hedge else None
+        if delay is None or self.hedges >= self.max_hedge_ratio * self.calls:
+            result = await factory()
+            tracker.observe(time.monotonic() - start)
+            return result
+
+        primary = asyncio.ensure_future(factory())
+        secondary = None
+        try:
+            done, _ = await asyncio.wait({primary}, timeout=max(delay, HEDGE_MIN_DELAY))
+            if done:
+                result = primary.result()
+                tracker.observe(time.monotonic() - start)
+                return result
+            self.hedges += 1
+            secondary = asyncio.ensure_future(factory())
+            pending = {primary, secondary}
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is secondary:
+                            self.hedge_wins += 1
+                        tracker.observe(time.monotonic() - start)
+                        return task.result()
+            # Both failed: report the primary's error
+            return primary.result()
+        finally:
+            for task in (primary, secondary):
+                if task is not None and not task.done():
+                    task.cancel()
+
+    def call_sync(self, key: str, fn: Callable[[], T], attempts: Optional[int] = None) -> T:
+        attempts = attempts or self.max_attempts
+        breaker = self.breaker(key)
+        self.calls += 1
+        for attempt in range(attempts):
+            breaker.allow()
+            try:
+                result = fn()
+            except Exception as e:
+                if not is_retryable(e):
+                    breaker.release()
+                    raise
+                breaker.record_failure()
+                if attempt + 1 >= attempts:
+                    raise UpstreamUnavailable(f"Model unavailable: {e}", retry_after(e) or 1.0) from e
+                self.retries += 1
+                time.sleep(self.backoff(attempt, e))
+            else:
+                breaker.record_success()
+                return result
+
+    def stats(self) -> dict:
+        return {
+            "calls": self.calls,
+            "retries": self.retries,
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+            "breakers": {key: breaker.stats() for key, breaker in self._breakers.items()},
+        }
@@ -0,0 +1,167 @@
+"""Minimal asyncio client for the Redis protocol (RESP2).
+
+Only what the shared session store needs: single commands, pipelines (several
+commands in one round trip) and a pub/sub subscription. Works against Redis,
+Valkey, KeyDB and benchmarks/fake_redis.py, with no third-party package.
+
+    client = RespClient("redis://127.0.0.1:6379/0")
+    await client.execute("SET", "key", "value", "PX", 60000)
+    value, _ = await client.pipeline([("GET", "key"), ("PEXPIRE", "key", 60000)])
+"""
+import asyncio
+import os
+from typing import Awaitable, Callable, List, Optional, Sequence
+from urllib.parse import urlparse
+
+DEFAULT_POOL_SIZE = int(os.getenv("REDIS_POOL_SIZE", "8"))
+DEFAULT_TIMEOUT = float(os.getenv("REDIS_TIMEOUT", "2"))
+
+
+class RespError(Exception):
+    """An error reply from the server (e.g. "ERR unknown command")."""
+
+
+def encode(command: Sequence) -> bytes:
+    parts = [b"*%d\r\n" % len(command)]
+    for arg in command:
+        if isinstance(arg, bytes):
+            data = arg
+        elif isinstance(arg, str):
+            data = arg.encode("utf-8")
+        else:
+            data = str(arg).encode("ascii")
+        parts.append(b"$%d\r\n%s\r\n" % (len(data), data))
+    return b"".join(parts)
+
+
+async def read_reply(reader: asyncio.StreamReader):
+    """One reply; error replies are returned as RespError instances, not raised."""
+    line = await reader.readline()
+    if not line:
+        raise ConnectionError("connection closed by server")
+    kind, rest = line[:1], line[1:-2]
+    if kind == b"+":
+        return rest.decode("utf-8")
+    if kind == b"-":
+        return RespError(rest.decode("utf-8"))
+    if kind == b":":
+        return int(rest)
+    if kind == b"$":
+        size = int(rest)
+        if size < 0:
+            return None
+        data = await reader.readexactly(size + 2)
+        return data[:-2]
+    if kind == b"*":
+        size = int(rest)
+        return None if size < 0 else [await read_reply(reader) for _ in range(size)]
+    raise ConnectionError(f"unexpected reply type {kind!r}")
+
+
+class _Connection:
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.reader = reader
+        self.writer = writer
+
+    async def request(self, commands: Sequence[Sequence]) -> list:
+        self.writer.write(b"".join(encode(command) for command in commands))
+        await self.writer.drain()
+        return [await read_reply(self.reader) for _ in commands]
+
+    def close(self):
+        self.writer.close()
+
+
+class RespClient:
+    def __init__(self, url: str, pool_size: int = DEFAULT_POOL_SIZE, timeout: float = DEFAULT_TIMEOUT):
+        parsed = urlparse(url)
+        self.host = parsed.hostname or "127.0.0.1"
+        self.port = parsed.port or 6379
+        self.password = parsed.password
+        self.db = int(parsed.path.strip("/") or 0)
+        self.timeout = timeout
+        self._idle: List[_Connection] = []
+        self._slots = asyncio.Semaphore(pool_size)
+
+    async def _connect(self) -> _Connection:
+        reader, writer = await asyncio.wait_for(asyncio.open_connection(self.host, self.port), self.timeout)
+        connection = _Connection(reader, writer)
+        setup = []
+        if self.password:
+            setup.append(("AUTH", self.password))
+        if self.db:
+            setup.append(("SELECT", self.db))
+        if setup:
+            for reply in await connection.request(setup):
+                if isinstance(reply, RespError):
+                    connection.close()
+                    raise reply
+        return connection
+
+    async def pipeline(self, commands: Sequence[Sequence]) -> list:
+        """Send `commands` in one round trip; raises the first error reply."""
+        async with self._slots:
+            if self._idle:
+                connection = self._idle.pop()
+                try:
+                    replies = await self._request(connection, commands)
+                except (ConnectionError, asyncio.IncompleteReadError):
+                    # An idle connection the server has since dropped (restart,
+                    # idle timeout): retry once on a fresh one
+                    connection = await self._connect()
+                    replies = await self._request(connection, commands)
+            else:
+                connection = await self._connect()
+                replies = await self._request(connection, commands)
+            self._idle.append(connection)
+        for reply in replies:
+            if isinstance(reply, RespError):
+                raise reply
+        return replies
+
+    async def _request(self, connection: _Connection, commands: Sequence[Sequence]) -> list:
+        try:
+            return await asyncio.wait_for(connection.request(commands), self.timeout)
+        except BaseException:
+            # The reply stream is in an unknown state: never reuse it
+            connection.close()
+            raise
+
+    async def execute(self, *command):
+        return (await self.pipeline([command]))[0]
+
+    async def subscribe(self, channel: str, on_message: Callable[[bytes], None],
+                        on_connect: Optional[Callable[[], Awaitable[None]]] = None,
+                        on_disconnect: Optional[Callable[[], None]] = None):
+        """Deliver messages published on `channel` until cancelled, reconnecting
+        with backoff. Between `on_disconnect` and the next `on_connect` messages
+        may have been missed."""
+        delay = 0.1
+        while True:
+            connection = None
+            try:
+                connection = await self._connect()
+                reply = (await connection.request([("SUBSCRIBE", channel)]))[0]
+                if isinstance(reply, RespError):
+                    raise reply
+                delay = 0.1
+                if on_connect is not None:
+                    await on_connect()
+                while True:
+                    message = await read_reply(connection.reader)
+                    if isinstance(message, list) and len(message) == 3 and message[0] == b"message":
+                        on_message(message[2])
+            except asyncio.CancelledError:
+                raise
+            except (OSError, ConnectionError, RespError, asyncio.TimeoutError, asyncio.IncompleteReadError):
+                if on_disconnect is not None:
+                    on_disconnect()
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 5.0)
+            finally:
+                if connection is not None:
+                    connection.close()
+
+    async def close(self):
+        while self._idle:
+            self._idle.pop().close()
@@ -0,0 +1,138 @@
+"""Prompt-result cache for deterministic tool prompts.
+
+Entries are keyed on the normalized prompt plus the model name, expire after
+a TTL (the cache default, or one passed per entry) and are evicted
+least-recently-used once the cache is full. Concurrent misses for the same key
+are coalesced so only one upstream call is made; `get_or_create` does this for
+asyncio callers and `get_or_compute` for the synchronous serverless handler.
+"""
+import asyncio
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Optional
+
+DEFAULT_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_SIZE", "1024"))
+DEFAULT_TTL = float(os.getenv("RESPONSE_CACHE_TTL", "3600"))
+
+
+def normalize_prompt(prompt: str) -> str:
+    return " ".join(prompt.lower().split())
+
+
+class ResponseCache:
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES, ttl: float = DEFAULT_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+        self._pending_tasks = {}  # key -> asyncio.Task
+        self._pending_events = {}  # key -> threading.Event
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+
+    @staticmethod
+    def make_key(prompt: str, model: str) -> str:
+        return hashlib.sha256(f"{model}\0{normalize_prompt(prompt)}".encode()).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: str, ttl: Optional[float] = None):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + (self.ttl if ttl is None else ttl), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def lookup(self, key: str) -> Optional[str]:
+        """`get` that also counts the hit or miss."""
+        value = self.get(key)
+        with self._lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return value
+
+    async def get_or_create(self, key: str, factory: Callable[[], Awaitable[str]],
+                            ttl: Optional[float] = None) -> str:
+        value = self.lookup(key)
+        if value is not None:
+            return value
+
+        task = self._pending_tasks.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._fill(key, factory, ttl))
+            self._pending_tasks[key] = task
+        else:
+            with self._lock:
+                self.coalesced += 1
+        # Shielded so one caller going away does not cancel the shared call
+        return await asyncio.shield(task)
+
+    async def _fill(self, key: str, factory: Callable[[], Awaitable[str]], ttl: Optional[float]) -> str:
+        try:
+            value = await factory()
+            self.set(key, value, ttl)
+            return value
+        finally:
+            self._pending_tasks.pop(key, None)
+
+    def get_or_compute(self, key: str, fn: Callable[[], str], ttl: Optional[float] = None) -> str:
+        value = self.lookup(key)
+        if value is not None:
+            return value
+
+        with self._lock:
+            event = self._pending_events.get(key)
+            leader = event is None
+            if leader:
+                event = self._pending_events[key] = threading.Event()
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            event.wait()
+            value = self.get(key)
+            if value is not None:
+                return value
+            # The leader failed; fall through and try ourselves
+            return fn()
+
+        try:
+            value = fn()
+            self.set(key, value, ttl)
+            return value
+        finally:
+            with self._lock:
+                self._pending_events.pop(key, None)
+            event.set()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "evictions": self.evictions,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
@@ -0,0 +1,212 @@
+"""Semantic answer cache: serve near-duplicate questions from earlier answers.
+
+The response cache only matches prompts exactly. Chat traffic is full of
+paraphrases of the same few questions ("how do I become a data scientist",
+"steps to become data scientist"), so this cache embeds the question and
+returns a stored answer when a previous question is close enough.
+
+Embeddings come from a hashed n-gram vectorizer, so no model is downloaded
+and no network call is made. Word unigrams and bigrams (after dropping
+filler words and plural endings) are hashed into a fixed number of signed
+buckets, together with character trigrams that absorb inflections, and the
+vector is L2-normalized. Negations ("not", "without", ...) get a heavy extra
+feature: "how do I not become a data scientist" shares every other word with
+the question it negates. Each namespace (tool and model) keeps its vectors
+in one NumPy matrix, so a lookup is a single matrix-vector product followed
+by an argmax over cosine similarities.
+
+Namespaces are bounded. Expired rows are reused first, then the
+least-recently-used row. The cache is opt-in (SEMANTIC_CACHE=1) because a
+wrong match returns someone else's answer. Only questions asked without
+conversation context are looked up or stored.
+"""
+import os
+import re
+import threading
+import time
+import zlib
+from typing import Optional
+
+import numpy as np
+
+DEFAULT_DIM = int(os.getenv("SEMANTIC_CACHE_DIM", "1024"))
+# Paraphrases that differ in filler words score 1.0; one extra content word
+# ("... in India") scores about 0.85-0.91 and must miss
+DEFAULT_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.92"))
+DEFAULT_MAX_ENTRIES = int(os.getenv("SEMANTIC_CACHE_SIZE", "2000"))  # per namespace
+DEFAULT_TTL = float(os.getenv("SEMANTIC_CACHE_TTL", str(24 * 3600)))
+INITIAL_ROWS = 64
+
+# Words that carry no meaning for matching career questions
+STOPWORDS = frozenset("""
+    a an the and or of to in on for at by with from as is are am be been being was were
+    i me my we our you your it its this that these those there here
+    do does did doing can could should would will shall may might must
+    how what which who whom why when where
+    please tell give show explain help want need know like get
+    some any about into more most very just really also
+    steps step way ways guide tips
+""".split())
+TOKEN = re.compile(r"[a-z0-9+#]+")
+# "from X to Y" questions are not the same question as "from Y to X"
+DIRECTIONS = {"from": "from", "to": "to", "into": "to"}
+NEGATIONS = frozenset(("not", "no", "never", "without", "nor"))
+WORD_WEIGHT = 1.0
+BIGRAM_WEIGHT = 0.5
+TRIGRAM_WEIGHT = 0.3
+DIRECTION_WEIGHT = 1.0
+NEGATION_WEIGHT = 3.0
+
+
+def terms(text: str):
+    """Content words, and direction features for "from ... to ..." questions."""
+    tokens = TOKEN.findall(text.lower().replace("n't", " not"))
+    directed = "from" in tokens
+    words, directions, direction = [], [], None
+    for token in tokens:
+        if directed and token in DIRECTIONS:
+            direction = DIRECTIONS[token]
+            continue
+        if token in STOPWORDS:
+            continue
+        if len(token) > 4 and token.endswith("ies"):
+            token = token[:-3] + "y"
+        elif len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+            token = token[:-1]
+        words.append(token)
+        if direction:
+            directions.append(f"{direction}>{token}")
+            direction = None
+    return words, directions
+
+
+class HashingVectorizer:
+    """Text -> unit vector of `dim` float32s; stable across processes and restarts."""
+
+    def __init__(self, dim: int = DEFAULT_DIM):
+        self.dim = dim
+
+    def _add(self, vector, feature: str, weight: float):
+        h = zlib.crc32(feature.encode())
+        # The top bit picks the sign so colliding features tend to cancel out
+        vector[h % self.dim] += -weight if h & 0x80000000 else weight
+
+    def __call__(self, text: str):
+        vector = np.zeros(self.dim, dtype=np.float32)
+        words, directions = terms(text)
+        for feature in directions:
+            self._add(vector, "d:" + feature, DIRECTION_WEIGHT)
+        for word in NEGATIONS.intersection(words):
+            self._add(vector, "n:" + word, NEGATION_WEIGHT)
+        for word in words:
+            self._add(vector, "w:" + word, WORD_WEIGHT)
+            padded = f" {word} "
+            for i in range(len(padded) - 2):
+                self._add(vector, "c:" + padded[i:i + 3], TRIGRAM_WEIGHT)
+        for first, second in zip(words, words[1:]):
+            self._add(vector, f"b:{first} {second}", BIGRAM_WEIGHT)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+
+class _Namespace:
+    """One tool's entries: a vector matrix plus parallel per-row metadata."""
+
+    def __init__(self, dim: int, max_entries: int):
+        self.max_entries = max_entries
+        rows = min(INITIAL_ROWS, max_entries)
+        self.vectors = np.zeros((rows, dim), dtype=np.float32)
+        self.expires = np.zeros(rows)
+        self.used = np.zeros(rows)
+        self.answers = [None] * rows
+        self.size = 0
+
+    def _grow(self):
+        rows = min(len(self.answers) * 2, self.max_entries)
+        extra = rows - len(self.answers)
+        self.vectors = np.vstack([self.vectors, np.zeros((extra, self.vectors.shape[1]), dtype=np.float32)])
+        self.expires = np.concatenate([self.expires, np.zeros(extra)])
+        self.used = np.concatenate([self.used, np.zeros(extra)])
+        self.answers.extend([None] * extra)
+
+    def nearest(self, vector, now: float):
+        """(row, similarity) of the closest live entry, or (None, 0.0)."""
+        if not self.size:
+            return None, 0.0
+        scores = self.vectors[:self.size] @ vector
+        scores[self.expires[:self.size] <= now] = -1.0
+        row = int(np.argmax(scores))
+        return (row, float(scores[row])) if scores[row] > -1.0 else (None, 0.0)
+
+    def free_row(self, now: float):
+        """A row to write into and whether a live entry is evicted for it."""
+        if self.size < self.max_entries:
+            if self.size == len(self.answers):
+                self._grow()
+            self.size += 1
+            return self.size - 1, False
+        expired = np.flatnonzero(self.expires <= now)
+        if expired.size:
+            return int(expired[0]), False
+        return int(np.argmin(self.used)), True
+
+
+class SemanticCache:
+    def __init__(self, threshold: float = DEFAULT_THRESHOLD, max_entries: int = DEFAULT_MAX_ENTRIES,
+                 ttl: float = DEFAULT_TTL, dim: int = DEFAULT_DIM):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.vectorize = HashingVectorizer(dim)
+        self._namespaces = {}  # namespace -> _Namespace
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, namespace: str, text: str) -> Optional[str]:
+        vector = self.vectorize(text)
+        with self._lock:
+            space = self._namespaces.get(namespace)
+            now = time.monotonic()
+            row, score = space.nearest(vector, now) if space is not None else (None, 0.0)
+            if row is None or score < self.threshold:
+                self.misses += 1
+                return None
+            space.used[row] = now
+            self.hits += 1
+            return space.answers[row]
+
+    def set(self, namespace: str, text: str, answer: str, ttl: Optional[float] = None):
+        vector = self.vectorize(text)
+        if not vector.any():
+            return  # nothing but filler words: it would match nothing useful
+        with self._lock:
+            space = self._namespaces.get(namespace)
+            if space is None:
+                space = self._namespaces[namespace] = _Namespace(self.vectorize.dim, self.max_entries)
+            now = time.monotonic()
+            row, score = space.nearest(vector, now)
+            if row is None or score < 0.999:
+                # Not a repeat of a stored question: take a new (or evicted) row
+                row, evicted = space.free_row(now)
+                self.evictions += evicted
+            space.vectors[row] = vector
+            space.answers[row] = answer
+            space.expires[row] = now + (self.ttl if ttl is None else ttl)
+            space.used[row] = now
+
+    def stats(self) -> dict:
+        with self._lock:
+            entries = {name: space.size for name, space in self._namespaces.items()}
+        lookups = self.hits + self.misses
+        return {
+            "entries": sum(entries.values()),
+            "namespaces": entries,
+            "max_entries_per_namespace": self.max_entries,
+            "threshold": self.threshold,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+        }
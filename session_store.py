@@ -0,0 +1,246 @@
+"""In-process session store with idle expiry, LRU eviction and memory accounting.
+
+The app talks to the store through its async methods (`aget`,
+`aget_or_create`, `acreate`, `save`). This store answers them from memory;
+shared_sessions.RedisSessionStore answers them from a Redis-protocol server
+shared by every worker and node, and uses this store as its near-cache.
+
+Sessions are `Session` objects and turns are `(user, bot)` tuples. Both are
+compact: slots instead of a per-instance dict, and a tuple instead of a list.
+With ten thousand live sessions that difference is most of the per-session
+overhead (see benchmarks/bench_sessions.py). Turns are immutable, so a saved
+chat can share them with the session instead of copying them.
+
+`turn_base` is the index of the first turn still held in `chat_history`; it
+moves forward when the chat is cleared or old turns are trimmed to respect
+the per-session byte cap, so turn indexes stay monotonic. `cleared_at` is
+the `turn_base` of the last clear: where the current conversation starts, so
+a summary that ends before it belongs to a cleared chat. Once the chat is
+saved, `chat_owner` and `chat_id` name its saved record and `saved_upto` is
+the index of the first turn not yet persisted to it. `summary`,
+`summarized_upto` and `summarizing` belong to the chat context builder (see
+context_builder).
+"""
+import asyncio
+import os
+import secrets
+import time
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+
+DEFAULT_MAX_SESSIONS = int(os.getenv("SESSION_MAX_COUNT", "10000"))
+DEFAULT_IDLE_TTL = float(os.getenv("SESSION_IDLE_TTL", "3600"))
+DEFAULT_MAX_HISTORY_BYTES = int(os.getenv("SESSION_MAX_HISTORY_BYTES", str(512 * 1024)))
+DEFAULT_SWEEP_INTERVAL = float(os.getenv("SESSION_SWEEP_INTERVAL", "60"))
+
+
+Turn = Tuple[str, str]  # (user, bot)
+
+
+def turn_bytes(turn: Turn) -> int:
+    return len(turn[0].encode("utf-8")) + len(turn[1].encode("utf-8"))
+
+
+class Session:
+    __slots__ = ("id", "username", "chat_history", "turn_base", "cleared_at", "last_seen", "history_bytes",
+                 "chat_owner", "chat_id", "saved_upto", "summary", "summarized_upto", "summarizing",
+                 "synced_at")
+    # What a shared store keeps, in two records: the summary is written in
+    # the background and must not overwrite turns added meanwhile. The rest
+    # (last_seen, summarizing, synced_at) is process-local bookkeeping.
+    SHARED = ("username", "turn_base", "cleared_at", "history_bytes", "chat_owner", "chat_id", "saved_upto")
+    SUMMARY = ("summary", "summarized_upto")
+
+    def __init__(self, session_id: str, username: Optional[str] = None):
+        self.id = session_id
+        self.username = username
+        self.chat_history: List[Turn] = []
+        self.turn_base = 0
+        self.cleared_at = 0
+        self.last_seen = time.monotonic()
+        self.history_bytes = 0
+        self.chat_owner: Optional[str] = None
+        self.chat_id: Optional[str] = None
+        self.saved_upto = 0
+        self.summary = ""
+        self.summarized_upto = 0
+        self.summarizing = False
+        self.synced_at = 0.0
+
+    def to_dict(self) -> dict:
+        data = {name: getattr(self, name) for name in self.SHARED}
+        data["chat_history"] = self.chat_history
+        return data
+
+    def summary_dict(self) -> dict:
+        return {name: getattr(self, name) for name in self.SUMMARY}
+
+    @classmethod
+    def from_dict(cls, session_id: str, data: dict, summary: Optional[dict] = None) -> "Session":
+        session = cls(session_id)
+        for name in cls.SHARED:
+            # Records written before a field existed keep its default
+            setattr(session, name, data.get(name, getattr(session, name)))
+        session.chat_history = [tuple(turn) for turn in data["chat_history"]]
+        if summary and summary["summarized_upto"] >= session.cleared_at:
+            for name in cls.SUMMARY:
+                setattr(session, name, summary[name])
+        else:
+            session.summarized_upto = session.cleared_at
+        return session
+
+    def current_summary(self) -> str:
+        """The summary, unless it was written for a conversation since cleared."""
+        return self.summary if self.summarized_upto >= self.cleared_at else ""
+
+
+class SessionStore:
+    # Whether other workers see these sessions (and so append to saved chats)
+    shared = False
+
+    def __init__(self, max_sessions: int = DEFAULT_MAX_SESSIONS, idle_ttl: float = DEFAULT_IDLE_TTL,
+                 max_history_bytes: int = DEFAULT_MAX_HISTORY_BYTES):
+        self.max_sessions = max_sessions
+        self.idle_ttl = idle_ttl
+        self.max_history_bytes = max_history_bytes
+        self._sessions = OrderedDict()  # session_id -> session, least recently used first
+        self.history_bytes = 0
+        self.evicted = 0
+        self.expired = 0
+        self.trimmed_turns = 0
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def __contains__(self, session_id):
+        return self.get(session_id) is not None
+
+    def create(self, username: Optional[str] = None) -> Tuple[str, Session]:
+        session = Session(secrets.token_urlsafe(18), username)
+        self._insert(session)
+        return session.id, session
+
+    def _insert(self, session: Session):
+        self._sessions[session.id] = session
+        self.history_bytes += session.history_bytes
+        while len(self._sessions) > self.max_sessions:
+            _, oldest = self._sessions.popitem(last=False)
+            self.history_bytes -= oldest.history_bytes
+            self.evicted += 1
+
+    def get(self, session_id: Optional[str]) -> Optional[Session]:
+        session = self._sessions.get(session_id) if session_id else None
+        if session is None:
+            return None
+        now = time.monotonic()
+        if now - session.last_seen > self.idle_ttl:
+            self._drop(session_id)
+            self.expired += 1
+            return None
+        session.last_seen = now
+        self._sessions.move_to_end(session_id)
+        return session
+
+    def get_or_create(self, session_id: Optional[str]) -> Tuple[str, Session]:
+        """Return the live session for `session_id`, or a fresh anonymous one.
+
+        Unknown ids are never adopted as keys: callers get a new id back and
+        must hand it to the client.
+        """
+        session = self.get(session_id)
+        if session is not None:
+            return session_id, session
+        return self.create()
+
+    def _held(self, session: Session) -> bool:
+        # A session can be evicted, expired or invalidated while its model
+        # call is in flight; its bytes are no longer part of history_bytes
+        return self._sessions.get(session.id) is session
+
+    def append_turn(self, session: Session, turn: Turn):
+        held = self._held(session)
+        session.chat_history.append(turn)
+        size = turn_bytes(turn)
+        session.history_bytes += size
+        if held:
+            self.history_bytes += size
+        # Keep at least the newest turn even if it alone exceeds the cap
+        while session.history_bytes > self.max_history_bytes and len(session.chat_history) > 1:
+            dropped = session.chat_history.pop(0)
+            size = turn_bytes(dropped)
+            session.history_bytes -= size
+            if held:
+                self.history_bytes -= size
+            session.turn_base += 1
+            self.trimmed_turns += 1
+
+    def clear(self, session: Session):
+        session.turn_base += len(session.chat_history)
+        session.chat_history = []
+        if self._held(session):
+            self.history_bytes -= session.history_bytes
+        session.history_bytes = 0
+        # A cleared chat is a new conversation; the next save starts a new record
+        session.cleared_at = session.turn_base
+        session.chat_owner = session.chat_id = None
+        session.saved_upto = session.turn_base
+        session.summary = ""
+        session.summarized_upto = session.turn_base
+
+    def sweep(self) -> int:
+        """Drop sessions idle for longer than the TTL; returns how many."""
+        cutoff = time.monotonic() - self.idle_ttl
+        expired = []
+        # Least recently used first, so stop at the first live session
+        for session_id, session in self._sessions.items():
+            if session.last_seen > cutoff:
+                break
+            expired.append(session_id)
+        for session_id in expired:
+            self._drop(session_id)
+        self.expired += len(expired)
+        return len(expired)
+
+    async def run_sweeper(self, interval: float = DEFAULT_SWEEP_INTERVAL):
+        while True:
+            await asyncio.sleep(interval)
+            self.sweep()
+
+    def _drop(self, session_id: str):
+        session = self._sessions.pop(session_id)
+        self.history_bytes -= session.history_bytes
+
+    # The app's interface. Everything lives in this process, so there is
+    # nothing to fetch or write back.
+    async def aget(self, session_id: Optional[str]) -> Optional[Session]:
+        return self.get(session_id)
+
+    async def aget_or_create(self, session_id: Optional[str]) -> Tuple[str, Session]:
+        return self.get_or_create(session_id)
+
+    async def acreate(self, username: Optional[str] = None) -> Tuple[str, Session]:
+        return self.create(username)
+
+    async def save(self, session: Session):
+        """Publish changes made to `session` (after append_turn, clear, ...)."""
+
+    async def save_summary(self, session: Session):
+        """Publish a new `summary`/`summarized_upto`, leaving the turns alone."""
+
+    async def start(self):
+        pass
+
+    async def close(self):
+        pass
+
+    def stats(self) -> dict:
+        return {
+            "live": len(self._sessions),
+            "max_sessions": self.max_sessions,
+            "history_bytes": self.history_bytes,
+            "max_history_bytes_per_session": self.max_history_bytes,
+            "idle_ttl_seconds": self.idle_ttl,
+            "evicted": self.evicted,
+            "expired": self.expired,
+            "trimmed_turns": self.trimmed_turns,
+        }
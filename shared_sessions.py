@@ -0,0 +1,206 @@
+"""Sessions shared by every worker and node through a Redis-protocol server.
+
+With the in-process SessionStore a session lives in the worker that created
+it, so running more workers (or more machines) needs sticky routing. With
+SESSION_BACKEND=redis every worker reads and writes sessions in a Redis,
+Valkey or KeyDB server (benchmarks/fake_redis.py stands in for one locally),
+and any worker can serve any request.
+
+Each session is two keys: `<prefix><id>` holds the turns and bookkeeping and
+`<prefix><id>:summary:<cleared_at>` holds the rolling summary, which the
+context builder writes in the background and so must not overwrite turns
+added meanwhile. The summary key names the conversation it belongs to (the
+turn index of the last clear), so a summary that finishes after another
+worker cleared the chat lands in a key nobody reads any more, and is never
+mixed into the new conversation. Reading a session therefore takes two round
+trips on a near-cache miss. Both keys expire after SESSION_IDLE_TTL without
+use, and their size is bounded by SESSION_MAX_HISTORY_BYTES as before.
+
+Writes are last-writer-wins: two requests for the same session racing on
+different workers (two tabs sending at once) can lose one turn from the live
+session, never from a saved chat. Every worker has its own write-behind
+queue, so saving a chat writes its record straight to storage: a turn
+appended by another worker must find the record already there.
+
+Every worker keeps recently used sessions in a near-cache (the in-process
+store, up to SESSION_NEAR_CACHE_SIZE) so most requests skip the round trip.
+A worker that saves a session publishes its id on an invalidation channel;
+the others drop their copy. The near-cache is only trusted while that
+subscription is up: while it is down (server restart, network blip) every
+request reads through, and the cache is emptied on reconnect since
+invalidations may have been missed.
+
+When the server cannot be reached, session calls raise
+SessionStoreUnavailable, which the app answers with 503.
+"""
+import asyncio
+import os
+import secrets
+import time
+from typing import Optional, Tuple
+
+import fast_json
+from resp_client import RespClient, RespError
+from session_store import Session, SessionStore
+
+DEFAULT_BACKEND = os.getenv("SESSION_BACKEND", "memory")
+DEFAULT_REDIS_URL = os.getenv("REDIS_URL", "redis://127.0.0.1:6379/0")
+DEFAULT_NEAR_CACHE_SIZE = int(os.getenv("SESSION_NEAR_CACHE_SIZE", "2000"))
+KEY_PREFIX = os.getenv("SESSION_KEY_PREFIX", "career-ai:session:")
+INVALIDATION_CHANNEL = KEY_PREFIX + "invalidate"
+
+REMOTE_ERRORS = (OSError, ConnectionError, RespError, asyncio.TimeoutError, asyncio.IncompleteReadError)
+
+
+class SessionStoreUnavailable(Exception):
+    """The shared session server could not be reached or refused a command."""
+
+
+class RedisSessionStore(SessionStore):
+    shared = True
+
+    def __init__(self, client: RespClient, near_cache_size: int = DEFAULT_NEAR_CACHE_SIZE, **kwargs):
+        super().__init__(max_sessions=near_cache_size, **kwargs)
+        self.client = client
+        self.worker_id = secrets.token_hex(4)
+        self._ttl_ms = int(self.idle_ttl * 1000)
+        # Bumped on every invalidation, so a read that raced one is not cached
+        self._generation = 0
+        self._listening = False
+        self._subscriber: Optional[asyncio.Task] = None
+        self.near_hits = 0
+        self.near_misses = 0
+        self.invalidations = 0
+        self.remote_errors = 0
+
+    @staticmethod
+    def _keys(session_id: str, cleared_at: int) -> Tuple[str, str]:
+        key = KEY_PREFIX + session_id
+        return key, f"{key}:summary:{cleared_at}"
+
+    async def _call(self, commands: list) -> list:
+        try:
+            return await self.client.pipeline(commands)
+        except REMOTE_ERRORS as e:
+            self.remote_errors += 1
+            raise SessionStoreUnavailable(f"session store: {e}") from e
+
+    async def aget(self, session_id: Optional[str]) -> Optional[Session]:
+        if not session_id:
+            return None
+        session = self.get(session_id) if self._listening else None
+        if session is not None:
+            self.near_hits += 1
+            # Reads served from the near-cache do not touch the shared keys;
+            # refresh their TTL now and then so an active session never expires
+            if session.last_seen - session.synced_at > self.idle_ttl / 4:
+                session.synced_at = session.last_seen
+                key, summary_key = self._keys(session_id, session.cleared_at)
+                await self._call([("PEXPIRE", key, self._ttl_ms), ("PEXPIRE", summary_key, self._ttl_ms)])
+            return session
+        self.near_misses += 1
+        generation = self._generation
+        key = KEY_PREFIX + session_id
+        data, _ = await self._call([("GET", key), ("PEXPIRE", key, self._ttl_ms)])
+        if session_id in self._sessions:
+            self._drop(session_id)
+        if data is None:
+            return None
+        data = fast_json.loads(data)
+        _, summary_key = self._keys(session_id, data.get("cleared_at", 0))
+        summary, _ = await self._call([("GET", summary_key), ("PEXPIRE", summary_key, self._ttl_ms)])
+        session = Session.from_dict(session_id, data, fast_json.loads(summary) if summary is not None else None)
+        session.synced_at = session.last_seen
+        if generation == self._generation:
+            self._insert(session)
+        return session
+
+    async def aget_or_create(self, session_id: Optional[str]) -> Tuple[str, Session]:
+        session = await self.aget(session_id)
+        if session is not None:
+            return session_id, session
+        return await self.acreate()
+
+    async def acreate(self, username: Optional[str] = None) -> Tuple[str, Session]:
+        session_id, session = self.create(username)
+        await self.save(session)
+        return session_id, session
+
+    async def save(self, session: Session):
+        key, summary_key = self._keys(session.id, session.cleared_at)
+        session.synced_at = time.monotonic()
+        await self._call([
+            ("SET", key, fast_json.dumps(session.to_dict()), "PX", self._ttl_ms),
+            ("SET", summary_key, fast_json.dumps(session.summary_dict()), "PX", self._ttl_ms),
+            ("PUBLISH", INVALIDATION_CHANNEL, f"{self.worker_id} {session.id}"),
+        ])
+
+    async def save_summary(self, session: Session):
+        # Keyed by the conversation the summary was made for: after a clear
+        # elsewhere this writes to the old conversation's key, which is unread
+        _, summary_key = self._keys(session.id, session.cleared_at)
+        await self._call([
+            ("SET", summary_key, fast_json.dumps(session.summary_dict()), "PX", self._ttl_ms),
+            ("PUBLISH", INVALIDATION_CHANNEL, f"{self.worker_id} {session.id}"),
+        ])
+
+    def _on_invalidate(self, message: bytes):
+        worker_id, _, session_id = message.decode("utf-8").partition(" ")
+        if worker_id == self.worker_id:
+            return
+        self._generation += 1
+        if session_id in self._sessions:
+            self._drop(session_id)
+            self.invalidations += 1
+
+    def _forget_all(self):
+        self._generation += 1
+        self._sessions.clear()
+        self.history_bytes = 0
+
+    async def _on_connect(self):
+        self._forget_all()
+        self._listening = True
+
+    def _on_disconnect(self):
+        self._listening = False
+        self._forget_all()
+
+    async def start(self):
+        self._subscriber = asyncio.create_task(self.client.subscribe(
+            INVALIDATION_CHANNEL, self._on_invalidate, self._on_connect, self._on_disconnect))
+
+    async def close(self):
+        if self._subscriber is not None:
+            self._subscriber.cancel()
+            try:
+                await self._subscriber
+            except asyncio.CancelledError:
+                pass
+        await self.client.close()
+
+    def stats(self) -> dict:
+        stats = super().stats()
+        lookups = self.near_hits + self.near_misses
+        stats.update({
+            "backend": "redis",
+            "near_cache": {
+                "listening": self._listening,
+                "hits": self.near_hits,
+                "misses": self.near_misses,
+                "hit_ratio": round(self.near_hits / lookups, 4) if lookups else 0.0,
+                "invalidations": self.invalidations,
+            },
+            "remote_errors": self.remote_errors,
+        })
+        return stats
+
+
+def open_sessions(backend: str = DEFAULT_BACKEND, url: str = DEFAULT_REDIS_URL) -> SessionStore:
+    """The session store selected by SESSION_BACKEND: "memory" or "redis"."""
+    backend = backend.lower()
+    if backend == "memory":
+        return SessionStore()
+    if backend == "redis":
+        return RedisSessionStore(RespClient(url))
+    raise ValueError(f"unknown SESSION_BACKEND {backend!r} (expected memory or redis)")
@@ -1,5 +1,6 @@
 let sessionId = 'guest';
 let currentUser = null;
+let lastTurnIndex = -1;
 
 // Modal Management
 function openModal(type) {
@@ -199,6 +200,7 @@ async function login() {
         if (response.ok) {
             sessionId = data.session_id;
             currentUser = username;
+            lastTurnIndex = -1;
             showMessage('login-message', data.message, 'success');
             
             // Update UI
@@ -219,6 +221,7 @@ async function login() {
 function logout() {
     sessionId = 'guest';
     currentUser = null;
+    lastTurnIndex = -1;
     
     // Update UI
     document.querySelector('.auth-buttons .btn-login').style.display = 'inline-block';
@@ -242,25 +245,18 @@ async function sendMessage() {
     input.value = '';
     showLoading(true);
     
+    const botDiv = addMessageToChat('', 'bot');
+    
     try {
-        const response = await fetch('/api/chat', {
-            method: 'POST',
-            headers: {
-                'Content-Type': 'application/json',
-                'session-id': sessionId
-            },
-            body: JSON.stringify({message})
+        const data = await streamPost('/api/chat/stream', {message}, (token) => {
+            if (!botDiv.textContent) showLoading(false);
+            botDiv.textContent += token;
+            document.getElementById('chatbot').scrollTop = document.getElementById('chatbot').scrollHeight;
         });
-        
-        const data = await response.json();
-        
-        if (response.ok) {
-            addMessageToChat(data.response, 'bot');
-        } else {
-            addMessageToChat(data.detail, 'bot');
-        }
+        adoptSession(data.session_id);
+        await applyTurn(data.turn, true);
     } catch (error) {
-        addMessageToChat('Network error occurred', 'bot');
+        botDiv.textContent = error.message || 'Network error occurred';
     }
     
     showLoading(false);
@@ -273,6 +269,72 @@ function addMessageToChat(message, sender) {
     messageDiv.textContent = message;
     chatbot.appendChild(messageDiv);
     chatbot.scrollTop = chatbot.scrollHeight;
+    return messageDiv;
+}
+
+// Streaming: POST a JSON body and read Server-Sent Events as they arrive.
+// onToken is called for every chunk; resolves with the final "done" payload.
+async function streamPost(url, body, onToken) {
+    const response = await fetch(url, {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json',
+            'session-id': sessionId
+        },
+        body: JSON.stringify(body)
+    });
+    
+    if (!response.ok) {
+        const data = await response.json();
+        throw new Error(data.detail || 'Request failed');
+    }
+    
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    
+    while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+        
+        let boundary;
+        while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+            const rawEvent = buffer.slice(0, boundary);
+            buffer = buffer.slice(boundary + 2);
+            
+            let eventType = 'message';
+            let data = '';
+            rawEvent.split('\n').forEach(line => {
+                if (line.startsWith('event: ')) eventType = line.slice(7);
+                else if (line.startsWith('data: ')) data += line.slice(6);
+            });
+            
+            const payload = JSON.parse(data);
+            if (eventType === 'done') return payload;
+            if (eventType === 'error') throw new Error(payload.detail);
+            onToken(payload.token);
+        }
+    }
+    throw new Error('Stream ended unexpectedly');
+}
+
+async function streamService(service, url, body) {
+    const result = document.getElementById(`${service}-result`);
+    result.value = '';
+    
+    try {
+        const data = await streamPost(url, body, (token) => {
+            result.value += token;
+        });
+        
+        if (data.updated_history) {
+            adoptSession(data.session_id);
+            await applyTurn(data.turn, false);
+        }
+    } catch (error) {
+        result.value = error.message || 'Error occurred';
+    }
 }
 
 async function clearChat() {
@@ -282,6 +344,8 @@ async function clearChat() {
         });
         
         if (response.ok) {
+            const data = await response.json();
+            lastTurnIndex = data.turn_index;
             document.getElementById('chatbot').innerHTML = '';
             showMessage('save-message', 'Chat cleared!', 'success');
         }
@@ -327,25 +391,7 @@ async function assessCareer() {
     
     showLoadingButton('assessment');
     
-    try {
-        const response = await fetch('/api/assess', {
-            method: 'POST',
-            headers: {
-                'Content-Type': 'application/json',
-                'session-id': sessionId
-            },
-            body: JSON.stringify({q1, q2, q3, q4, q5})
-        });
-        
-        const data = await response.json();
-        document.getElementById('assessment-result').value = data.response;
-        
-        if (data.updated_history) {
-            updateChatHistory(data.history);
-        }
-    } catch (error) {
-        document.getElementById('assessment-result').value = 'Error occurred';
-    }
+    await streamService('assessment', '/api/assess/stream', {q1, q2, q3, q4, q5});
     
     hideLoadingButton('assessment');
 }
@@ -362,25 +408,7 @@ async function analyzeSkills() {
     
     showLoadingButton('skills');
     
-    try {
-        const response = await fetch('/api/skills', {
-            method: 'POST',
-            headers: {
-                'Content-Type': 'application/json',
-                'session-id': sessionId
-            },
-            body: JSON.stringify({current_skills: currentSkills, target_role: targetRole})
-        });
-        
-        const data = await response.json();
-        document.getElementById('skills-result').value = data.response;
-        
-        if (data.updated_history) {
-            updateChatHistory(data.history);
-        }
-    } catch (error) {
-        document.getElementById('skills-result').value = 'Error occurred';
-    }
+    await streamService('skills', '/api/skills/stream', {current_skills: currentSkills, target_role: targetRole});
     
     hideLoadingButton('skills');
 }
@@ -397,25 +425,7 @@ async function getResumeTips() {
     
     showLoadingButton('resume');
     
-    try {
-        const response = await fetch('/api/resume', {
-            method: 'POST',
-            headers: {
-                'Content-Type': 'application/json',
-                'session-id': sessionId
-            },
-            body: JSON.stringify({job_role: jobRole, experience_level: experienceLevel})
-        });
-        
-        const data = await response.json();
-        document.getElementById('resume-result').value = data.response;
-        
-        if (data.updated_history) {
-            updateChatHistory(data.history);
-        }
-    } catch (error) {
-        document.getElementById('resume-result').value = 'Error occurred';
-    }
+    await streamService('resume', '/api/resume/stream', {job_role: jobRole, experience_level: experienceLevel});
     
     hideLoadingButton('resume');
 }
@@ -432,25 +442,7 @@ async function getMarketInsights() {
     
     showLoadingButton('market');
     
-    try {
-        const response = await fetch('/api/market', {
-            method: 'POST',
-            headers: {
-                'Content-Type': 'application/json',
-                'session-id': sessionId
-            },
-            body: JSON.stringify({field, location})
-        });
-        
-        const data = await response.json();
-        document.getElementById('market-result').value = data.response;
-        
-        if (data.updated_history) {
-            updateChatHistory(data.history);
-        }
-    } catch (error) {
-        document.getElementById('market-result').value = 'Error occurred';
-    }
+    await streamService('market', '/api/market/stream', {field, location});
     
     hideLoadingButton('market');
 }
@@ -467,25 +459,7 @@ async function getLearningResources() {
     
     showLoadingButton('learning');
     
-    try {
-        const response = await fetch('/api/learning', {
-            method: 'POST',
-            headers: {
-                'Content-Type': 'application/json',
-                'session-id': sessionId
-            },
-            body: JSON.stringify({skill, learning_style: learningStyle})
-        });
-        
-        const data = await response.json();
-        document.getElementById('learning-result').value = data.response;
-        
-        if (data.updated_history) {
-            updateChatHistory(data.history);
-        }
-    } catch (error) {
-        document.getElementById('learning-result').value = 'Error occurred';
-    }
+    await streamService('learning', '/api/learning/stream', {skill, learning_style: learningStyle});
     
     hideLoadingButton('learning');
 }
@@ -542,13 +516,46 @@ function handleEnter(event) {
     }
 }
 
-function updateChatHistory(history) {
+// Anonymous visitors get their own session the first time they ask something
+function adoptSession(id) {
+    if (id && id !== sessionId) {
+        sessionId = id;
+        lastTurnIndex = -1;
+    }
+}
+
+// History deltas: each response carries only the new turn and its index.
+// A gap in the indexes (another tab, a dropped stream) triggers a paged resync.
+async function applyTurn(turn, alreadyShown) {
+    if (turn.index === lastTurnIndex + 1) {
+        if (!alreadyShown) {
+            addMessageToChat(turn.user, 'user');
+            addMessageToChat(turn.bot, 'bot');
+        }
+        lastTurnIndex = turn.index;
+    } else if (turn.index > lastTurnIndex) {
+        await resyncHistory();
+    }
+}
+
+async function resyncHistory() {
     const chatbot = document.getElementById('chatbot');
     chatbot.innerHTML = '';
-    history.forEach(([user, bot]) => {
-        addMessageToChat(user, 'user');
-        addMessageToChat(bot, 'bot');
-    });
+    lastTurnIndex = -1;
+    
+    let since = -1;
+    while (since !== null) {
+        const response = await fetch(`/api/history?since=${since}`, {
+            headers: {'session-id': sessionId}
+        });
+        const data = await response.json();
+        data.turns.forEach(turn => {
+            addMessageToChat(turn.user, 'user');
+            addMessageToChat(turn.bot, 'bot');
+            lastTurnIndex = turn.index;
+        });
+        since = data.next_since;
+    }
 }
 
 // Close modal when clicking outside
@@ -0,0 +1,135 @@
+"""Precompressed, fingerprinted static files, and gzip for large API responses.
+
+`StaticAssets` reads `static/` once at startup. For every file it keeps the
+raw bytes plus gzip and (when the optional `brotli` package is installed)
+brotli encodings, and a strong ETag per encoding. CSS and JS files also get
+a fingerprinted name (`style.3f2a9c0d1b7e.css`), and references to them in
+the HTML pages are rewritten to the new names. Those URLs change whenever the
+content does, so they are served with `Cache-Control: immutable` and a
+one-year max-age. HTML pages keep their URLs and are revalidated with the
+ETag, so a repeat visit costs a 304.
+
+`CompressJSON` gzips API responses above a size threshold. Streams are
+passed through untouched, so tokens are not held back by the compressor.
+"""
+import gzip
+import hashlib
+import mimetypes
+import os
+from typing import Dict, Optional
+
+from starlette.middleware.gzip import GZipMiddleware
+from starlette.requests import Request
+from starlette.responses import Response
+
+try:
+    import brotli  # optional: smaller than gzip for text
+except ImportError:
+    brotli = None
+
+FINGERPRINTED = (".css", ".js")
+IMMUTABLE = "public, max-age=31536000, immutable"
+REVALIDATE = "no-cache"
+JSON_GZIP_MIN_BYTES = int(os.getenv("JSON_GZIP_MIN_BYTES", "1024"))
+
+
+class Asset:
+    __slots__ = ("media_type", "cache_control", "bodies", "etags")
+
+    def __init__(self, body: bytes, media_type: str, cache_control: str):
+        self.media_type = media_type
+        self.cache_control = cache_control
+        # encoding -> bytes; an encoding is only kept when it actually saves space
+        self.bodies = {"identity": body}
+        compressed = gzip.compress(body, 9, mtime=0)
+        if len(compressed) < len(body):
+            self.bodies["gzip"] = compressed
+        if brotli is not None:
+            compressed = brotli.compress(body, quality=11)
+            if len(compressed) < len(body):
+                self.bodies["br"] = compressed
+        digest = hashlib.sha256(body).hexdigest()[:16]
+        self.etags = {encoding: f'"{digest}-{encoding}"' for encoding in self.bodies}
+
+
+def fingerprint(name: str, body: bytes) -> str:
+    stem, ext = os.path.splitext(name)
+    return f"{stem}.{hashlib.sha256(body).hexdigest()[:12]}{ext}"
+
+
+def media_type(name: str) -> str:
+    kind = mimetypes.guess_type(name)[0] or "application/octet-stream"
+    return f"{kind}; charset=utf-8" if kind.startswith("text/") or kind.endswith("javascript") else kind
+
+
+def preferred_encoding(request: Request, available) -> str:
+    accepted = {part.split(";")[0].strip() for part in request.headers.get("accept-encoding", "").split(",")}
+    for encoding in ("br", "gzip"):
+        if encoding in available and encoding in accepted:
+            return encoding
+    return "identity"
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    tags = [tag.strip() for tag in header.split(",")]
+    return "*" in tags or etag in (tag[2:] if tag.startswith("W/") else tag for tag in tags)
+
+
+class StaticAssets:
+    def __init__(self, directory: str, prefix: str = "/static"):
+        self.directory = directory
+        self.prefix = prefix
+        self.assets: Dict[str, Asset] = {}
+        self.urls: Dict[str, str] = {}  # original name -> fingerprinted name
+        self._load()
+
+    def _load(self):
+        files = {}
+        for name in sorted(os.listdir(self.directory)):
+            path = os.path.join(self.directory, name)
+            if os.path.isfile(path):
+                with open(path, "rb") as f:
+                    files[name] = f.read()
+
+        for name, body in files.items():
+            if name.endswith(FINGERPRINTED):
+                self.urls[name] = fingerprint(name, body)
+                self.assets[self.urls[name]] = Asset(body, media_type(name), IMMUTABLE)
+
+        for name, body in files.items():
+            if name.endswith(".html"):
+                text = body.decode("utf-8")
+                for original, fingerprinted in self.urls.items():
+                    text = text.replace(f"{self.prefix}/{original}", f"{self.prefix}/{fingerprinted}")
+                body = text.encode("utf-8")
+            # Unfingerprinted names stay reachable (old pages, direct links) but must revalidate
+            self.assets[name] = Asset(body, media_type(name), REVALIDATE)
+
+    def response(self, request: Request, name: str) -> Optional[Response]:
+        """The asset as a 200 or 304 response, or None if there is no such file."""
+        asset = self.assets.get(name)
+        if asset is None:
+            return None
+        encoding = preferred_encoding(request, asset.bodies)
+        headers = {"ETag": asset.etags[encoding], "Cache-Control": asset.cache_control, "Vary": "Accept-Encoding"}
+        if etag_matches(request, asset.etags[encoding]):
+            return Response(status_code=304, headers=headers)
+        if encoding != "identity":
+            headers["Content-Encoding"] = encoding
+        return Response(asset.bodies[encoding], headers=headers, media_type=asset.media_type)
+
+
+class CompressJSON(GZipMiddleware):
+    """gzip responses over `minimum_size` bytes, except Server-Sent Event streams."""
+
+    def __init__(self, app, minimum_size: int = JSON_GZIP_MIN_BYTES):
+        super().__init__(app, minimum_size=minimum_size)
+
+    async def __call__(self, scope, receive, send):
+        # Older Starlette releases would buffer and compress text/event-stream too
+        if scope["type"] == "http" and scope["path"].endswith("/stream"):
+            return await self.app(scope, receive, send)
+        await super().__call__(scope, receive, send)
@@ -0,0 +1,396 @@
+"""Storage backends for user accounts and saved chats.
+
+`InMemoryStorage` keeps everything in process (the historical behaviour) and
+`SQLiteStorage` persists to a WAL-mode SQLite file so several worker processes
+on one box see the same users. Pick one with `open_storage()`, which reads
+STORAGE_BACKEND (memory | sqlite) and SQLITE_PATH.
+
+Users are dicts with "email", "password" and "full_name". Emails are unique
+and stored normalized (see `normalize_email`); both backends look them up
+through an index rather than scanning users.
+
+Saved chats are dicts with "id", "title", "timestamp" and "messages"
+([(user, bot), ...]). A saved chat is a live, append-only record: `add_chat`
+stores the turns so far and `append_turns` adds later ones, so a growing
+conversation is written once rather than re-saved in full. The in-memory
+backend keeps the session's own (immutable) turn tuples, so a saved chat
+shares its text with the live session instead of copying it. SQLite keeps
+appended turns as rows in `chat_turns`, and `compact_chats` later folds
+those rows into the chat's `messages` blob once the chat has gone quiet.
+
+Chat ids come from `new_chat_id()`: fixed-width hex strings that sort by
+creation time, so listings page newest-first with the last id seen as the
+cursor. Listings return metadata only ("id", "title", "timestamp",
+"turn_count"), never message bodies.
+"""
+import bisect
+import os
+import secrets
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import List, Optional, Tuple
+
+import fast_json
+
+CHAT_PAGE_SIZE = 20
+
+
+class AlreadyExists(Exception):
+    """A unique field (`field` is "username" or "email") is already taken."""
+
+    def __init__(self, field: str):
+        super().__init__(f"{field} already exists")
+        self.field = field
+
+
+def normalize_email(email: str) -> str:
+    return email.strip().lower()
+
+
+def new_chat_id() -> str:
+    return f"{time.time_ns():016x}{secrets.token_hex(3)}"
+
+
+class SavedChat:
+    __slots__ = ("id", "title", "timestamp", "messages")
+
+    def __init__(self, chat_id: str, title: str, timestamp: str, messages: list):
+        self.id = chat_id
+        self.title = title
+        self.timestamp = timestamp
+        self.messages = messages
+
+    def summary(self) -> dict:
+        return {"id": self.id, "title": self.title, "timestamp": self.timestamp, "turn_count": len(self.messages)}
+
+    def as_dict(self) -> dict:
+        return {"id": self.id, "title": self.title, "timestamp": self.timestamp, "messages": self.messages}
+
+
+class Storage(ABC):
+    @abstractmethod
+    def get_user(self, username: str) -> Optional[dict]:
+        ...
+
+    @abstractmethod
+    def create_user(self, username: str, email: str, password: str, full_name: str):
+        """Insert a user; raises AlreadyExists if the username or email is taken."""
+
+    @abstractmethod
+    def update_user(self, username: str, **fields):
+        """Change user fields; raises AlreadyExists if a new email is taken."""
+
+    @abstractmethod
+    def find_username_by_email(self, email: str) -> Optional[str]:
+        ...
+
+    @abstractmethod
+    def add_chat(self, username: str, chat: dict, chat_id: Optional[str] = None) -> str:
+        """Store a snapshot of a chat (without "id") under `chat_id`, or a new id; return the id."""
+
+    @abstractmethod
+    def list_chats(self, username: str, cursor: Optional[str] = None,
+                   limit: int = CHAT_PAGE_SIZE) -> Tuple[List[dict], Optional[str]]:
+        """Return one page of chat summaries, newest first, and the next cursor."""
+
+    @abstractmethod
+    def get_chat(self, username: str, chat_id: str) -> Optional[dict]:
+        ...
+
+    @abstractmethod
+    def append_turns(self, username: str, chat_id: str, turns: tuple):
+        """Add turns to the end of a saved chat; unknown chats are ignored."""
+
+    def compact_chats(self, idle_seconds: float) -> int:
+        """Fold appended turns of chats idle for `idle_seconds` into their
+        snapshot; returns how many chats were compacted."""
+        return 0
+
+    def write_batch(self, ops: List[tuple]):
+        """Apply queued writes, `[("add_chat", *args), ("append_turns", *args), ...]`, in order.
+
+        Backends that support it apply the whole batch in one transaction
+        (see write_behind).
+        """
+        for name, *args in ops:
+            getattr(self, name)(*args)
+
+    def close(self):
+        pass
+
+
+class InMemoryStorage(Storage):
+    def __init__(self):
+        self._users = {}
+        self._emails = {}  # normalized email -> username
+        self._chats = {}  # username -> {chat_id: SavedChat}
+        self._chat_ids = {}  # username -> sorted [chat_id, ...]
+
+    def get_user(self, username):
+        return self._users.get(username)
+
+    def create_user(self, username, email, password, full_name):
+        email = normalize_email(email)
+        if username in self._users:
+            raise AlreadyExists("username")
+        if email in self._emails:
+            raise AlreadyExists("email")
+        self._users[username] = {"email": email, "password": password, "full_name": full_name}
+        self._emails[email] = username
+        self._chats[username] = {}
+        self._chat_ids[username] = []
+
+    def update_user(self, username, **fields):
+        user = self._users[username]
+        if "email" in fields:
+            email = fields["email"] = normalize_email(fields["email"])
+            owner = self._emails.get(email)
+            if owner is not None and owner != username:
+                raise AlreadyExists("email")
+            del self._emails[user["email"]]
+            self._emails[email] = username
+        user.update(fields)
+
+    def find_username_by_email(self, email):
+        return self._emails.get(normalize_email(email))
+
+    def add_chat(self, username, chat, chat_id=None):
+        chat_id = chat_id or new_chat_id()
+        # The turns are immutable tuples, so only the list of them is copied
+        self._chats[username][chat_id] = SavedChat(chat_id, chat["title"], chat["timestamp"],
+                                                   list(chat["messages"]))
+        bisect.insort(self._chat_ids[username], chat_id)
+        return chat_id
+
+    def list_chats(self, username, cursor=None, limit=CHAT_PAGE_SIZE):
+        ids = self._chat_ids.get(username, [])
+        end = len(ids) if cursor is None else bisect.bisect_left(ids, cursor)
+        start = max(0, end - limit)
+        chats = self._chats[username] if ids else {}
+        page = [chats[chat_id].summary() for chat_id in reversed(ids[start:end])]
+        return page, (ids[start] if start > 0 else None)
+
+    def get_chat(self, username, chat_id):
+        chat = self._chats.get(username, {}).get(chat_id)
+        return chat.as_dict() if chat is not None else None
+
+    def append_turns(self, username, chat_id, turns):
+        chat = self._chats.get(username, {}).get(chat_id)
+        if chat is not None:
+            chat.messages.extend(turns)
+
+
+class SQLiteStorage(Storage):
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS users (
+            username TEXT PRIMARY KEY,
+            email TEXT NOT NULL,
+            password TEXT NOT NULL,
+            full_name TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS chats (
+            id TEXT PRIMARY KEY,
+            username TEXT NOT NULL REFERENCES users (username),
+            title TEXT NOT NULL,
+            timestamp TEXT NOT NULL,
+            turn_count INTEGER NOT NULL,
+            messages TEXT NOT NULL,
+            updated_at REAL NOT NULL DEFAULT 0
+        );
+        CREATE INDEX IF NOT EXISTS idx_chats_username ON chats (username, id);
+        CREATE TABLE IF NOT EXISTS chat_turns (
+            chat_id TEXT NOT NULL REFERENCES chats (id),
+            seq INTEGER NOT NULL,
+            user TEXT NOT NULL,
+            bot TEXT NOT NULL,
+            PRIMARY KEY (chat_id, seq)
+        ) WITHOUT ROWID;
+    """
+    USER_COLUMNS = ("email", "password", "full_name")
+
+    def __init__(self, path: str):
+        self.path = path
+        # sqlite3 connections must stay on the thread that opened them
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.executescript(self.SCHEMA)
+            columns = {row["name"] for row in conn.execute("PRAGMA table_info(chats)")}
+            if "updated_at" not in columns:
+                # Files created before chats became append-only
+                conn.execute("ALTER TABLE chats ADD COLUMN updated_at REAL NOT NULL DEFAULT 0")
+            indexes = {row["name"] for row in conn.execute("PRAGMA index_list(users)")}
+            if "idx_users_email_unique" not in indexes:
+                self._migrate_email_index(conn)
+
+    @staticmethod
+    def _migrate_email_index(conn: sqlite3.Connection):
+        # Files created before emails were unique have a plain idx_users_email
+        # and may hold unnormalized or duplicate emails. Normalize them, keep
+        # each email on its oldest account and give later duplicates an
+        # unreachable placeholder, so the unique index can be built.
+        conn.execute("DROP INDEX IF EXISTS idx_users_email")
+        owners = {}
+        for row in conn.execute("SELECT rowid, username, email FROM users ORDER BY rowid").fetchall():
+            email = normalize_email(row["email"])
+            if email in owners:
+                email = f"{row['username']}@duplicate.invalid"
+            owners[email] = row["username"]
+            if email != row["email"]:
+                conn.execute("UPDATE users SET email = ? WHERE rowid = ?", (email, row["rowid"]))
+        conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_users_email_unique ON users (email)")
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # Parameterized statements below are compiled once and reused
+            # from the connection's statement cache
+            conn = sqlite3.connect(self.path, timeout=5.0, cached_statements=64)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA foreign_keys=ON")
+            self._local.conn = conn
+        return conn
+
+    def get_user(self, username):
+        row = self._connect().execute(
+            "SELECT email, password, full_name FROM users WHERE username = ?", (username,)
+        ).fetchone()
+        return dict(row) if row else None
+
+    def create_user(self, username, email, password, full_name):
+        try:
+            with self._connect() as conn:
+                conn.execute(
+                    "INSERT INTO users (username, email, password, full_name) VALUES (?, ?, ?, ?)",
+                    (username, normalize_email(email), password, full_name),
+                )
+        except sqlite3.IntegrityError as e:
+            raise _already_exists(e)
+
+    def update_user(self, username, **fields):
+        unknown = set(fields) - set(self.USER_COLUMNS)
+        if unknown:
+            raise ValueError(f"Unknown user fields: {', '.join(sorted(unknown))}")
+        if not fields:
+            return
+        if "email" in fields:
+            fields["email"] = normalize_email(fields["email"])
+        assignments = ", ".join(f"{column} = ?" for column in fields)
+        try:
+            with self._connect() as conn:
+                conn.execute(f"UPDATE users SET {assignments} WHERE username = ?", (*fields.values(), username))
+        except sqlite3.IntegrityError as e:
+            raise _already_exists(e)
+
+    def find_username_by_email(self, email):
+        row = self._connect().execute(
+            "SELECT username FROM users WHERE email = ?", (normalize_email(email),)
+        ).fetchone()
+        return row["username"] if row else None
+
+    def add_chat(self, username, chat, chat_id=None):
+        chat_id = chat_id or new_chat_id()
+        with self._connect() as conn:
+            self._add_chat(conn, username, chat, chat_id)
+        return chat_id
+
+    def _add_chat(self, conn, username, chat, chat_id):
+        conn.execute(
+            "INSERT INTO chats (id, username, title, timestamp, turn_count, messages, updated_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (chat_id, username, chat["title"], chat["timestamp"], len(chat["messages"]),
+             fast_json.dumps_str(chat["messages"]), time.time()),
+        )
+
+    def append_turns(self, username, chat_id, turns):
+        with self._connect() as conn:
+            self._append_turns(conn, username, chat_id, turns)
+
+    def _append_turns(self, conn, username, chat_id, turns):
+        row = conn.execute("SELECT turn_count FROM chats WHERE id = ? AND username = ?",
+                           (chat_id, username)).fetchone()
+        if row is None:
+            return
+        start = row["turn_count"]
+        conn.executemany("INSERT INTO chat_turns (chat_id, seq, user, bot) VALUES (?, ?, ?, ?)",
+                         [(chat_id, start + i, user, bot) for i, (user, bot) in enumerate(turns)])
+        conn.execute("UPDATE chats SET turn_count = ?, updated_at = ? WHERE id = ?",
+                     (start + len(turns), time.time(), chat_id))
+
+    def compact_chats(self, idle_seconds):
+        with self._connect() as conn:
+            return self._compact_chats(conn, idle_seconds)
+
+    def _compact_chats(self, conn, idle_seconds):
+        chat_ids = [row["chat_id"] for row in conn.execute(
+            "SELECT DISTINCT t.chat_id FROM chat_turns t JOIN chats c ON c.id = t.chat_id WHERE c.updated_at < ?",
+            (time.time() - idle_seconds,))]
+        for chat_id in chat_ids:
+            messages = fast_json.loads(conn.execute("SELECT messages FROM chats WHERE id = ?",
+                                                    (chat_id,)).fetchone()["messages"])
+            messages.extend(self._appended(conn, chat_id))
+            conn.execute("UPDATE chats SET messages = ? WHERE id = ?", (fast_json.dumps_str(messages), chat_id))
+            conn.execute("DELETE FROM chat_turns WHERE chat_id = ?", (chat_id,))
+        return len(chat_ids)
+
+    @staticmethod
+    def _appended(conn, chat_id) -> list:
+        return [(row["user"], row["bot"]) for row in conn.execute(
+            "SELECT user, bot FROM chat_turns WHERE chat_id = ? ORDER BY seq", (chat_id,))]
+
+    def write_batch(self, ops):
+        # One transaction (and one fsync) for the whole batch
+        with self._connect() as conn:
+            for name, *args in ops:
+                getattr(self, "_" + name)(conn, *args)
+
+    def list_chats(self, username, cursor=None, limit=CHAT_PAGE_SIZE):
+        # Fetch one extra row to learn whether another page exists
+        rows = self._connect().execute(
+            "SELECT id, title, timestamp, turn_count FROM chats "
+            "WHERE username = ? AND id < ? ORDER BY id DESC LIMIT ?",
+            (username, cursor or "~", limit + 1),
+        ).fetchall()
+        page = [dict(row) for row in rows[:limit]]
+        return page, (page[-1]["id"] if len(rows) > limit else None)
+
+    def get_chat(self, username, chat_id):
+        conn = self._connect()
+        # One read transaction, so a compaction committing in between cannot
+        # fold the appended turns into the blob after we have read it
+        conn.execute("BEGIN")
+        try:
+            row = conn.execute(
+                "SELECT id, title, timestamp, messages FROM chats WHERE id = ? AND username = ?", (chat_id, username)
+            ).fetchone()
+            if row is None:
+                return None
+            # Snapshot first, then any turns appended since (and not yet compacted)
+            messages = fast_json.loads(row["messages"])
+            messages.extend(self._appended(conn, chat_id))
+        finally:
+            conn.commit()
+        return {"id": row["id"], "title": row["title"], "timestamp": row["timestamp"], "messages": messages}
+
+    def close(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+
+def _already_exists(error: sqlite3.IntegrityError) -> AlreadyExists:
+    # Message looks like "UNIQUE constraint failed: users.email"
+    return AlreadyExists("email" if "users.email" in str(error) else "username")
+
+
+def open_storage(backend: Optional[str] = None, path: Optional[str] = None) -> Storage:
+    backend = (backend or os.getenv("STORAGE_BACKEND", "memory")).lower()
+    if backend == "memory":
+        return InMemoryStorage()
+    if backend == "sqlite":
+        return SQLiteStorage(path or os.getenv("SQLITE_PATH", "careerai.db"))
+    raise ValueError(f"Unknown STORAGE_BACKEND: {backend}")
@@ -0,0 +1,284 @@
+"""Declarative registry of the advisor tools and the pipeline that runs them.
+
+Each tool is declared once: the input fields it takes (its schema), the
+prompt template, the label recorded in chat history, and per-tool knobs
+(model tier, generation settings, cache TTL, timeout). All three front-ends
+serve tools through the same steps:
+
+    call = prepare(tool, data, default_model)  # validate, build prompt and label
+    text = await run(call, generate, cache)     # or run_sync() for sync front-ends
+
+where `generate(call)` is the front-end's own model call. Both take an
+optional `trace` (see metrics.Trace) and time their stages on it. Cross-cutting
+features (caching, streaming, metrics) hook in here instead of in six
+hand-written handlers per front-end. Tools that name a `semantic_field` can
+also be answered from a semantic cache (see semantic_cache.py) when the
+question is asked without conversation context.
+
+Models are picked by tier: "fast" for short, formulaic answers and "strong"
+for open-ended ones. A strong-tier call that has not answered within the
+tool's latency SLO is abandoned and retried on the fast tier, so a slow
+primary costs at most the SLO plus one fast generation.
+
+This module only depends on the standard library (and response_cache) so the
+serverless handler can import it cheaply.
+"""
+import os
+from contextlib import nullcontext
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+from response_cache import ResponseCache
+
+MODEL_TIERS = {
+    "fast": os.getenv("MODEL_FAST", "gemini-2.5-flash-lite"),
+    "strong": os.getenv("MODEL_STRONG", "gemini-2.5-flash"),
+}
+FALLBACK_TIER = "fast"
+DEFAULT_LATENCY_SLO = float(os.getenv("MODEL_LATENCY_SLO", "8"))
+
+
+class ToolInputError(ValueError):
+    """The request is missing a field the tool needs; the message is user-facing."""
+
+
+@dataclass(frozen=True)
+class Tool:
+    name: str
+    path: str
+    schema_name: str
+    fields: Tuple[str, ...]
+    prompt_template: str
+    history_label: str
+    missing_message: str = "Please fill both fields"
+    # Per-tool knobs; None means "use the front-end's default"
+    tier: Optional[str] = None  # key of MODEL_TIERS
+    model: Optional[str] = None  # explicit model, overrides the tier
+    max_output_tokens: Optional[int] = None
+    temperature: Optional[float] = None
+    # Gemini 2.5 "thinking" tokens count against max_output_tokens
+    thinking_budget: Optional[int] = None
+    latency_slo: Optional[float] = None  # seconds before falling back to the fast tier
+    cache_ttl: Optional[float] = None  # None disables caching for this tool
+    timeout: Optional[float] = None
+    with_context: bool = False  # prepend conversation context (chat only)
+    semantic_field: Optional[str] = None  # input matched by the semantic cache; None disables it
+
+    def validate(self, data: dict) -> dict:
+        values = {field: str(data.get(field) or "") for field in self.fields}
+        if not all(value.strip() for value in values.values()):
+            raise ToolInputError(self.missing_message)
+        return values
+
+    def build_prompt(self, values: dict) -> str:
+        return self.prompt_template.format(**values)
+
+    def label(self, values: dict) -> str:
+        return self.history_label.format(**values)
+
+    def generation_config(self) -> Optional[dict]:
+        config = {}
+        if self.max_output_tokens is not None:
+            config["max_output_tokens"] = self.max_output_tokens
+        if self.temperature is not None:
+            config["temperature"] = self.temperature
+        if self.thinking_budget is not None:
+            config["thinking_config"] = {"thinking_budget": self.thinking_budget}
+        return config or None
+
+
+@dataclass
+class ToolCall:
+    tool: Tool
+    values: dict
+    prompt: str
+    user_input: str
+    model: str
+    config: Optional[dict] = None
+    fallback_model: Optional[str] = None
+    latency_slo: Optional[float] = None
+    contextual: bool = False  # the prompt carries conversation context
+
+    @property
+    def cacheable(self) -> bool:
+        return self.tool.cache_ttl is not None
+
+    def cache_key(self) -> str:
+        return ResponseCache.make_key(self.prompt, self.model)
+
+    def semantic_key(self) -> Optional[Tuple[str, str]]:
+        """(namespace, question) for the semantic cache, or None when the
+        answer depends on more than the question itself."""
+        if self.tool.semantic_field is None or self.contextual:
+            return None
+        return f"{self.tool.name}:{self.model}", self.values[self.tool.semantic_field]
+
+
+TOOLS: Dict[str, Tool] = {}
+TOOLS_BY_PATH: Dict[str, Tool] = {}
+
+
+def register(tool: Tool) -> Tool:
+    TOOLS[tool.name] = tool
+    TOOLS_BY_PATH[tool.path] = tool
+    return tool
+
+
+register(Tool(
+    name="chat",
+    path="/api/chat",
+    schema_name="ChatMessage",
+    fields=("message",),
+    prompt_template="As a career advisor, answer: {message}",
+    history_label="{message}",
+    missing_message="Message cannot be empty",
+    tier="strong",
+    max_output_tokens=1024,
+    temperature=0.7,
+    thinking_budget=256,
+    latency_slo=DEFAULT_LATENCY_SLO,
+    with_context=True,
+    semantic_field="message",
+))
+
+register(Tool(
+    name="assess",
+    path="/api/assess",
+    schema_name="AssessmentData",
+    fields=("q1", "q2", "q3", "q4", "q5"),
+    prompt_template="""Career assessment:
+        1. Work environment: {q1}
+        2. Work style: {q2}
+        3. Task preference: {q3}
+        4. Work-life balance: {q4}
+        5. Routine preference: {q5}
+
+        Suggest 3 career paths with explanations.""",
+    history_label="Career Assessment: {q1}, {q2}, {q3}, {q4}, {q5}",
+    missing_message="Please answer all questions",
+    # Open-ended and worth the stronger model, but capped: length drives p99
+    tier="strong",
+    max_output_tokens=1024,
+    temperature=0.7,
+    thinking_budget=256,
+    latency_slo=DEFAULT_LATENCY_SLO,
+    cache_ttl=6 * 3600,
+))
+
+register(Tool(
+    name="skills",
+    path="/api/skills",
+    schema_name="SkillsData",
+    fields=("current_skills", "target_role"),
+    prompt_template="Skills: {current_skills}, Target: {target_role}. Identify gaps and learning path.",
+    history_label="Skills Analysis: {current_skills} -> {target_role}",
+    tier="strong",
+    max_output_tokens=900,
+    temperature=0.5,
+    thinking_budget=256,
+    latency_slo=DEFAULT_LATENCY_SLO,
+))
+
+register(Tool(
+    name="resume",
+    path="/api/resume",
+    schema_name="ResumeData",
+    fields=("job_role", "experience_level"),
+    prompt_template="Resume tips for {job_role} at {experience_level} level. Give 5 specific tips.",
+    history_label="Resume Tips: {job_role} ({experience_level})",
+    tier="fast",
+    max_output_tokens=600,
+    temperature=0.4,
+    cache_ttl=24 * 3600,
+))
+
+register(Tool(
+    name="market",
+    path="/api/market",
+    schema_name="MarketData",
+    fields=("field", "location"),
+    prompt_template="Job market insights for {field} in {location}. Include salary and trends.",
+    history_label="Market Insights: {field} in {location}",
+    tier="fast",
+    max_output_tokens=800,
+    temperature=0.3,
+    # Market conditions move; keep answers fresher than the other tools
+    cache_ttl=3600,
+))
+
+register(Tool(
+    name="learning",
+    path="/api/learning",
+    schema_name="LearningData",
+    fields=("skill", "learning_style"),
+    prompt_template="Learning resources for {skill} with {learning_style} learning style.",
+    history_label="Learning Resources: {skill} ({learning_style})",
+    tier="fast",
+    max_output_tokens=700,
+    temperature=0.4,
+    cache_ttl=24 * 3600,
+))
+
+
+def resolve_model(tool: Tool, default_model: str) -> str:
+    if tool.model:
+        return tool.model
+    return MODEL_TIERS.get(tool.tier, default_model)
+
+
+def _span(trace, stage: str):
+    return trace.span(stage) if trace is not None else nullcontext()
+
+
+def prepare(tool: Tool, data: dict, default_model: str, trace=None,
+            context: Optional[Callable[[str], str]] = None) -> ToolCall:
+    """Validate `data` and build the call. `context(prompt)`, when given, adds
+    conversation context for tools declared `with_context`."""
+    with _span(trace, "validate"):
+        values = tool.validate(data)
+    with _span(trace, "build_prompt"):
+        prompt = base_prompt = tool.build_prompt(values)
+        if tool.with_context and context is not None:
+            prompt = context(prompt)
+        model = resolve_model(tool, default_model)
+        fallback = MODEL_TIERS[FALLBACK_TIER]
+        has_fallback = tool.latency_slo is not None and fallback != model
+        return ToolCall(tool=tool, values=values, prompt=prompt,
+                        user_input=tool.label(values), model=model, config=tool.generation_config(),
+                        fallback_model=fallback if has_fallback else None,
+                        latency_slo=tool.latency_slo if has_fallback else None,
+                        contextual=prompt != base_prompt)
+
+
+async def run(call: ToolCall, generate: Callable[[ToolCall], Awaitable[str]], cache=None, trace=None,
+              semantic=None) -> str:
+    """Answer `call`, from `semantic` (a semantic_cache.SemanticCache) or
+    `cache` when they have it, else via `generate`."""
+    with _span(trace, "upstream"):
+        key = call.semantic_key() if semantic is not None else None
+        if key is not None:
+            text = semantic.get(*key)
+            if text is not None:
+                return text
+        if cache is not None and call.cacheable:
+            text = await cache.get_or_create(call.cache_key(), lambda: generate(call), ttl=call.tool.cache_ttl)
+        else:
+            text = await generate(call)
+        if key is not None:
+            semantic.set(*key, text)
+        return text
+
+
+def run_sync(call: ToolCall, generate: Callable[[ToolCall], str], cache=None, semantic=None) -> str:
+    key = call.semantic_key() if semantic is not None else None
+    if key is not None:
+        text = semantic.get(*key)
+        if text is not None:
+            return text
+    if cache is not None and call.cacheable:
+        text = cache.get_or_compute(call.cache_key(), lambda: generate(call), ttl=call.tool.cache_ttl)
+    else:
+        text = generate(call)
+    if key is not None:
+        semantic.set(*key, text)
+    return text
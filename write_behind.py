@@ -0,0 +1,208 @@
+"""Write-behind queue: storage writes leave the request path and land in batches.
+
+Handlers enqueue writes (`await writer.put(("add_chat", username, chat,
+chat_id))`) and return without waiting for the disk. A background task
+drains the queue in batches, up to `batch_size` writes or whatever arrived
+within `flush_interval` of the first one, and applies each batch with
+`storage.write_batch`. SQLite does that in one transaction. The blocking
+storage call runs in a worker thread, so the event loop never waits on an
+fsync.
+
+The queue is bounded. When it is full, `put` waits for room. That is the
+backpressure: if the disk falls behind, requests slow down instead of
+memory growing without limit.
+
+A batch that fails is retried write by write, so one bad write cannot take
+the rest of its batch down with it. Writes that still fail are counted and
+dropped.
+
+Reads that must see earlier writes (listing chats right after saving one)
+call `await writer.barrier()` first, which returns once everything enqueued
+so far has been flushed. `close()` drains the queue on shutdown.
+
+The app starts the background task from its lifespan, but `put` also starts
+it when none is running (a host that skips lifespan, a writer task that
+died). If the writer still is not running when `barrier` is called, the
+barrier flushes the queue itself. Otherwise it waits at most
+`barrier_timeout`, so a stuck flush slows a read down but never hangs it.
+"""
+import asyncio
+import os
+import time
+from typing import Optional
+
+DEFAULT_MAX_QUEUE = int(os.getenv("WRITE_BEHIND_MAX_QUEUE", "10000"))
+DEFAULT_BATCH_SIZE = int(os.getenv("WRITE_BEHIND_BATCH_SIZE", "200"))
+DEFAULT_FLUSH_INTERVAL = float(os.getenv("WRITE_BEHIND_FLUSH_INTERVAL", "0.05"))
+DEFAULT_BARRIER_TIMEOUT = float(os.getenv("WRITE_BEHIND_BARRIER_TIMEOUT", "5"))
+
+
+class WriteBehind:
+    def __init__(self, storage, max_queue: int = DEFAULT_MAX_QUEUE, batch_size: int = DEFAULT_BATCH_SIZE,
+                 flush_interval: float = DEFAULT_FLUSH_INTERVAL, barrier_timeout: float = DEFAULT_BARRIER_TIMEOUT):
+        self.storage = storage
+        self.max_queue = max_queue
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.barrier_timeout = barrier_timeout
+        self._queue: Optional[asyncio.Queue] = None
+        self._flushed = None  # asyncio.Condition, notified after every batch
+        self._loop = None
+        self._task: Optional[asyncio.Task] = None
+        self._batch = []  # taken off the queue by run(), not flushed yet
+        self._enqueued_seq = 0
+        self._flushed_seq = 0
+        self._closing = False
+        self.batches = 0
+        self.written = 0
+        self.failed = 0
+        self.backpressure_waits = 0
+        self.barrier_timeouts = 0
+        self.last_flush_ms = 0.0
+        self.last_error: Optional[str] = None
+
+    def _ensure_started(self):
+        # Created lazily so they bind to the running loop, not the import-time
+        # one. A new loop (a test client without lifespan runs one per
+        # request) gets new ones, carrying over the writes still queued
+        loop = asyncio.get_running_loop()
+        if self._loop is loop:
+            return
+        # Including the batch a writer on the old loop had taken but not flushed
+        pending, self._batch = self._batch, []
+        while self._queue is not None and not self._queue.empty():
+            pending.append(self._queue.get_nowait())
+        self._loop = loop
+        self._task = None
+        self._queue = asyncio.Queue(max(self.max_queue, len(pending)))
+        self._flushed = asyncio.Condition()
+        for op in pending:
+            self._queue.put_nowait(op)
+        self._flushed_seq = self._enqueued_seq - len(pending)
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done() and self._loop is asyncio.get_running_loop()
+
+    def start(self) -> asyncio.Task:
+        """Start the background writer unless it is already running."""
+        self._ensure_started()
+        if not self.running:
+            self._task = asyncio.create_task(self.run())
+        return self._task
+
+    @property
+    def depth(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    async def put(self, op: tuple):
+        """Enqueue one write, waiting for room when the queue is full."""
+        if self._closing:
+            raise RuntimeError("write-behind queue is closed")
+        self.start()
+        if self._queue.full():
+            self.backpressure_waits += 1
+        await self._queue.put(op)
+        self._enqueued_seq += 1
+
+    async def barrier(self):
+        """Wait until every write enqueued before this call has been applied
+        (or `barrier_timeout` has passed)."""
+        if self._queue is None:
+            return
+        self._ensure_started()
+        if not self.running:
+            await self._flush_inline()
+            return
+        target = self._enqueued_seq
+        try:
+            async with self._flushed:
+                await asyncio.wait_for(self._flushed.wait_for(lambda: self._flushed_seq >= target),
+                                       self.barrier_timeout)
+        except asyncio.TimeoutError:
+            self.barrier_timeouts += 1
+
+    async def _flush_inline(self):
+        await self._flush_orphaned()
+        while not self._queue.empty():
+            batch = []
+            while len(batch) < self.batch_size and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+            await self._flush(batch)
+
+    async def _flush_orphaned(self):
+        # A batch left behind by a writer task that died before flushing it
+        if self._batch:
+            batch, self._batch = self._batch, []
+            await self._flush(batch)
+
+    async def run(self):
+        self._ensure_started()
+        if self.running and self._task is not asyncio.current_task():
+            return  # a writer is already draining this queue
+        self._task = asyncio.current_task()
+        await self._flush_orphaned()
+        while True:
+            batch = self._batch = [await self._queue.get()]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 and self._queue.empty():
+                    break
+                try:
+                    batch.append(self._queue.get_nowait() if remaining <= 0
+                                 else await asyncio.wait_for(self._queue.get(), remaining))
+                except (asyncio.QueueEmpty, asyncio.TimeoutError):
+                    break
+            await self._flush(batch)
+            self._batch = []
+
+    async def _flush(self, batch: list):
+        started = time.perf_counter()
+        try:
+            await asyncio.to_thread(self.storage.write_batch, batch)
+            self.written += len(batch)
+        except Exception:
+            await asyncio.to_thread(self._write_one_by_one, batch)
+        self.batches += 1
+        self.last_flush_ms = round((time.perf_counter() - started) * 1000, 2)
+        for _ in batch:
+            self._queue.task_done()
+        async with self._flushed:
+            self._flushed_seq += len(batch)
+            self._flushed.notify_all()
+
+    def _write_one_by_one(self, batch: list):
+        for op in batch:
+            try:
+                self.storage.write_batch([op])
+                self.written += 1
+            except Exception as e:
+                self.failed += 1
+                self.last_error = f"{op[0]}: {e}"
+
+    async def close(self, timeout: float = 10.0):
+        """Stop accepting writes and wait (up to `timeout`) for the queue to drain."""
+        self._closing = True
+        if self._queue is not None:
+            self._ensure_started()
+            if not self.running:
+                await self._flush_inline()
+            try:
+                await asyncio.wait_for(self._queue.join(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    def stats(self) -> dict:
+        return {
+            "depth": self.depth,
+            "max_queue": self.max_queue,
+            "batch_size": self.batch_size,
+            "batches": self.batches,
+            "written": self.written,
+            "failed": self.failed,
+            "backpressure_waits": self.backpressure_waits,
+            "barrier_timeouts": self.barrier_timeouts,
+            "last_flush_ms": self.last_flush_ms,
+            "last_error": self.last_error,
+        }